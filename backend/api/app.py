@@ -4,15 +4,23 @@ import sys
 import os
 import uuid
 import json
+import base64
+import time
 from functools import wraps
 from flask_security import Security, MongoEngineUserDatastore, login_user, logout_user, auth_required, current_user, hash_password, verify_password
 from datetime import datetime
-from mongoengine import DoesNotExist
+from urllib.parse import parse_qsl
+from mongoengine import NotUniqueError, Q
 
 # Add parent directory to path to import langgraph_comp
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from langgraph_comp.graph import langchain_graph
+from langgraph_comp.graph import DOCUMENTS_NODE, get_graph
+from langgraph_comp.think_filter import ThinkTagFilter
+from langgraph_comp.context import warm_up as warm_up_tokenizer
+from langgraph_comp.conversation import backfill_thread, missing_turns, prune_thread_checkpoints, turn_page
+from data_insertion.retrieval import RetrievalConfig
+from langchain_core.messages import AIMessageChunk
 import logging
 
 app = Flask(__name__)
@@ -32,8 +40,10 @@ app.config['SECURITY_JSON_API'] = True
 app.config['WTF_CSRF_ENABLED'] = False
 
 # Use centralized models module
-from models import init_db, User, ThreadInfo
-from db_connect import langgraph_collection
+from models import init_db, User, ChatThread
+import clients
+import metrics
+import profiling
 
 # Initialize MongoDB connection
 init_db(app)
@@ -45,80 +55,181 @@ security = Security(app, user_datastore)
 
 CORS(app, supports_credentials=True)
 
-from logging_config import get_logger
+from logging_config import bind_log_context, clear_log_context, get_logger
 
 logger = get_logger(__name__)
-memory = langgraph_collection()
 
-# Helper Functions
+# Request metrics (see metrics.py) and log context (see logging_config.py)
 
-def find_and_append_thread(thread_id, user_email):
-    try:
-        user = User.objects.get(email=user_email)
-
-        # Check if thread exists
-        if any(t.thread_id == thread_id for t in user.threads):
-            # Thread already exists
-            return True
-
-        # Add new thread
-        new_thread = ThreadInfo(
-            thread_id=thread_id,
-            timestamp=datetime.utcnow(),
-            headline="New Conversation",
-            active=True
-        )
-        user.threads.append(new_thread)
-        user.save()
+def request_id(environ):
+    """The request's id: the client's X-Request-ID if given, else a new one (kept in the environ)"""
+    if "rag.request_id" not in environ:
+        environ["rag.request_id"] = environ.get("HTTP_X_REQUEST_ID", "")[:128] or uuid.uuid4().hex
+    return environ["rag.request_id"]
 
-        logger.info(f"Thread ID {thread_id} appended to user {user_email}.")
-        return True
 
-    except DoesNotExist:
-        logger.error(f"User {user_email} does not exist.")
-        return False
+@app.before_request
+def start_request_timer():
+    request.environ.setdefault("rag.request_started", time.perf_counter())
 
-def chatHistory(user_email, thread_id):
-    # Make sure the thread exists in our new structure
-    find_and_append_thread(thread_id, user_email)
 
-    config = {"configurable" : {"thread_id" : thread_id , "user_id" : user_email} }
+@app.before_request
+def start_tokenizer_warm_up():
+    # No-op once started; the ASGI app already starts it at lifespan startup
+    warm_up_tokenizer()
+
+
+@app.before_request
+def bind_request_log_context():
+    # Worker threads are reused, so drop the previous request's fields first
+    clear_log_context()
+    bind_log_context(request_id=request_id(request.environ))
+
+
+@app.teardown_request
+def clear_request_log_context(exc=None):
+    clear_log_context()
+
+
+@app.after_request
+def record_request_latency(response):
+    """
+    Observe the request in rag_http_request_duration_seconds; event streams
+    once the response is closed, so they count until their last event. The ASGI
+    query routes observe their requests themselves (see api/asgi.py).
+    """
+    response.headers.setdefault("X-Request-ID", request_id(request.environ))
+    if request.environ.get("rag.skip_request_metrics"):
+        return response
+    started = request.environ.get("rag.request_started", time.perf_counter())
+    labels = {
+        "method": request.method,
+        "route": request.url_rule.rule if request.url_rule else "unmatched",
+        "status": str(response.status_code),
+    }
+    if response.mimetype == 'text/event-stream':
+        response.call_on_close(lambda: metrics.REQUEST_LATENCY.observe(time.perf_counter() - started, **labels))
+    else:
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - started, **labels)
+    return response
+
+
+def profile_token(environ):
+    """The X-Profile header or ?profile= parameter of a request (see profiling.py)"""
+    token = environ.get("HTTP_X_PROFILE")
+    if token is None:
+        token = next((value for key, value in parse_qsl(environ.get("QUERY_STRING", "")) if key == "profile"), None)
+    return token
+
+
+def profile_label(environ):
+    return f"{environ.get('PATH_INFO', '')}_{request_id(environ)}"
+
+
+# Registered only when enabled, so requests pay nothing for profiling otherwise
+if profiling.PROFILING_ENABLED:
+    @app.before_request
+    def start_request_profile():
+        # The ASGI query routes profile the whole request themselves (see api/asgi.py)
+        if "rag.profile" not in request.environ:
+            request.environ["rag.profile"] = profiling.start_profile(profile_token(request.environ),
+                                                                     profile_label(request.environ))
+
+    @app.after_request
+    def add_profile_header(response):
+        profile = request.environ.get("rag.profile")
+        if profile is not None and profile.reason == "requested":
+            response.headers["X-Profile-File"] = profile.filename
+        return response
 
+    @app.teardown_request
+    def stop_request_profile(exc=None):
+        # Event streams tear down after their last event
+        profile = request.environ.get("rag.profile")
+        if profile is not None and not request.environ.get("rag.profile_external"):
+            request.environ["rag.profile"] = None
+            profile.stop()
+
+# Helper Functions
+
+def find_and_append_thread(thread_id, user_id):
+    """Register the thread for the user if it is new, as a single upsert on the (user, thread_id) index"""
     try:
-        checkpoint = memory.get(config)
-        if not checkpoint:
-             return {"question": [], "generation": [], "documents": [], "timestamp": None}
-
-        logger.info(f"Checkpoint content: {checkpoint}")
-        messages = checkpoint.get("channel_values", {}).get("messages", [])
-        timestamp = checkpoint.get("ts", None)
-        question = []
-        answer = []
-        documents = []
-
-        # Assuming messages are [Human, AI, Human, AI...]
-        # We iterate by 2 to get pairs
-        for i in range(0, len(messages)-1, 2):
-            if i+1 < len(messages):
-                question.append(messages[i].content)
-                
-                # Get the bot response content
-                ai_msg = messages[i+1]
-                # Check if content is a list or string
-                if isinstance(ai_msg.content, list) and len(ai_msg.content) >= 2:
-                     answer.append(ai_msg.content[0])
-                else:
-                     answer.append(ai_msg.content)
-
-        history = {
-            "question": question,
-            "generation": answer, 
-            "timestamp": timestamp
+        with metrics.timed_call("mongo_thread_upsert"):
+            result = ChatThread.objects(user=user_id, thread_id=thread_id).update_one(
+                upsert=True,
+                full_result=True,
+                set_on_insert__timestamp=datetime.utcnow(),
+                set_on_insert__headline="New Conversation",
+                set_on_insert__active=True,
+            )
+        if result.upserted_id is not None:
+            logger.info("Thread ID %s appended to user %s.", thread_id, user_id)
+    except NotUniqueError:
+        # A concurrent request registered the same thread first
+        pass
+    return True
+
+def thread_archive_backfilled(user_id, thread_id):
+    """Whether the thread's checkpointed turns were already copied to the conversation archive"""
+    thread = ChatThread.objects(user=user_id, thread_id=thread_id).only('archive_backfilled').first()
+    return thread is not None and thread.archive_backfilled
+
+def mark_thread_archive_backfilled(user_id, thread_id):
+    ChatThread.objects(user=user_id, thread_id=thread_id).update_one(set__archive_backfilled=True)
+
+# Page size of /user_threads (overridable with ?limit=, up to the max)
+USER_THREADS_PAGE_SIZE = int(os.getenv("USER_THREADS_PAGE_SIZE", "50"))
+USER_THREADS_MAX_PAGE_SIZE = 200
+
+def encode_threads_cursor(thread):
+    """Opaque cursor pointing just after this thread in newest-first order"""
+    raw = f"{thread.timestamp.isoformat()}|{thread.thread_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_threads_cursor(cursor):
+    """Returns (timestamp, thread_id); raises ValueError on a malformed cursor"""
+    raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    timestamp, thread_id = raw.split("|", 1)
+    return datetime.fromisoformat(timestamp), thread_id
+
+# Page size of /thread_history in turns (overridable with "limit", up to the max)
+THREAD_HISTORY_PAGE_SIZE = int(os.getenv("THREAD_HISTORY_PAGE_SIZE", "50"))
+THREAD_HISTORY_MAX_PAGE_SIZE = 200
+
+def chatHistory(user_id, thread_id, before=None, limit=THREAD_HISTORY_PAGE_SIZE):
+    """
+    One page of a thread's transcript from the conversation archive, oldest
+    turn first: the `limit` turns before turn number `before`, or the latest
+    turns when before is None. next_cursor is the `before` of the previous
+    page, or None when this page starts the conversation.
+    """
+    # Make sure the thread exists in our new structure
+    find_and_append_thread(thread_id, user_id)
+
+    try:
+        turns, has_more = turn_page(thread_id, before, limit)
+        if missing_turns(turns, has_more, before) and not thread_archive_backfilled(user_id, thread_id):
+            # Possibly a thread from before the archive existed: archive the
+            # turns its checkpoint still holds. Done once per thread, so empty
+            # threads and gaps that cannot be filled don't read the checkpoint
+            # on every request.
+            archived = backfill_thread(clients.checkpointer(), thread_id)
+            mark_thread_archive_backfilled(user_id, thread_id)
+            if archived:
+                turns, has_more = turn_page(thread_id, before, limit)
+
+        timestamps = [turn["timestamp"].isoformat() if turn.get("timestamp") else None for turn in turns]
+        return {
+            "question": [turn["question"] for turn in turns],
+            "generation": [turn["answer"] for turn in turns],
+            "timestamps": timestamps,
+            "timestamp": timestamps[-1] if timestamps else None,
+            "next_cursor": turns[0]["turn"] if has_more else None,
         }
-        return history
     except Exception as e:
-        logger.error(f"Error retrieving chat history: {e}")
-        return {"question": [], "generation": [], "documents": [], "timestamp": None}
+        logger.error("Error retrieving chat history: %s", e)
+        return {"question": [], "generation": [], "timestamps": [], "timestamp": None, "next_cursor": None}
 
 
 # Endpoints
@@ -232,39 +343,67 @@ def check_auth():
 @app.route('/thread_history', methods=['POST'])
 @auth_required()
 def handle_history():
-    """Handle POST request to process a query using graph.invoke()."""
+    """
+    Transcript of a thread, one page of turns at a time (newest page first).
+    JSON body: thread_id, and optionally limit (default
+    THREAD_HISTORY_PAGE_SIZE) and before (the next_cursor of the previous page).
+    """
     try:
         data = request.get_json()
         thread_id = data.get('thread_id', '')
-        user_email = current_user.email
         
         if not thread_id:
             return jsonify({"error": "Please provide a 'thread_id' in JSON format"}), 400
+        bind_log_context(thread_id=thread_id)
 
-        # Run the graph using invoke()
-        result = chatHistory(user_email, thread_id)
+        before = data.get('before')
+        limit = data.get('limit', THREAD_HISTORY_PAGE_SIZE)
+        if (before is not None and not isinstance(before, int)) or not isinstance(limit, int) or limit < 1:
+            return jsonify({"error": "'before' must be a turn number and 'limit' a positive integer"}), 400
+
+        result = chatHistory(current_user.id, thread_id, before, min(limit, THREAD_HISTORY_MAX_PAGE_SIZE))
 
         return jsonify(result)
     except Exception as e:
-        logger.error(f"Error retrieving thread history: {str(e)}")
+        logger.error("Error retrieving thread history: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/user_threads', methods=['GET'])
 @auth_required()
 def get_user_threads():
+    """
+    Active threads of the user, newest first, one page at a time.
+    Query params: limit (default USER_THREADS_PAGE_SIZE) and cursor (the
+    next_cursor of the previous page). next_cursor is null on the last page.
+    """
     try:
-        user = User.objects.get(id=current_user.id)
-        threads = []
-        for t in user.threads:
-            if t.active:
-                threads.append({
-                    'thread_id': t.thread_id,
-                    'headline': t.headline,
-                    'timestamp': t.timestamp
-                })
-        return jsonify({'userId': str(user.id), 'threads': threads}), 200
+        limit = max(1, min(request.args.get('limit', USER_THREADS_PAGE_SIZE, type=int), USER_THREADS_MAX_PAGE_SIZE))
+        threads_query = ChatThread.objects(user=current_user.id, active=True)
+
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                timestamp, thread_id = decode_threads_cursor(cursor)
+            except ValueError:
+                return jsonify({"error": "Invalid cursor"}), 400
+            threads_query = threads_query.filter(
+                Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, thread_id__lt=thread_id)
+            )
+
+        page = list(
+            threads_query.order_by('-timestamp', '-thread_id')
+            .only('thread_id', 'headline', 'timestamp')
+            .limit(limit + 1)
+        )
+        next_cursor = encode_threads_cursor(page[limit - 1]) if len(page) > limit else None
+        threads = [{
+            'thread_id': t.thread_id,
+            'headline': t.headline,
+            'timestamp': t.timestamp
+        } for t in page[:limit]]
+        return jsonify({'userId': str(current_user.id), 'threads': threads, 'next_cursor': next_cursor}), 200
     except Exception as e:
-        logger.error(f"Error retrieving user threads: {str(e)}")
+        logger.error("Error retrieving user threads: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/delete_thread', methods=['POST'])
@@ -277,20 +416,168 @@ def delete_thread():
         if not thread_id:
             return jsonify({'success': False, 'message': 'Thread ID required'}), 400
             
-        user = User.objects.get(id=current_user.id)
-        
         # Soft delete
-        for t in user.threads:
-            if t.thread_id == thread_id:
-                t.active = False
-                user.save()
-                return jsonify({'success': True, 'message': 'Thread deleted'}), 200
+        if ChatThread.objects(user=current_user.id, thread_id=thread_id).update_one(set__active=False):
+            return jsonify({'success': True, 'message': 'Thread deleted'}), 200
                 
         return jsonify({'success': False, 'message': 'Thread not found'}), 404
     except Exception as e:
-        logger.error(f"Error deleting thread: {str(e)}")
+        logger.error("Error deleting thread: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def update_thread_headline(user_id, thread_id, new_headline):
+    """Replace the placeholder headline of a thread with a generated one."""
+    if not new_headline:
+        return
+    # Ensure headline fits in 255 chars
+    if len(new_headline) > 255:
+        logger.warning("Headline too long (%d chars), truncating: %s...", len(new_headline), new_headline[:50])
+        new_headline = new_headline[:252] + "..."
+    # Only update if it's currently "New Conversation"; the filter makes this atomic
+    with metrics.timed_call("mongo_headline_update"):
+        thread_updated = ChatThread.objects(
+            user=user_id, thread_id=thread_id, headline="New Conversation"
+        ).update_one(set__headline=new_headline)
+
+    if thread_updated:
+        logger.info("Updated headline for thread %s to: %s", thread_id, new_headline)
+
+
+def graph_input(question):
+    """
+    Input for one turn; headline_generated and prompt_tokens are reset so they
+    report only this turn (a cached answer has no prompt).
+    """
+    return {"query": question, "headline_generated": False, "prompt_tokens": 0}
+
+
+def parse_retrieval_overrides(data):
+    """
+    The optional "retrieval" object of a query body (top_k, score_threshold,
+    mode, hnsw_ef, exact, rescore, oversampling, source_files, rrf_k, prefetch;
+    see data_insertion/retrieval.py). Raises ValueError if it is invalid.
+    """
+    overrides = data.get('retrieval') or None
+    RetrievalConfig().with_overrides(overrides)
+    return overrides
+
+
+def query_config(thread_id, retrieval=None):
+    """Graph config for a turn; retrieval overrides travel with the run, not the checkpoint"""
+    configurable = {"thread_id": thread_id}
+    if retrieval:
+        configurable["retrieval"] = retrieval
+    return {"configurable": configurable}
+
+
+def sse_event(event, data):
+    """Format a single server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class QueryEventStream:
+    """
+    Turns graph stream chunks (stream_mode=["updates", "messages"]) into
+    server-sent events. Shared by the Flask route and the ASGI handler
+    (api/asgi.py) so both emit the same events.
+
+    Event order: 'retrieved_docs' once retrieval (and reranking) finishes,
+    one 'token' per visible chunk of the generated answer, 'headline', then
+    'done' with the final answer and the prompt's token count.
+    """
+
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.think_filter = ThinkTagFilter()
+        self.headline = None
+        self.answer = ""
+        self.prompt_tokens = 0
+
+    def on_chunk(self, mode, chunk):
+        events = []
+        if mode == "messages":
+            message, metadata = chunk
+            # generate_headline uses the same llm, and the messages written to
+            # state arrive here as whole messages; only forward answer tokens
+            if metadata.get("langgraph_node") != "generate" or not isinstance(message, AIMessageChunk):
+                return events
+            text = self.think_filter.feed(message.content)
+            if text:
+                events.append(sse_event("token", {"text": text}))
+            return events
+
+        for node, update in chunk.items():
+            if not update:
+                continue
+            if node == DOCUMENTS_NODE:
+                events.append(sse_event("retrieved_docs", {"retrieved_docs": update.get("retrieved_docs")}))
+            elif node == "lookup_answer_cache" and update.get("cache_hit"):
+                # Cached answers arrive whole rather than token by token
+                self.answer = update.get("answer", self.answer)
+                events.append(sse_event("retrieved_docs", {"retrieved_docs": update.get("retrieved_docs")}))
+                events.append(sse_event("token", {"text": self.answer}))
+            elif node == "build_context":
+                self.prompt_tokens = update.get("prompt_tokens", 0)
+            elif node == "generate":
+                self.answer = update.get("answer", self.answer)
+            elif node == "generate_headline":
+                # Held back so the headline always follows the answer tokens
+                self.headline = update.get("headline")
+        return events
+
+    def flush(self):
+        """Events for any answer text still held back by the think-tag filter"""
+        tail = self.think_filter.flush()
+        return [sse_event("token", {"text": tail})] if tail else []
+
+    def final_events(self):
+        """'headline' (if one was generated) and 'done'; call once the headline is saved"""
+        events = []
+        if self.headline:
+            events.append(sse_event("headline", {"headline": self.headline}))
+        events.append(sse_event("done", {"answer": self.answer, "thread_id": self.thread_id,
+                                          "prompt_tokens": self.prompt_tokens}))
+        return events
+
+
+def stream_query_events(question, thread_id, user_id, retrieval=None):
+    """
+    Run the graph in streaming mode and yield server-sent events (see
+    QueryEventStream). The graph writes its checkpoint exactly as invoke() does.
+    """
+    config = query_config(thread_id, retrieval)
+    events = QueryEventStream(thread_id)
+
+    try:
+        for mode, chunk in get_graph().stream(
+            graph_input(question),
+            config=config,
+            stream_mode=["updates", "messages"],
+        ):
+            yield from events.on_chunk(mode, chunk)
+
+        yield from events.flush()
+        if events.headline:
+            update_thread_headline(user_id, thread_id, events.headline)
+        yield from events.final_events()
+        prune_thread_checkpoints(thread_id)
+
+    except Exception as e:
+        logger.exception("Error streaming query: %s", e)
+        yield sse_event("error", {"error": str(e)})
+
+
+def streaming_response(question, thread_id, user_id, retrieval=None):
+    response = Response(
+        stream_with_context(stream_query_events(question, thread_id, user_id, retrieval)),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies (nginx) from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @app.route('/query', methods=['POST'])
 @auth_required()
 def query():
@@ -301,52 +588,79 @@ def query():
 
     if not question or not thread_id:
         return jsonify({"error": "Missing question or thread_id"}), 400
+    bind_log_context(thread_id=thread_id)
+    try:
+        retrieval = parse_retrieval_overrides(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     # Ensure thread exists/is linked to user
-    find_and_append_thread(thread_id, current_user.email)
+    find_and_append_thread(thread_id, current_user.id)
+
+    # Clients that ask for an event stream get tokens as they are generated
+    if request.accept_mimetypes.best == 'text/event-stream':
+        return streaming_response(question, thread_id, user_id, retrieval)
 
-    config = {"configurable": {"thread_id": thread_id}}
+    config = query_config(thread_id, retrieval)
     
     try:
         # Invoke the graph
-        final_state = langchain_graph.invoke(
-            {"query": question},
+        final_state = get_graph().invoke(
+            graph_input(question),
             config=config
         )
 
-        # Check for headline and update if necessary
-        if 'headline' in final_state:
-            new_headline = final_state['headline']
-            # Ensure headline fits in 255 chars
-            if new_headline and len(new_headline) > 255:
-                logger.warning(f"Headline too long ({len(new_headline)} chars), truncating: {new_headline[:50]}...")
-                new_headline = new_headline[:252] + "..."
-            # Reload user to ensure we have the latest state and can save
-            user = User.objects.get(id=current_user.id)
-            thread_updated = False
-            for t in user.threads:
-                if t.thread_id == thread_id:
-                    # Only update if it's currently "New Conversation"
-                    if t.headline == "New Conversation":
-                         t.headline = new_headline
-                         thread_updated = True
-                    break
-            
-            if thread_updated:
-                user.save()
-                logger.info(f"Updated headline for thread {thread_id} to: {new_headline}")
+        # Only the first turn of a thread generates a headline
+        if final_state.get('headline_generated'):
+            update_thread_headline(user_id, thread_id, final_state['headline'])
+        prune_thread_checkpoints(thread_id)
         
         # Remove messages from final_state as they are not serializable and not needed by frontend
         if 'messages' in final_state:
             del final_state['messages']
+        # The packed context repeats retrieved_docs
+        final_state.pop('context', None)
 
         return jsonify(final_state)
 
     except Exception as e:
-        logger.exception(f"Error processing query: {e}")
+        logger.exception("Error processing query: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/query/stream', methods=['POST'])
+@auth_required()
+def query_stream():
+    """
+    Same as /query but always answers with server-sent events.
+    Expects JSON: { "question": "...", "thread_id": "...", "retrieval": {...} (optional) }
+    """
+    data = request.get_json()
+    question = data.get('question')
+    thread_id = data.get('thread_id')
+
+    if not question or not thread_id:
+        return jsonify({"error": "Missing question or thread_id"}), 400
+    bind_log_context(thread_id=thread_id)
+    try:
+        retrieval = parse_retrieval_overrides(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    find_and_append_thread(thread_id, current_user.id)
+
+    return streaming_response(question, thread_id, current_user.id, retrieval)
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Request, node and external call latencies plus token, cache and error
+    counters of this worker, in the Prometheus text format.
+    """
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """
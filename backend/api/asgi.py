@@ -0,0 +1,250 @@
+"""
+ASGI entry point for the API.
+
+POST /query and /query/stream run the graph with ainvoke()/astream() on the
+event loop, so a request waiting on the LLM no longer holds a worker thread.
+Only the short Flask parts of those requests (before_request hooks,
+Flask-Security auth, the MongoDB user/thread bookkeeping and
+after_request/session handling) run in a thread. Every other route is the
+unchanged Flask app, served through a WSGI adapter with its own thread pool.
+
+Run from the /backend directory:
+    uvicorn api.asgi:application --host 0.0.0.0 --port 8000
+"""
+
+import asyncio
+import io
+import os
+import sys
+import time
+
+from a2wsgi import WSGIMiddleware
+from a2wsgi.wsgi import build_environ
+from flask import request, jsonify
+from flask_security import auth_required, current_user
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+import profiling
+from api.app import (
+    app as flask_app, graph_input, find_and_append_thread, update_thread_headline,
+    QueryEventStream, sse_event, parse_retrieval_overrides, query_config, request_id,
+    profile_label, profile_token,
+)
+from langgraph_comp.context import warm_up as warm_up_tokenizer
+from langgraph_comp.conversation import prune_thread_checkpoints
+from langgraph_comp.graph import get_graph
+from logging_config import bind_log_context, get_logger
+
+logger = get_logger(__name__)
+
+# Threads for the routes that stay synchronous (login, history, threads, ...)
+ASGI_WSGI_WORKERS = int(os.getenv("ASGI_WSGI_WORKERS", "16"))
+
+# Routes served natively async, and whether they always answer with an event stream
+ASYNC_ROUTES = {"/query": False, "/query/stream": True}
+
+wsgi_application = WSGIMiddleware(flask_app, workers=ASGI_WSGI_WORKERS)
+
+
+@auth_required()
+def authorize_query():
+    """
+    Flask side of /query: same auth, validation and thread registration as
+    the WSGI route. Returns the query parameters, or a response to send as is.
+    """
+    data = request.get_json()
+    question = data.get('question')
+    thread_id = data.get('thread_id')
+
+    if not question or not thread_id:
+        return jsonify({"error": "Missing question or thread_id"}), 400
+    bind_log_context(thread_id=thread_id)
+    try:
+        retrieval = parse_retrieval_overrides(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Ensure thread exists/is linked to user
+    find_and_append_thread(thread_id, current_user.id)
+    return {"question": question, "thread_id": thread_id, "user_id": current_user.id, "retrieval": retrieval}
+
+
+def prepare_query(environ, always_stream):
+    """
+    Run the Flask part of a query request inside a request context (in a
+    worker thread). Returns (params, response): params is None when the
+    response (401, 400, ...) should be sent as is; otherwise response only
+    carries the status and headers (CORS, session cookie) for the answer.
+    """
+    with flask_app.request_context(environ):
+        try:
+            rv = flask_app.preprocess_request()
+            if rv is None:
+                rv = authorize_query()
+        except Exception as e:
+            rv = flask_app.handle_user_exception(e)
+
+        params = None
+        if isinstance(rv, dict):
+            params, rv = rv, None
+            params["stream"] = always_stream or request.accept_mimetypes.best == 'text/event-stream'
+            if params["stream"]:
+                rv = flask_app.response_class(mimetype='text/event-stream')
+                rv.headers['Cache-Control'] = 'no-cache'
+                # Stop reverse proxies (nginx) from buffering the stream
+                rv.headers['X-Accel-Buffering'] = 'no'
+            else:
+                rv = flask_app.response_class(mimetype='application/json')
+
+        response = flask_app.process_response(flask_app.make_response(rv))
+        return params, response
+
+
+def asgi_headers(response, drop_content_length=False):
+    return [
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for name, value in response.headers.items()
+        if not (drop_content_length and name.lower() == "content-length")
+    ]
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return body
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def astream_query_events(question, thread_id, user_id, retrieval=None):
+    """Async version of api.app.stream_query_events"""
+    config = query_config(thread_id, retrieval)
+    events = QueryEventStream(thread_id)
+
+    try:
+        async for mode, chunk in get_graph().astream(
+            graph_input(question),
+            config=config,
+            stream_mode=["updates", "messages"],
+        ):
+            for event in events.on_chunk(mode, chunk):
+                yield event
+
+        for event in events.flush():
+            yield event
+        if events.headline:
+            await asyncio.to_thread(update_thread_headline, user_id, thread_id, events.headline)
+        for event in events.final_events():
+            yield event
+        await asyncio.to_thread(prune_thread_checkpoints, thread_id)
+
+    except Exception as e:
+        logger.exception("Error streaming query: %s", e)
+        yield sse_event("error", {"error": str(e)})
+
+
+async def run_query(question, thread_id, user_id, retrieval=None):
+    """Async version of the JSON /query response body; returns (status, payload)"""
+    config = query_config(thread_id, retrieval)
+    try:
+        final_state = await get_graph().ainvoke(graph_input(question), config=config)
+
+        # Only the first turn of a thread generates a headline
+        if final_state.get('headline_generated'):
+            await asyncio.to_thread(update_thread_headline, user_id, thread_id, final_state['headline'])
+        await asyncio.to_thread(prune_thread_checkpoints, thread_id)
+
+        # Messages are not serializable and not needed by the frontend
+        final_state.pop('messages', None)
+        # The packed context repeats retrieved_docs
+        final_state.pop('context', None)
+        return 200, final_state
+
+    except Exception as e:
+        logger.exception("Error processing query: %s", e)
+        return 500, {"error": str(e)}
+
+
+async def handle_query(scope, receive, send, always_stream):
+    """Serve a query request; returns the response status"""
+    body = await read_body(receive)
+    environ = build_environ(scope, io.BytesIO(body))
+    # Observed in application() including the graph run, not when the Flask part ends
+    environ["rag.skip_request_metrics"] = True
+    # This task's records get the same request id as the Flask part's
+    bind_log_context(request_id=request_id(environ))
+    profile = None
+    if profiling.PROFILING_ENABLED:
+        # Profiled here, graph run included; the Flask hooks only add the header
+        profile = profiling.start_profile(profile_token(environ), profile_label(environ))
+        environ["rag.profile"] = profile
+        environ["rag.profile_external"] = True
+    try:
+        return await serve_query(environ, send, always_stream)
+    finally:
+        if profile is not None:
+            await asyncio.to_thread(profile.stop)
+
+
+async def serve_query(environ, send, always_stream):
+    """The response to a query request; returns its status"""
+    params, response = await asyncio.to_thread(prepare_query, environ, always_stream)
+
+    if params is None:
+        await send({"type": "http.response.start", "status": response.status_code,
+                    "headers": asgi_headers(response)})
+        await send({"type": "http.response.body", "body": response.get_data()})
+        return response.status_code
+
+    bind_log_context(thread_id=params["thread_id"])
+    if params["stream"]:
+        await send({"type": "http.response.start", "status": response.status_code,
+                    "headers": asgi_headers(response, drop_content_length=True)})
+        async for event in astream_query_events(params["question"], params["thread_id"], params["user_id"],
+                                              params["retrieval"]):
+            await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+        return response.status_code
+
+    status, payload = await run_query(params["question"], params["thread_id"], params["user_id"], params["retrieval"])
+    with flask_app.app_context():
+        data = flask_app.json.response(payload).get_data()
+    headers = asgi_headers(response, drop_content_length=True)
+    headers.append((b"content-length", str(len(data)).encode("latin-1")))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": data})
+    return status
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            warm_up_tokenizer()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in ASYNC_ROUTES:
+        started = time.perf_counter()
+        status = 500
+        try:
+            status = await handle_query(scope, receive, send, ASYNC_ROUTES[scope["path"]])
+        finally:
+            metrics.REQUEST_LATENCY.observe(time.perf_counter() - started, method="POST",
+                                            route=scope["path"], status=str(status))
+        return
+
+    await wsgi_application(scope, receive, send)
@@ -0,0 +1,100 @@
+"""
+Checkpoint Cost vs Thread Length
+================================
+Measures how the size of a thread's checkpoint and the time to write and
+read it grow with the number of turns, with unbounded messages (the old
+behaviour) and with the conversation window (CONVERSATION_WINDOW_TURNS).
+
+Uses an in-memory saver by default, which still serialises every
+checkpoint; pass --mongo-uri to measure a real MongoDBSaver (a scratch
+database is created and dropped).
+
+Run from the /backend directory:
+    python -m benchmarks.checkpoint_size --turns 10 50 200 1000 --window 20
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.memory import InMemorySaver
+
+from langgraph_comp.conversation import split_window
+
+# Roughly the size of a typical question and RAG answer
+QUESTION = "How do I create a simple Langchain agent with a custom tool? "
+ANSWER = "To create an agent, define your tools, pick a chat model and call create_agent. " * 8
+
+
+def conversation(turns: int) -> list:
+    messages = []
+    for turn in range(turns):
+        messages.append(HumanMessage(content=f"{QUESTION}({turn})", id=str(uuid.uuid4())))
+        messages.append(AIMessage(content=ANSWER, id=str(uuid.uuid4())))
+    return messages
+
+
+def measure(saver, messages: list, repeats: int) -> dict:
+    config = {"configurable": {"thread_id": str(uuid.uuid4()), "checkpoint_ns": ""}}
+    put_ms, get_ms = [], []
+    for _ in range(repeats):
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = {"messages": messages}
+        checkpoint["channel_versions"] = {"messages": 1}
+        started = time.perf_counter()
+        config = saver.put(config, checkpoint, {"source": "loop", "step": 1}, {"messages": 1})
+        put_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        saver.get_tuple({"configurable": {"thread_id": config["configurable"]["thread_id"], "checkpoint_ns": ""}})
+        get_ms.append((time.perf_counter() - started) * 1000)
+    _, serialized = saver.serde.dumps_typed(messages)
+    return {
+        "kb": len(serialized) / 1024,
+        "put_ms": statistics.median(put_ms),
+        "get_ms": statistics.median(get_ms),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 200, 1000])
+    parser.add_argument("--window", type=int, default=20, help="Turns kept in the live state")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--mongo-uri", default=None, help="Measure MongoDBSaver instead of the in-memory saver")
+    args = parser.parse_args()
+
+    client = None
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        from langgraph.checkpoint.mongodb import MongoDBSaver
+        client = MongoClient(args.mongo_uri)
+        db_name = f"checkpoint_benchmark_{uuid.uuid4().hex[:8]}"
+        saver = MongoDBSaver(client, db_name=db_name)
+    else:
+        saver = InMemorySaver()
+
+    print(f"[INFO] {type(saver).__name__}, median of {args.repeats} writes/reads per row")
+    print(f"{'turns':>7}{'mode':>12}{'stored':>8}{'size KB':>10}{'put ms':>9}{'get ms':>9}")
+    try:
+        for turns in args.turns:
+            messages = conversation(turns)
+            _, windowed = split_window(messages, args.window)
+            for mode, stored in (("unbounded", messages), (f"window {args.window}", windowed)):
+                result = measure(saver, stored, args.repeats)
+                print(f"{turns:>7}{mode:>12}{len(stored) // 2:>8}{result['kb']:>10.1f}"
+                      f"{result['put_ms']:>9.2f}{result['get_ms']:>9.2f}")
+    finally:
+        if client is not None:
+            client.drop_database(db_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Prompt Context Benchmark
+========================
+Compares the old prompt context (the retrieved chunk texts pasted in as a
+Python list) with the token-budgeted context from langgraph_comp/context.py
+at several budgets. Reports mean prompt tokens, blocks packed, how many of
+the question's relevant fixture chunks made it into the prompt, and the
+time to build the context.
+
+Documents are built per topic folder of the fixture corpus
+(benchmarks/fixtures/retrieval_corpus.json): the folder's chunks with
+filler paragraphs of corpus words in between, split with the real
+ingestion splitter (1000 characters, 200 overlap) so neighbouring chunks
+repeat text as they do in Qdrant. Each question retrieves its --top-k
+chunks by fake-embedding similarity (see retrieval_fixture.py), so no
+services are needed. Prompt tokens are what the model prefills before the
+first token, so they track time to first token.
+
+Run from the /backend directory:
+    python -m benchmarks.context_budget --budget 500 1000 2000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.retrieval_fixture import fake_embedding, load_corpus, percentile
+from data_insertion.extraction import chunk_text
+from data_insertion.retrieval import document_texts
+from langgraph_comp import context
+from langgraph_comp.graph import RAG_PROMPT_TEMPLATE
+
+
+def filler(words, rng, count):
+    return " ".join(rng.choice(words) for _ in range(count)) + "."
+
+
+def build_chunks(corpus, filler_words, seed=0):
+    """Chunk dicts ({id, text, source_file, chunk_index}) of one document per topic folder"""
+    rng = random.Random(seed)
+    words = " ".join(doc["text"] for doc in corpus["documents"]).split()
+    folders = {}
+    for doc in corpus["documents"]:
+        folders.setdefault(doc["source_file"].split("/")[0], []).append(doc["text"])
+
+    chunks = []
+    for folder, texts in sorted(folders.items()):
+        paragraphs = []
+        for text in texts:
+            paragraphs.extend([filler(words, rng, filler_words), text])
+        paragraphs.append(filler(words, rng, filler_words))
+        for index, text in enumerate(chunk_text("\n\n".join(paragraphs))):
+            chunks.append({"id": f"{folder}-{index}", "text": text,
+                           "source_file": f"{folder}.pdf", "chunk_index": index})
+    return chunks
+
+
+def retrieve(query, chunks, vectors, top_k):
+    query_vector = fake_embedding(query)
+    scored = [(sum(a * b for a, b in zip(query_vector, vector)), chunk) for chunk, vector in zip(chunks, vectors)]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [dict(chunk, score=score) for score, chunk in scored[:top_k]]
+
+
+def run(corpus, results, budget):
+    relevant_texts = {doc["id"]: doc["text"] for doc in corpus["documents"]}
+    tokens, blocks, covered, latencies = [], [], [], []
+    for item, docs in zip(corpus["queries"], results):
+        started = time.perf_counter()
+        if budget is None:
+            text, packed = str(document_texts(docs)), len(docs)
+        else:
+            text, stats = context.build_context(docs, budget)
+            packed = stats["packed_blocks"]
+        latencies.append(time.perf_counter() - started)
+        tokens.append(context.count_tokens(RAG_PROMPT_TEMPLATE.format(context=text, question=item["query"])))
+        blocks.append(packed)
+        # The list context escapes newlines, so compare on whitespace-normalised text
+        flat = " ".join(text.replace("\\n", " ").split())
+        found = [" ".join(relevant_texts[doc_id].split()) in flat for doc_id in item["relevant"]]
+        covered.append(sum(found) / len(found))
+    return {
+        "tokens": sum(tokens) / len(tokens),
+        "max_tokens": max(tokens),
+        "blocks": sum(blocks) / len(blocks),
+        "coverage": sum(covered) / len(covered),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=int, nargs="+", default=[500, 1000, 2000], help="Context token budgets")
+    parser.add_argument("--top-k", type=int, default=8, help="Chunks retrieved per question")
+    parser.add_argument("--filler-words", type=int, default=60, help="Filler words between fixture chunks")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    chunks = build_chunks(corpus, args.filler_words)
+    vectors = [fake_embedding(chunk["text"]) for chunk in chunks]
+    results = [retrieve(item["query"], chunks, vectors, args.top_k) for item in corpus["queries"]]
+    # Load the tokenizer outside the timings
+    counter = "tiktoken " + context.CONTEXT_TOKENIZER_ENCODING if context.get_encoding() else "4 chars per token"
+    print(f"[INFO] {len(chunks)} chunks, {len(corpus['queries'])} questions, top_k={args.top_k}, "
+          f"tokens counted with {counter}")
+
+    print(f"{'context':<22}{'prompt tok':>11}{'max tok':>9}{'blocks':>8}{'relevant':>10}{'p50 ms':>9}{'p95 ms':>9}")
+    for name, budget in [("list of chunks (old)", None)] + [(f"budget={b}", b) for b in args.budget]:
+        result = run(corpus, results, budget)
+        print(f"{name:<22}{result['tokens']:>11.0f}{result['max_tokens']:>9}{result['blocks']:>8.1f}"
+              f"{result['coverage']:>10.3f}{result['p50_ms']:>9.3f}{result['p95_ms']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Query Embedding Cache Benchmark
+===============================
+Runs create_embedding over a set of evaluation-style questions (with case
+and whitespace variants) against a local fake embeddings server and reports
+cold vs warm latency, hit rates, and the number of embedding requests made.
+Fails if a warm cache, or a restarted process reading the persistent tier,
+still calls the embeddings API.
+
+Run from the /backend directory:
+    python -m benchmarks.embedding_cache --latency-ms 30
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_openai_server import FakeEmbeddingServer
+
+QUESTIONS = [
+    "How do I create a simple Langchain Agent?",
+    "What is LCEL in LangChain?",
+    "Explain the difference between a chain and an agent.",
+    "What is a retriever in Langchain?",
+    "How does memory work in Langchain?",
+    "What are LangChain tools?",
+    "What is the purpose of LangSmith?",
+    "What is LangGraph and how does it differ from standard LangChain?",
+    "How can I integrate an OpenAI model in LangChain?",
+    "What is a Document object in LangChain?",
+]
+
+
+def variants(question: str) -> list:
+    return [question, question.lower(), f"  {question}  ", question.replace(" ", "\n", 1)]
+
+
+def timed_pass(create_embedding, queries: list) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        if create_embedding(query) is None:
+            raise AssertionError(f"no embedding for {query!r}")
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--dim", type=int, default=1024)
+    args = parser.parse_args()
+
+    with FakeEmbeddingServer(dim=args.dim, latency=args.latency_ms / 1000, per_item_latency=0) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        os.environ["OPENAI_API_BASE"] = server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+        os.environ.setdefault("EMBEDDING_MODEL", "fake-embedding")
+        from data_insertion import db_operations
+        from data_insertion.embedding_cache import EmbeddingCache
+
+        cache_path = os.path.join(tmp, "embeddings.sqlite3")
+        db_operations.query_embedding_cache = EmbeddingCache(path=cache_path)
+        queries = [variant for question in QUESTIONS for variant in variants(question)]
+
+        cold_ms = timed_pass(db_operations.create_embedding, queries)
+        cold_requests = server.requests
+        warm_ms = timed_pass(db_operations.create_embedding, queries)
+        warm_requests = server.requests - cold_requests
+        warm_stats = db_operations.query_embedding_cache.stats()
+
+        # A fresh cache on the same file stands in for a restarted worker
+        db_operations.query_embedding_cache = EmbeddingCache(path=cache_path)
+        restart_ms = timed_pass(db_operations.create_embedding, queries)
+        restart_requests = server.requests - cold_requests - warm_requests
+        restart_stats = db_operations.query_embedding_cache.stats()
+
+    print(f"[INFO] {len(queries)} queries ({len(QUESTIONS)} distinct after normalisation)")
+    print(f"{'pass':<22}{'ms/query':>10}{'requests':>10}{'cum. hit rate':>15}")
+    print(f"{'cold':<22}{cold_ms:>10.3f}{cold_requests:>10}{'-':>15}")
+    print(f"{'warm (memory)':<22}{warm_ms:>10.3f}{warm_requests:>10}{warm_stats['hit_rate']:>15.2f}")
+    print(f"{'restart (sqlite)':<22}{restart_ms:>10.3f}{restart_requests:>10}{restart_stats['hit_rate']:>15.2f}")
+
+    if cold_requests != len(QUESTIONS):
+        raise SystemExit(f"[FAIL] expected {len(QUESTIONS)} embedding requests on a cold cache, got {cold_requests}")
+    if warm_requests or restart_requests:
+        raise SystemExit("[FAIL] a warm cache still made embedding requests")
+    print("[INFO] Warm and persistent caches made no embedding requests")
+
+
+if __name__ == "__main__":
+    main()
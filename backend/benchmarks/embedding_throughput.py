@@ -0,0 +1,97 @@
+"""
+Embedding Throughput Benchmark
+==============================
+Compares the old one-request-per-chunk embedding loop with BatchEmbedder
+against a local fake embeddings server, so no model server is needed.
+
+Run from the /backend directory:
+    python -m benchmarks.embedding_throughput --chunks 500 --latency-ms 50
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import OpenAI
+
+from benchmarks.fake_openai_server import FakeEmbeddingServer, fake_vector
+from data_insertion.batch_embedding import BatchEmbedder
+
+
+def make_chunks(count: int) -> list:
+    return [f"chunk {i}: " + "lorem ipsum dolor sit amet " * 30 for i in range(count)]
+
+
+def run_sequential(client: OpenAI, chunks: list, model: str) -> list:
+    """The pre-batching behaviour: one synchronous request per chunk."""
+    vectors = []
+    for chunk in chunks:
+        response = client.embeddings.create(input=[chunk.replace("\n", " ")], model=model)
+        vectors.append(response.data[0].embedding)
+    return vectors
+
+
+def check_order(chunks: list, vectors: list, dim: int):
+    for chunk, vector in zip(chunks, vectors):
+        expected = fake_vector(chunk.replace("\n", " "), dim)
+        if vector is None or abs(vector[0] - expected[0]) > 1e-6:
+            raise AssertionError("embeddings were returned out of chunk order")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fixed latency per request")
+    parser.add_argument("--per-item-ms", type=float, default=1.0, help="extra latency per input text")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 429/503")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 64])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--skip-sequential", action="store_true")
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.chunks)
+    model = "fake-embedding"
+
+    with FakeEmbeddingServer(
+        dim=args.dim,
+        latency=args.latency_ms / 1000,
+        per_item_latency=args.per_item_ms / 1000,
+        error_rate=args.error_rate,
+    ) as server:
+        client = OpenAI(base_url=server.base_url, api_key="benchmark")
+        print(f"[INFO] Fake embeddings server at {server.base_url}, {len(chunks)} chunks")
+        print(f"{'mode':<28}{'seconds':>10}{'chunks/s':>12}{'requests':>10}{'speedup':>10}")
+
+        baseline = None
+        if not args.skip_sequential:
+            start_requests = server.requests
+            start = time.perf_counter()
+            vectors = run_sequential(client.with_options(max_retries=5), chunks, model)
+            baseline = time.perf_counter() - start
+            check_order(chunks, vectors, args.dim)
+            print(f"{'sequential (1 per request)':<28}{baseline:>10.2f}{len(chunks) / baseline:>12.1f}"
+                  f"{server.requests - start_requests:>10}{1.0:>10.1f}")
+
+        for batch_size in args.batch_sizes:
+            for concurrency in args.concurrency:
+                embedder = BatchEmbedder(client, model, batch_size=batch_size, concurrency=concurrency,
+                                         backoff_base=0.01)
+                start_requests = server.requests
+                start = time.perf_counter()
+                vectors = embedder.embed(chunks)
+                elapsed = time.perf_counter() - start
+                check_order(chunks, vectors, args.dim)
+                speedup = f"{baseline / elapsed:>10.1f}" if baseline else f"{'-':>10}"
+                print(f"{f'batch={batch_size} workers={concurrency}':<28}{elapsed:>10.2f}"
+                      f"{len(chunks) / elapsed:>12.1f}{server.requests - start_requests:>10}{speedup}")
+
+        if args.error_rate:
+            print(f"[INFO] Server injected {server.errors} failures, all retried")
+
+
+if __name__ == "__main__":
+    main()
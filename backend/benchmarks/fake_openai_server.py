@@ -0,0 +1,105 @@
+"""
+Local stand-in for an OpenAI-compatible embeddings endpoint.
+
+Serves POST /v1/embeddings with deterministic vectors and a configurable
+simulated latency, so embedding throughput can be measured offline. A
+fraction of requests can be answered with 429/503 to exercise retries.
+"""
+
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_vector(text: str, dim: int) -> list:
+    """Deterministic pseudo-random unit-ish vector derived from the text."""
+    values = []
+    counter = 0
+    while len(values) < dim:
+        digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+        values.extend(b / 127.5 - 1.0 for b in struct.unpack("32B", digest))
+        counter += 1
+    return values[:dim]
+
+
+class FakeEmbeddingServer:
+    """
+    Threaded HTTP server run in the background. Each request sleeps for
+    latency + per_item_latency * len(input) seconds before answering.
+    """
+
+    def __init__(self, dim=1024, latency=0.05, per_item_latency=0.001, error_rate=0.0, seed=0):
+        self.dim = dim
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body, headers=None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                inputs = body["input"]
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+
+                with server._lock:
+                    server.requests += 1
+                    fail = server._random.random() < server.error_rate
+                    if fail:
+                        server.errors += 1
+                if fail:
+                    status = 429 if server._random.random() < 0.5 else 503
+                    self._reply(status, {"error": {"message": "simulated failure"}}, {"Retry-After": "0.01"})
+                    return
+
+                time.sleep(server.latency + server.per_item_latency * len(inputs))
+                self._reply(200, {
+                    "object": "list",
+                    "model": body.get("model"),
+                    "data": [
+                        {"object": "embedding", "index": i, "embedding": fake_vector(text, server.dim)}
+                        for i, text in enumerate(inputs)
+                    ],
+                    "usage": {"prompt_tokens": 0, "total_tokens": 0},
+                })
+
+        return Handler
@@ -0,0 +1,83 @@
+"""
+Dense vs Hybrid Retrieval Benchmark
+===================================
+Ingests the fixture corpus (benchmarks/fixtures/retrieval_corpus.json) into
+an in-memory Qdrant with the real ingestion code, then runs every fixture
+question through search_points() in dense mode and in hybrid mode (dense +
+BM25 sparse vectors fused with RRF) for each RRF k / prefetch setting, and
+reports recall@1, recall@k, MRR and search latency. Embeddings come from a
+local fake client (see retrieval_fixture.py), so no services are needed;
+pass --real-embeddings to embed with EMBEDDING_MODEL on OPENAI_API_BASE
+instead. Latency covers the Qdrant search and fusion only.
+
+Run from the /backend directory:
+    python -m benchmarks.hybrid_retrieval --k 5 --rrf-k 10 60 --prefetch 10 20
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("COLLECTION_NAME", "retrieval_benchmark")
+os.environ.setdefault("EMBEDDING_MODEL", "fake")
+
+from benchmarks.retrieval_fixture import (
+    load_collection, load_corpus, percentile, recall_at_k, reciprocal_rank,
+)
+from data_insertion import db_operations
+from data_insertion.retrieval import RetrievalConfig
+
+
+def run(queries, text_to_id, config, repeats):
+    k = config.top_k
+    hits, recalls, ranks, latencies = [], [], [], []
+    for item in queries:
+        query_vector = db_operations.create_embedding(item["query"])
+        for _ in range(repeats):
+            started = time.perf_counter()
+            points = db_operations.search_points(item["query"], query_vector, config)
+            latencies.append(time.perf_counter() - started)
+        retrieved = [text_to_id[point.payload["text"]] for point, _ in points]
+        hits.append(recall_at_k(retrieved, item["relevant"], 1) > 0)
+        recalls.append(recall_at_k(retrieved, item["relevant"], k))
+        ranks.append(reciprocal_rank(retrieved, item["relevant"]))
+    return {
+        "recall_1": sum(hits) / len(hits),
+        "recall": sum(recalls) / len(recalls),
+        "mrr": sum(ranks) / len(ranks),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=5, help="Documents retrieved per question")
+    parser.add_argument("--rrf-k", type=int, nargs="+", default=[60])
+    parser.add_argument("--prefetch", type=int, nargs="+", default=[20])
+    parser.add_argument("--repeats", type=int, default=5, help="Timed searches per question")
+    parser.add_argument("--real-embeddings", action="store_true",
+                        help="Embed with the configured embeddings endpoint instead of the fake client")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    text_to_id = load_collection(corpus, fake_embeddings=not args.real_embeddings)
+    queries = corpus["queries"]
+    print(f"[INFO] {len(corpus['documents'])} chunks, {len(queries)} questions, k={args.k}")
+
+    settings = [("dense", RetrievalConfig(top_k=args.k, mode="dense"))] + [
+        (f"hybrid rrf_k={rrf_k} prefetch={prefetch}",
+         RetrievalConfig(top_k=args.k, mode="hybrid", rrf_k=rrf_k, prefetch=prefetch))
+        for rrf_k in args.rrf_k for prefetch in args.prefetch
+    ]
+    print(f"{'mode':<30}{'recall@1':>10}{'recall@' + str(args.k):>10}{'MRR':>8}{'p50 ms':>9}{'p95 ms':>9}")
+    for name, config in settings:
+        result = run(queries, text_to_id, config, args.repeats)
+        print(f"{name:<30}{result['recall_1']:>10.3f}{result['recall']:>10.3f}{result['mrr']:>8.3f}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Concurrent /query Load Test
+===========================
+Fires the same batch of concurrent /query requests at the Flask app (WSGI,
+served by a fixed pool of worker threads, as the threaded dev server or
+gunicorn would) and at the ASGI application (api/asgi.py, running the graph
+with ainvoke()), and reports throughput and latency percentiles.
+
+The LLM and vector search are replaced by stubs that only wait, so the
+numbers show how much concurrency each serving mode gets out of one process,
+not model speed. Checkpoints go to an in-memory saver and the MongoDB user
+bookkeeping is stubbed, so no services are needed.
+
+Run from the /backend directory:
+    python -m benchmarks.load_test --requests 200 --threads 8 --llm-latency-ms 500
+"""
+
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for name, value in {
+    "MONGO_URI": "mongodb://localhost:27017/benchmark",
+    "OPENAI_API_KEY": "benchmark",
+    "OPENAI_API_BASE": "http://localhost:9/v1",
+    "GENERATION_MODEL": "stub",
+    "EMBEDDING_MODEL": "stub",
+    "QDRANT_URL": "http://localhost:6333",
+    "COLLECTION_NAME": "benchmark",
+}.items():
+    os.environ.setdefault(name, value)
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+ANSWER = "LangGraph adds stateful, cyclic graphs on top of LangChain runnables."
+DOCS = [
+    {"id": str(i), "score": 0.9, "text": text, "source_file": "bench.pdf", "chunk_index": i}
+    for i, text in enumerate(["LangGraph is a library for building stateful agents.", "Runnables compose with LCEL."])
+]
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model that waits `latency` seconds (blocking or async) and returns a fixed answer"""
+
+    latency: float = 0.5
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=ANSWER))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=ANSWER))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for word in ANSWER.split(" "):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class BenchUser:
+    """Stand-in for the MongoEngine User, found by Flask-Security's session loader"""
+
+    def __init__(self):
+        self.id = "benchmark-user"
+        self.email = "bench@example.com"
+        self.username = "bench"
+        self.fs_uniquifier = "benchmark-user"
+        self.active = True
+        self.is_authenticated = True
+        self.is_active = True
+        self.is_anonymous = False
+
+    def get_id(self):
+        return self.fs_uniquifier
+
+
+def install_stubs(llm_latency: float, retrieval_latency: float):
+    """Patch the graph and API modules; returns (flask_app, asgi_application, session_cookie)"""
+    from langgraph.checkpoint.memory import InMemorySaver
+    import clients
+    clients.override("checkpointer", InMemorySaver())
+    clients.override("chat_model", StubChatModel(latency=llm_latency))
+
+    from langgraph_comp import graph
+
+    def query_documents(query, config=None):
+        time.sleep(retrieval_latency)
+        return DOCS
+
+    async def aquery_documents(query, config=None):
+        await asyncio.sleep(retrieval_latency)
+        return DOCS
+
+    graph.query_documents = query_documents
+    graph.aquery_documents = aquery_documents
+    graph.record_turn = lambda thread_id, turn, question, answer: None
+
+    # By module name: the api package re-exports the Flask app as api.app
+    app_module, asgi_module = importlib.import_module("api.app"), importlib.import_module("api.asgi")
+    for module in (app_module, asgi_module):
+        module.find_and_append_thread = lambda thread_id, user_id: True
+        module.update_thread_headline = lambda user_id, thread_id, headline: None
+
+    user = BenchUser()
+    app_module.user_datastore.find_user = lambda **kwargs: user
+    flask_app = app_module.app
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    cookie = serializer.dumps({"_user_id": user.fs_uniquifier, "_fresh": True})
+    return flask_app, asgi_module.application, cookie
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(name, latencies, elapsed, errors):
+    print(f"{name:<28}{len(latencies) / elapsed:>10.1f}{percentile(latencies, 50) * 1000:>10.0f}"
+          f"{percentile(latencies, 95) * 1000:>10.0f}{percentile(latencies, 99) * 1000:>10.0f}{errors:>8}")
+
+
+def question_payload(i):
+    return {"question": f"What is LangGraph? ({i})", "thread_id": str(uuid.uuid4())}
+
+
+def run_wsgi(flask_app, cookie, requests, threads):
+    def one(i):
+        client = flask_app.test_client()
+        client.set_cookie("session", cookie)
+        started = time.perf_counter()
+        response = client.post("/query", json=question_payload(i))
+        return time.perf_counter() - started, response.status_code == 200
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(one, range(requests)))
+    return [r[0] for r in results], time.perf_counter() - started, sum(not r[1] for r in results)
+
+
+async def run_asgi(application, cookie, requests, concurrency, path="/query"):
+    import httpx
+
+    transport = httpx.ASGITransport(app=application)
+    limit = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", cookies={"session": cookie},
+                                 timeout=None) as client:
+        async def one(i):
+            async with limit:
+                started = time.perf_counter()
+                response = await client.post(path, json=question_payload(i))
+                ok = response.status_code == 200 and (path == "/query" or "event: done" in response.text)
+                return time.perf_counter() - started, ok
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(requests)))
+    return [r[0] for r in results], time.perf_counter() - started, sum(not r[1] for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8, help="WSGI worker threads")
+    parser.add_argument("--concurrency", type=int, default=200, help="In-flight requests against ASGI")
+    parser.add_argument("--llm-latency-ms", type=float, default=500)
+    parser.add_argument("--retrieval-latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    flask_app, application, cookie = install_stubs(args.llm_latency_ms / 1000, args.retrieval_latency_ms / 1000)
+    # Per-request INFO logs would drown the table
+    logging.disable(logging.INFO)
+
+    print(f"[INFO] {args.requests} first-turn requests; stub LLM {args.llm_latency_ms:.0f} ms, "
+          f"retrieval {args.retrieval_latency_ms:.0f} ms")
+    print(f"{'mode':<28}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    report(f"WSGI ({args.threads} threads)", *run_wsgi(flask_app, cookie, args.requests, args.threads))
+    report(f"ASGI /query ({args.concurrency})",
+           *asyncio.run(run_asgi(application, cookie, args.requests, args.concurrency)))
+    report(f"ASGI /query/stream ({args.concurrency})",
+           *asyncio.run(run_asgi(application, cookie, args.requests, args.concurrency, "/query/stream")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Local Index vs Qdrant Benchmark
+===============================
+Compares dense retrieval through search_points() on Qdrant with the
+embedded NumPy index (VECTOR_BACKEND=local, data_insertion/local_index.py)
+on the same points: the fixture corpus plus --distractors generated chunks,
+embedded with the deterministic fake client (see retrieval_fixture.py).
+
+For each backend it reports the labelled recall@k of the fixture questions,
+agreement with Qdrant's exact top k, p50/p95 latency of single queries and
+the QPS of --batch queries scored in one search_batch() call. The local
+index is measured with float32 and int8 vectors.
+
+Qdrant is the in-memory engine unless --qdrant-url points to a real server
+(a scratch collection is created and dropped). The in-memory engine is pure
+Python, so only --qdrant-url gives a fair comparison with a network round
+trip. --processes N also runs the single queries in N processes sharing
+the local index files and reports each one's share (PSS) of the mapped
+vector file against its resident size (RSS), Linux only.
+
+Run from the /backend directory:
+    python -m benchmarks.local_index_latency --distractors 5000
+    python -m benchmarks.local_index_latency --qdrant-url http://localhost:6333 --distractors 20000 --processes 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import uuid
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Always a fresh scratch name: with --qdrant-url the collection is dropped at the end
+os.environ["COLLECTION_NAME"] = f"local_index_benchmark_{uuid.uuid4().hex[:8]}"
+os.environ.setdefault("EMBEDDING_MODEL", "fake")
+
+from benchmarks.retrieval_fixture import distractor_records, load_collection, load_corpus, percentile, recall_at_k
+import clients
+from data_insertion import db_operations, insertion
+from data_insertion.local_index import LocalIndex
+from data_insertion.retrieval import RetrievalConfig
+
+
+def collection_points():
+    """(id, vector, payload) of every point in the benchmark collection"""
+    points, offset = [], None
+    while True:
+        batch, offset = clients.qdrant_client().scroll(
+            collection_name=insertion.COLLECTION_NAME, limit=1000, offset=offset, with_payload=True, with_vectors=True)
+        points.extend((str(point.id), point.vector[""] if isinstance(point.vector, dict) else point.vector,
+                       point.payload) for point in batch)
+        if offset is None:
+            return points
+
+
+def run(backend, query_vectors, config, rounds):
+    """Results of the last round and the latency of every search"""
+    db_operations.VECTOR_BACKEND = backend
+    latencies = []
+    for _ in range(rounds):
+        results = []
+        for vector in query_vectors:
+            started = time.perf_counter()
+            results.append(db_operations.search_points("", vector, config))
+            latencies.append(time.perf_counter() - started)
+    return results, latencies
+
+
+def batch_qps(index, query_vectors, k, batch, rounds):
+    queries = (query_vectors * (batch // len(query_vectors) + 1))[:batch]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        index.search_batch(queries, k)
+    return batch * rounds / (time.perf_counter() - started)
+
+
+def vector_file_bytes(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path) if name.startswith("vectors-"))
+
+
+def mapped_memory(path_part):
+    """(RSS, PSS) in bytes of this process's mappings of files whose path contains path_part"""
+    rss = pss = 0
+    current = False
+    with open("/proc/self/smaps", encoding="utf-8") as f:
+        for line in f:
+            fields = line.split()
+            if not fields[0].endswith(":"):
+                current = path_part in line
+            elif current and fields[0] in ("Rss:", "Pss:"):
+                if fields[0] == "Rss:":
+                    rss += int(fields[1]) * 1024
+                else:
+                    pss += int(fields[1]) * 1024
+    return rss, pss
+
+
+def worker(path, query_vectors, k, rounds, barrier, results):
+    index = LocalIndex(path)
+    index.search_batch(query_vectors[:1], k)
+    barrier.wait()  # every process has the file mapped before anyone measures
+    latencies = []
+    for _ in range(rounds):
+        for vector in query_vectors:
+            started = time.perf_counter()
+            index.search_batch([vector], k)
+            latencies.append(time.perf_counter() - started)
+    barrier.wait()
+    rss, pss = mapped_memory(os.path.join(path, "vectors-"))
+    results.put((percentile(latencies, 50), rss, pss))
+
+
+def shared_pages(path, query_vectors, k, rounds, processes):
+    context = multiprocessing.get_context("spawn")
+    barrier, results = context.Barrier(processes), context.Queue()
+    workers = [context.Process(target=worker, args=(path, query_vectors, k, rounds, barrier, results))
+               for _ in range(processes)]
+    for process in workers:
+        process.start()
+    measurements = [results.get() for _ in workers]
+    for process in workers:
+        process.join()
+    return measurements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=5, help="Documents retrieved per question")
+    parser.add_argument("--distractors", type=int, default=2000, help="Generated chunks added to the corpus")
+    parser.add_argument("--rounds", type=int, default=5, help="Passes over the questions per measurement")
+    parser.add_argument("--batch", type=int, default=64, help="Queries per search_batch() call")
+    parser.add_argument("--processes", type=int, default=0, help="Also search from this many processes")
+    parser.add_argument("--qdrant-url", default=None, help="Compare with a real Qdrant server instead of :memory:")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="Local mode performs exact")
+    warnings.filterwarnings("ignore", message="Payload indexes have no effect")
+    qdrant = None
+    if args.qdrant_url:
+        from qdrant_client import QdrantClient
+        qdrant = QdrantClient(url=args.qdrant_url, api_key=os.getenv("QDRANT_API_KEY"))
+    corpus = load_corpus()
+    text_to_id = load_collection(corpus, qdrant=qdrant)
+    try:
+        insertion.upsert_point_stream(insertion.iter_points(distractor_records(corpus, args.distractors)))
+        points = collection_points()
+        queries = corpus["queries"]
+        query_vectors = [db_operations.create_embedding(item["query"]) for item in queries]
+        config = RetrievalConfig(top_k=args.k, mode="dense", score_threshold=None)
+        print(f"[INFO] Qdrant {args.qdrant_url or ':memory:'}, {len(points)} points, {len(queries)} labelled "
+              f"questions, k={args.k}, {args.rounds} rounds")
+
+        truth, _ = run("qdrant", query_vectors, config._replace(exact=True), 1)
+        truth = [[str(point.id) for point, _ in result] for result in truth]
+        with tempfile.TemporaryDirectory() as directory:
+            backends = [("qdrant", None)]
+            for dtype in ("float32", "int8"):
+                index = LocalIndex(os.path.join(directory, dtype), dtype=dtype)
+                index.upsert(points)
+                backends.append((f"local {dtype}", index))
+
+            print(f"{'backend':<16}{'recall@' + str(args.k):>10}{'vs exact':>10}{'p50 ms':>9}{'p95 ms':>9}"
+                  f"{'batch QPS':>11}{'file MB':>9}")
+            for name, index in backends:
+                if index is not None:
+                    clients.override("local_index", index)
+                results, latencies = run("local" if index else "qdrant", query_vectors, config, args.rounds)
+                ids = [[str(point.id) for point, _ in result] for result in results]
+                agreement = sum(len(set(found) & set(exact)) / args.k for found, exact in zip(ids, truth)) / len(ids)
+                labelled = [[text_to_id.get(point.payload["text"]) for point, _ in result] for result in results]
+                recall = sum(recall_at_k(found, item["relevant"], args.k)
+                             for found, item in zip(labelled, queries)) / len(queries)
+                qps, size = "-", "-"
+                if index is not None:
+                    qps = f"{batch_qps(index, query_vectors, args.k, args.batch, args.rounds):.0f}"
+                    size = f"{vector_file_bytes(index.path) / 1e6:.1f}"
+                print(f"{name:<16}{recall:>10.3f}{agreement:>10.3f}{percentile(latencies, 50) * 1000:>9.2f}"
+                      f"{percentile(latencies, 95) * 1000:>9.2f}{qps:>11}{size:>9}")
+
+            if args.processes and os.path.exists("/proc/self/smaps"):
+                index = backends[1][1]
+                print(f"[INFO] {args.processes} processes searching {index.path} (float32)")
+                for i, (p50, rss, pss) in enumerate(shared_pages(index.path, query_vectors, args.k, args.rounds,
+                                                                  args.processes)):
+                    print(f"process {i}: p50 {p50 * 1000:.2f} ms, vector file RSS {rss / 1e6:.1f} MB, "
+                          f"PSS {pss / 1e6:.1f} MB")
+    finally:
+        db_operations.VECTOR_BACKEND = "qdrant"
+        if args.qdrant_url:
+            clients.qdrant_client().delete_collection(insertion.COLLECTION_NAME)
+
+
+if __name__ == "__main__":
+    main()
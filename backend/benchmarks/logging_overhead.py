@@ -0,0 +1,155 @@
+"""
+Logging Overhead Benchmark
+==========================
+Measures what logging costs a request on the request thread itself, before
+and after the queue-based pipeline in logging_config.py:
+
+- before: the handlers write from the request thread (rotating file plus
+  console, text format), and the graph print()s its debug output, including
+  the full generate output, on every request.
+- after: the request thread only enqueues records (LogQueueHandler), a
+  QueueListener thread writes them as JSON lines, and the generate output is
+  a DEBUG record that is never formatted at the default INFO level.
+
+Each simulated request emits the log records of one /query. --threads
+request threads log concurrently, and --console-latency-us makes every
+console write wait as a slow terminal or log collector would. Console
+output goes to /dev/null and the log file to a temporary directory.
+
+Run from the /backend directory:
+    python -m benchmarks.logging_overhead --requests 2000 --threads 1 8
+    python -m benchmarks.logging_overhead --console-latency-us 200
+"""
+
+import argparse
+import contextlib
+import logging
+import os
+import queue
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueListener
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.retrieval_fixture import percentile
+import logging_config
+
+ANSWER = " ".join(["LangGraph adds stateful, cyclic graphs on top of LangChain runnables."] * 30)
+
+
+class SlowStream:
+    """File-like wrapper whose writes wait `latency` seconds first"""
+
+    def __init__(self, stream, latency):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def generate_output(i):
+    """Same shape as graph.generate's output, which was printed on every request"""
+    from langchain_core.messages import AIMessage, HumanMessage
+    query = f"What is LangGraph? ({i})"
+    return query, {"answer": ANSWER, "messages": [HumanMessage(content=query), AIMessage(content=ANSWER)]}
+
+
+def log_request(logger, i, query, output, legacy):
+    """The log records of one /query"""
+    thread_id = f"thread-{i}"
+    if legacy:
+        print(f"DEBUG: Retrieving documents for query: {query}")
+    logger.info("Retrieving documents for query: %s", query)
+    logger.info("Reranked %d candidates with %s in %.1fms", 50, "lexical", 4.2)
+    logger.info("Prompt: %d tokens (%d context tokens, %d of %d blocks from %d documents%s)",
+                1545, 1380, 5, 5, 5, "")
+    if legacy:
+        print("DEBUG: Generating answer...")
+    logger.info("Generating answer...")
+    if legacy:
+        print(f"DEBUG: Generate output: {output}")
+    else:
+        logger.debug("Generate output: %s", output)
+    logger.info("Updated headline for thread %s to: %s", thread_id, "LangGraph Overview")
+
+
+def run(logger, legacy, requests, threads):
+    """Seconds each request spent logging"""
+    def one(i):
+        query, output = generate_output(i)
+        started = time.perf_counter()
+        if not legacy:
+            logging_config.bind_log_context(request_id=f"req-{i}", thread_id=f"thread-{i}")
+        log_request(logger, i, query, output, legacy)
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(one, range(requests)))
+
+
+def before_logger(directory, console):
+    logger = logging.getLogger("logging_benchmark.before")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    for handler in (logging_config.file_handler(os.path.join(directory, "before.log"), "text"),
+                    logging.StreamHandler(console)):
+        handler.setFormatter(logging.Formatter(logging_config.FORMAT))
+        logger.addHandler(handler)
+    return logger, None
+
+
+def after_logger(directory, console):
+    logger = logging.getLogger("logging_benchmark.after")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    log_queue = queue.Queue(logging_config.LOG_QUEUE_SIZE)
+    logger.addHandler(logging_config.LogQueueHandler(log_queue))
+    stream = logging.StreamHandler(console)
+    stream.setFormatter(logging.Formatter(logging_config.FORMAT))
+    listener = QueueListener(log_queue, logging_config.file_handler(os.path.join(directory, "after.log"), "json"),
+                             stream)
+    listener.start()
+    return logger, listener
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Simulated requests per measurement")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8], help="Concurrent request threads")
+    parser.add_argument("--console-latency-us", type=float, default=0, help="Added wait per console write")
+    args = parser.parse_args()
+
+    print(f"[INFO] {args.requests} requests, console latency {args.console_latency_us:.0f} us per write")
+    print(f"{'mode':<10}{'threads':>8}{'mean us':>10}{'p95 us':>10}{'p99 us':>10}{'drain ms':>10}")
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+        console = SlowStream(devnull, args.console_latency_us / 1e6)
+        for threads in args.threads:
+            for name, setup, legacy in (("before", before_logger, True), ("after", after_logger, False)):
+                logger, listener = setup(directory, console)
+                # print() went to the console too
+                with contextlib.redirect_stdout(console):
+                    latencies = run(logger, legacy, args.requests, threads)
+                started = time.perf_counter()
+                if listener is not None:
+                    # Not on any request's path: how long the listener needs to catch up
+                    listener.stop()
+                drain = (time.perf_counter() - started) * 1000
+                for handler in list(logger.handlers):
+                    logger.removeHandler(handler)
+                    handler.close()
+                print(f"{name:<10}{threads:>8}{sum(latencies) / len(latencies) * 1e6:>10.1f}"
+                      f"{percentile(latencies, 95) * 1e6:>10.1f}{percentile(latencies, 99) * 1e6:>10.1f}"
+                      f"{drain:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
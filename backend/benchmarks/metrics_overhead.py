@@ -0,0 +1,162 @@
+"""
+Metrics Overhead and Export Check
+=================================
+Measures what the instrumentation in metrics.py costs and checks what
+/metrics exports:
+
+1. The cost of one histogram observation, one counter increment and one
+   timed() block, single-threaded and with --threads threads contending for
+   the same series.
+2. A batch of stubbed /query and /query/stream requests (see load_test.py:
+   stub LLM and retrieval, in-memory checkpoints, no services) through the
+   Flask app and the ASGI application, after which /metrics is scraped. The
+   run fails if the output is not valid Prometheus text (every sample line
+   parses, buckets are cumulative, the +Inf bucket equals _count) or if a
+   series the requests must have produced is missing. It also reports how
+   many observations a request records and what they cost per request.
+
+Run from the /backend directory:
+    python -m benchmarks.metrics_overhead
+    python -m benchmarks.metrics_overhead --iterations 500000 --requests 50
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.load_test import install_stubs, run_asgi, run_wsgi
+import metrics
+
+SAMPLE_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (-?[0-9.e+-]+|\+Inf)$')
+
+# Series a first-turn /query must produce (the stubs bypass embeddings, Qdrant and MongoDB)
+EXPECTED_SERIES = [
+    'rag_http_request_duration_seconds_count{method="POST",route="/query",status="200"}',
+    'rag_http_request_duration_seconds_count{method="POST",route="/query/stream",status="200"}',
+    'rag_node_duration_seconds_count{node="retrieve"}',
+    'rag_node_duration_seconds_count{node="build_context"}',
+    'rag_node_duration_seconds_count{node="generate"}',
+    'rag_node_duration_seconds_count{node="generate_headline"}',
+    'rag_node_duration_seconds_count{node="finish_turn"}',
+    'rag_call_duration_seconds_count{call="llm_generate"}',
+    'rag_call_duration_seconds_count{call="llm_headline"}',
+    'rag_llm_tokens_total{call="llm_generate",kind="prompt"}',
+    'rag_llm_tokens_total{call="llm_generate",kind="completion"}',
+]
+
+
+def per_operation(operation, iterations, threads):
+    """Nanoseconds per call of operation() with `threads` threads calling it"""
+    def loop(count):
+        for _ in range(count):
+            operation()
+
+    started = time.perf_counter()
+    if threads == 1:
+        loop(iterations)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(loop, [iterations // threads] * threads))
+    return (time.perf_counter() - started) / iterations * 1e9
+
+
+def microbenchmarks(iterations, threads):
+    histogram = metrics.Histogram("bench_seconds", "benchmark", ["node"])
+    counter = metrics.Counter("bench_total", "benchmark", ["cache", "result"])
+
+    def timed_block():
+        with metrics.timed(histogram, node="retrieve"):
+            pass
+
+    operations = [
+        ("histogram observe", lambda: histogram.observe(0.042, node="retrieve")),
+        ("counter inc", lambda: counter.inc(cache="answer", result="hit")),
+        ("timed() block", timed_block),
+    ]
+    print(f"{'operation':<20}{'1 thread ns':>13}{f'{threads} threads ns':>16}")
+    costs = {}
+    for name, operation in operations:
+        single = costs[name] = per_operation(operation, iterations, 1)
+        print(f"{name:<20}{single:>13.0f}{per_operation(operation, iterations, threads):>16.0f}")
+    return costs
+
+
+def samples(text):
+    """{'name{labels}': value}; raises ValueError on a line that is not valid exposition format"""
+    values = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = SAMPLE_LINE.match(line)
+        if match is None:
+            raise ValueError(f"Unparseable sample line: {line}")
+        values[f"{match.group(1)}{match.group(2) or ''}"] = float(match.group(3))
+    return values
+
+
+def histogram_problems(values):
+    """Buckets that decrease or a +Inf bucket that differs from _count"""
+    problems = []
+    series = {}
+    for key, value in values.items():
+        match = re.match(r'^(\w+)_bucket\{(.*?),?le="([^"]+)"\}$', key)
+        if match:
+            series.setdefault((match.group(1), match.group(2)), []).append((float(match.group(3)), value))
+    for (name, labels), buckets in series.items():
+        counts = [count for _, count in sorted(buckets)]
+        if counts != sorted(counts):
+            problems.append(f"{name}{{{labels}}} buckets are not cumulative")
+        if counts[-1] != values.get(f"{name}_count{{{labels}}}" if labels else f"{name}_count"):
+            problems.append(f"{name}{{{labels}}} +Inf bucket differs from _count")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200000, help="Calls per microbenchmark")
+    parser.add_argument("--threads", type=int, default=8, help="Threads for the contended microbenchmark")
+    parser.add_argument("--requests", type=int, default=20, help="Stubbed requests per serving mode")
+    args = parser.parse_args()
+
+    costs = microbenchmarks(args.iterations, args.threads)
+
+    flask_app, application, cookie = install_stubs(llm_latency=0.0, retrieval_latency=0.0)
+    logging.disable(logging.INFO)
+    run_wsgi(flask_app, cookie, args.requests, 4)
+    asyncio.run(run_asgi(application, cookie, args.requests, 8))
+    asyncio.run(run_asgi(application, cookie, args.requests, 8, "/query/stream"))
+
+    response = flask_app.test_client().get("/metrics")
+    text = response.get_data(as_text=True)
+    failures = []
+    if not response.headers["Content-Type"].startswith("text/plain; version=0.0.4"):
+        failures.append(f"content type {response.headers['Content-Type']}")
+    try:
+        values = samples(text)
+    except ValueError as e:
+        raise SystemExit(f"[FAIL] {e}")
+    failures.extend(histogram_problems(values))
+    failures.extend(f"missing {series}" for series in EXPECTED_SERIES if not values.get(series))
+
+    requests = 3 * args.requests
+    observations = sum(value for key, value in values.items()
+                       if key.startswith(("rag_node_duration_seconds_count", "rag_call_duration_seconds_count",
+                                          "rag_http_request_duration_seconds_count")))
+    per_request = observations / requests
+    print(f"[INFO] /metrics: {len(text.splitlines())} lines, {len(values)} samples after {requests} requests")
+    print(f"[INFO] {per_request:.1f} timed observations per request, "
+          f"~{per_request * costs['timed() block'] / 1000:.1f} us of instrumentation per request")
+    if failures:
+        raise SystemExit("[FAIL] " + "; ".join(failures))
+    print(f"[OK] All {len(EXPECTED_SERIES)} expected series exported")
+
+
+if __name__ == "__main__":
+    main()
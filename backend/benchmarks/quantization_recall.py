@@ -0,0 +1,201 @@
+"""
+Quantization Memory vs Recall Benchmark
+=======================================
+For each collection layout (see data_insertion/collection.py) reports the
+RAM and disk its dense vectors and HNSW graph need (estimate_memory(), for
+the fixture collection and for --scale-points points) against the recall
+it keeps: top-k overlap with exact float32 search ("vs exact") and recall@k
+of the labelled fixture questions, with and without re-scoring the
+--oversampling x k quantized candidates with the original vectors.
+
+The fixture corpus plus --distractors generated chunks is embedded with the
+deterministic fake client (see retrieval_fixture.py). The in-memory Qdrant
+ignores quantization, so offline the searches are simulated with NumPy on
+the collection's vectors: int8 scalar quantization clipped at the
+QDRANT_SCALAR_QUANTILE quantile and 1-bit binary quantization scored by
+matching bits, as Qdrant does. Product quantization needs the k-means
+codebooks of a real server: pass --qdrant-url to create one scratch
+collection per layout there (dropped afterwards) and measure all layouts
+with Qdrant itself, against exact=True search.
+
+Run from the /backend directory:
+    python -m benchmarks.quantization_recall --k 5 --oversampling 1 2 4
+    python -m benchmarks.quantization_recall --qdrant-url http://localhost:6333 --distractors 5000
+"""
+
+import argparse
+import os
+import sys
+import uuid
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Always a fresh scratch name: with --qdrant-url the scratch collections are named after it
+os.environ["COLLECTION_NAME"] = f"quantization_benchmark_{uuid.uuid4().hex[:8]}"
+os.environ.setdefault("EMBEDDING_MODEL", "fake")
+
+from benchmarks.retrieval_fixture import distractor_records, load_collection, load_corpus, recall_at_k
+import clients
+from data_insertion import db_operations, insertion
+from data_insertion.collection import CollectionLayout, create_collection, estimate_memory
+
+LAYOUTS = [
+    ("float32", CollectionLayout(quantization="none", on_disk_vectors=False)),
+    ("float32 on disk", CollectionLayout(quantization="none", on_disk_vectors=True)),
+    ("scalar", CollectionLayout(quantization="scalar", on_disk_vectors=False)),
+    ("scalar, on disk", CollectionLayout(quantization="scalar", on_disk_vectors=True)),
+    ("binary, on disk", CollectionLayout(quantization="binary", on_disk_vectors=True)),
+    ("product, on disk", CollectionLayout(quantization="product", on_disk_vectors=True)),
+]
+
+
+def collection_vectors():
+    """(ids, texts, float32 matrix) of every point in the benchmark collection"""
+    ids, texts, vectors, offset = [], [], [], None
+    while True:
+        points, offset = clients.qdrant_client().scroll(
+            collection_name=insertion.COLLECTION_NAME, limit=1000, offset=offset,
+            with_payload=["text"], with_vectors=True)
+        for point in points:
+            ids.append(point.id)
+            texts.append(point.payload["text"])
+            vectors.append(point.vector[""] if isinstance(point.vector, dict) else point.vector)
+        if offset is None:
+            return ids, texts, np.asarray(vectors, dtype=np.float32)
+
+
+def scalar_scores(queries, vectors, quantile):
+    """Dot products of int8 codes mapped back to floats, one range for the whole collection"""
+    low, high = np.quantile(vectors, [(1 - quantile) / 2, 1 - (1 - quantile) / 2])
+    scale = (high - low) / 255
+
+    def quantize(matrix):
+        return np.round((np.clip(matrix, low, high) - low) / scale) * scale + low
+
+    return quantize(queries) @ quantize(vectors).T
+
+
+def binary_scores(queries, vectors):
+    """Matching sign bits"""
+    query_bits, vector_bits = (queries > 0).astype(np.float32), (vectors > 0).astype(np.float32)
+    return query_bits @ vector_bits.T + (1 - query_bits) @ (1 - vector_bits).T
+
+
+def simulated_search(queries, vectors, layout, k, oversampling, rescore):
+    """Row indices of the top k per query (np array) under the layout's quantization"""
+    exact = queries @ vectors.T
+    if layout.quantization == "scalar":
+        approx = scalar_scores(queries, vectors, layout.scalar_quantile)
+    elif layout.quantization == "binary":
+        approx = binary_scores(queries, vectors)
+    else:
+        approx = exact
+    limit = min(len(vectors), int(k * oversampling)) if rescore else k
+    candidates = np.argsort(-approx, axis=1, kind="stable")[:, :limit]
+    ranking = np.take_along_axis(exact if rescore else approx, candidates, axis=1)
+    return np.take_along_axis(candidates, np.argsort(-ranking, axis=1, kind="stable")[:, :k], axis=1)
+
+
+def server_search(qdrant, collection, query_vectors, k, oversampling, rescore, exact=False):
+    """Point ids of the top k per query from a real Qdrant collection"""
+    from qdrant_client import models
+
+    params = models.SearchParams(exact=exact, quantization=None if exact else models.QuantizationSearchParams(
+        rescore=rescore, oversampling=oversampling))
+    return [[point.id for point in qdrant.query_points(collection_name=collection, query=vector, limit=k,
+                                                       search_params=params).points]
+            for vector in query_vectors]
+
+
+def copy_to_server(qdrant, name, layout, ids, vectors, batch_size=256):
+    from qdrant_client import models
+
+    create_collection(name, layout, vectors.shape[1])
+    for start in range(0, len(ids), batch_size):
+        qdrant.upsert(collection_name=name, wait=True, points=[
+            models.PointStruct(id=point_id, vector={"": vector.tolist()})
+            for point_id, vector in zip(ids[start:start + batch_size], vectors[start:start + batch_size])
+        ])
+
+
+def overlap(results, truth, k):
+    return float(np.mean([len(set(result[:k]) & set(expected[:k])) / k for result, expected in zip(results, truth)]))
+
+
+def labelled_recall(results, relevant, k):
+    return float(np.mean([recall_at_k(list(result), ids, k) for result, ids in zip(results, relevant)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=5, help="Documents retrieved per question")
+    parser.add_argument("--oversampling", type=float, nargs="+", default=[1, 2, 4],
+                        help="Quantized candidates per result re-scored with the original vectors")
+    parser.add_argument("--distractors", type=int, default=2000, help="Generated chunks added to the corpus")
+    parser.add_argument("--scale-points", type=int, default=1_000_000, help="Also estimate memory for this many points")
+    parser.add_argument("--qdrant-url", default=None, help="Measure with scratch collections on a real Qdrant server")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="Payload indexes have no effect")
+    corpus = load_corpus()
+    text_to_id = load_collection(corpus)
+    insertion.upsert_point_stream(insertion.iter_points(distractor_records(corpus, args.distractors)))
+    ids, texts, vectors = collection_vectors()
+    queries = corpus["queries"]
+    query_vectors = np.asarray([db_operations.create_embedding(item["query"]) for item in queries], dtype=np.float32)
+    dimension = vectors.shape[1]
+    print(f"[INFO] {len(ids)} points of {dimension} dimensions, {len(queries)} labelled questions, k={args.k}, "
+          f"{'Qdrant ' + args.qdrant_url if args.qdrant_url else 'simulated quantization'}")
+
+    doc_ids = [text_to_id.get(text) for text in texts]
+    relevant = [item["relevant"] for item in queries]
+    qdrant, scratch = None, []
+    if args.qdrant_url:
+        from qdrant_client import QdrantClient
+        qdrant = QdrantClient(url=args.qdrant_url, api_key=os.getenv("QDRANT_API_KEY"))
+        clients.override("qdrant", qdrant)
+        id_to_doc = dict(zip(ids, doc_ids))
+    try:
+        if qdrant is None:
+            truth = simulated_search(query_vectors, vectors, LAYOUTS[0][1], args.k, 1, False)
+        else:
+            scratch.append(f"{insertion.COLLECTION_NAME}_exact")
+            copy_to_server(qdrant, scratch[-1], LAYOUTS[0][1], ids, vectors)
+            truth = server_search(qdrant, scratch[-1], query_vectors, args.k, None, None, exact=True)
+
+        scale = f"@{args.scale_points:,}"
+        print(f"{'layout':<18}{'RAM MB':>9}{'disk MB':>9}{'RAM ' + scale:>16}{'disk ' + scale:>16}"
+              f"{'rescore':>9}{'vs exact':>10}{'recall@' + str(args.k):>10}")
+        for name, layout in LAYOUTS:
+            small = estimate_memory(layout, dimension, len(ids))
+            large = estimate_memory(layout, dimension, args.scale_points)
+            memory = (f"{small['ram_bytes'] / 1e6:>9.2f}{small['disk_bytes'] / 1e6:>9.2f}"
+                      f"{large['ram_bytes'] / 1e6:>16,.0f}{large['disk_bytes'] / 1e6:>16,.0f}")
+            if qdrant is None and layout.quantization == "product":
+                print(f"{name:<18}{memory}{'-':>9}{'needs --qdrant-url':>20}")
+                continue
+            if qdrant is not None:
+                scratch.append(f"{insertion.COLLECTION_NAME}_{len(scratch)}")
+                copy_to_server(qdrant, scratch[-1], layout, ids, vectors)
+            settings = [("-", 1)] if layout.quantization == "none" else \
+                [("no", 1)] + [(f"x{oversampling:g}", oversampling) for oversampling in args.oversampling]
+            for rescore, oversampling in settings:
+                if qdrant is None:
+                    rows = simulated_search(query_vectors, vectors, layout, args.k, oversampling, rescore != "no")
+                    results, labelled = rows, [[doc_ids[row] for row in result] for result in rows]
+                else:
+                    results = server_search(qdrant, scratch[-1], query_vectors, args.k, oversampling, rescore != "no")
+                    labelled = [[id_to_doc[point_id] for point_id in result] for result in results]
+                agreement = overlap([list(result) for result in results], [list(result) for result in truth], args.k)
+                print(f"{name:<18}{memory}{rescore:>9}{agreement:>10.3f}{labelled_recall(labelled, relevant, args.k):>10.3f}")
+                name, memory = "", " " * 50
+    finally:
+        for collection in scratch:
+            qdrant.delete_collection(collection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Rerank Latency Benchmark
+========================
+Measures how long the rerank stage (langgraph_comp/rerank.py) takes as the
+number of over-fetched candidates grows, and what it does to result
+quality: for every candidate count and scorer it reports rerank latency
+(p50/p95, including the hand-off to the rerank thread pool) and recall@k /
+MRR of the reranked top k against plain dense top k.
+
+The fixture corpus (benchmarks/fixtures/retrieval_corpus.json) plus
+generated distractor chunks is loaded into an in-memory Qdrant with fake
+embeddings (see retrieval_fixture.py), so no services are needed.
+The cross-encoder scorer needs sentence-transformers and downloads
+RERANK_MODEL on first use; it is skipped if it cannot be loaded.
+
+Run from the /backend directory:
+    python -m benchmarks.rerank_latency --candidates 10 25 50 100 200
+    python -m benchmarks.rerank_latency --scorer lexical cross-encoder
+"""
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("COLLECTION_NAME", "rerank_benchmark")
+os.environ.setdefault("EMBEDDING_MODEL", "fake")
+
+from benchmarks.retrieval_fixture import (
+    distractor_records, load_collection, load_corpus, percentile, recall_at_k, reciprocal_rank,
+)
+from data_insertion import db_operations, insertion
+from data_insertion.retrieval import RetrievalConfig, to_document
+from langgraph_comp import rerank
+
+
+def dense_candidates(corpus, limit):
+    """Dense results for every question, best first; prefixes are the smaller candidate sets"""
+    results = []
+    for item in corpus["queries"]:
+        query_vector = db_operations.create_embedding(item["query"])
+        points = db_operations.search_points(item["query"], query_vector, RetrievalConfig(top_k=limit))
+        results.append([to_document(point, score) for point, score in points])
+    return results
+
+
+def quality(corpus, text_to_id, ranked_lists, k):
+    recalls, ranks = [], []
+    for item, documents in zip(corpus["queries"], ranked_lists):
+        retrieved = [text_to_id.get(document["text"]) for document in documents]
+        recalls.append(recall_at_k(retrieved, item["relevant"], k))
+        ranks.append(reciprocal_rank(retrieved, item["relevant"]))
+    return sum(recalls) / len(recalls), sum(ranks) / len(ranks)
+
+
+def run(corpus, candidates, count, scorer, k, repeats):
+    latencies, ranked_lists = [], []
+    for item, documents in zip(corpus["queries"], candidates):
+        for _ in range(repeats):
+            started = time.perf_counter()
+            ranked = rerank.rerank_documents(item["query"], documents[:count], k, scorer, timeout=60)
+            latencies.append(time.perf_counter() - started)
+        ranked_lists.append(ranked)
+    return ranked_lists, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 25, 50, 100, 200],
+                        help="Candidate counts to rerank")
+    parser.add_argument("--scorer", nargs="+", default=["lexical"], help="Scorers to compare")
+    parser.add_argument("--k", type=int, default=5, help="Documents kept after reranking")
+    parser.add_argument("--distractors", type=int, default=500, help="Generated chunks added to the corpus")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed reranks per question")
+    args = parser.parse_args()
+
+    # The in-memory engine searches exhaustively and warns about ignored search params
+    warnings.filterwarnings("ignore", message="Local mode performs exact")
+    corpus = load_corpus()
+    text_to_id = load_collection(corpus)
+    insertion.upsert_point_stream(insertion.iter_points(distractor_records(corpus, args.distractors)))
+    candidates = dense_candidates(corpus, max(args.candidates))
+    print(f"[INFO] {len(corpus['documents']) + args.distractors} chunks, {len(corpus['queries'])} questions, "
+          f"k={args.k}")
+
+    recall, mrr = quality(corpus, text_to_id, [documents[:args.k] for documents in candidates], args.k)
+    print(f"{'scorer':<16}{'candidates':>11}{'recall@k':>10}{'MRR':>8}{'p50 ms':>9}{'p95 ms':>9}")
+    print(f"{'dense (none)':<16}{args.k:>11}{recall:>10.3f}{mrr:>8.3f}{'-':>9}{'-':>9}")
+    for scorer in args.scorer:
+        try:
+            rerank.get_scorer(scorer)
+        except Exception as e:
+            print(f"[WARN] Skipping {scorer}: {e}")
+            continue
+        for count in args.candidates:
+            ranked_lists, latencies = run(corpus, candidates, count, scorer, args.k, args.repeats)
+            recall, mrr = quality(corpus, text_to_id, ranked_lists, args.k)
+            print(f"{scorer:<16}{count:>11}{recall:>10.3f}{mrr:>8.3f}"
+                  f"{percentile(latencies, 50) * 1000:>9.2f}{percentile(latencies, 95) * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
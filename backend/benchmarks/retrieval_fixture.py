@@ -0,0 +1,128 @@
+"""
+Offline retrieval fixture shared by the retrieval benchmarks.
+
+- fixtures/retrieval_corpus.json: short documentation chunks with
+  identifier-heavy and natural-language questions and their relevant chunks
+- FakeEmbeddingsClient: stands in for the OpenAI client. Its vectors are a
+  bag of sub-words (identifiers split into their parts, like a real
+  tokenizer would), so paraphrases land close together but exact
+  identifiers such as ConversationBufferMemory blur into their neighbours,
+  the same weakness dense embeddings show on this corpus.
+- load_collection(): an in-memory Qdrant (QdrantClient(":memory:"))
+  holding the corpus, built with the real ingestion code.
+- distractor_records(): extra chunks of corpus words to grow the collection.
+"""
+
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import struct
+from functools import lru_cache
+from types import SimpleNamespace
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "retrieval_corpus.json")
+# Collections pick this up from a probe embedding unless EMBEDDING_DIMENSION is set
+DIMENSION = 1024
+
+WORD_PART_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+STOPWORDS = {"a", "an", "and", "are", "as", "be", "by", "do", "does", "how", "i", "in", "is", "it", "of",
+             "on", "or", "the", "to", "what", "which", "with"}
+
+
+def load_corpus(path: str = CORPUS_PATH) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def word_vector(word: str) -> tuple:
+    values = []
+    counter = 0
+    while len(values) < DIMENSION:
+        digest = hashlib.sha256(f"{counter}:{word}".encode("utf-8")).digest()
+        values.extend(b / 127.5 - 1.0 for b in struct.unpack("32B", digest))
+        counter += 1
+    norm = math.sqrt(sum(v * v for v in values[:DIMENSION]))
+    return tuple(v / norm for v in values[:DIMENSION])
+
+
+def fake_embedding(text: str) -> list:
+    words = [part.lower() for part in WORD_PART_PATTERN.findall(text) if part.lower() not in STOPWORDS]
+    total = [0.0] * DIMENSION
+    for word in words or ["empty"]:
+        for i, value in enumerate(word_vector(word)):
+            total[i] += value
+    norm = math.sqrt(sum(v * v for v in total)) or 1.0
+    return [v / norm for v in total]
+
+
+class FakeEmbeddingsClient:
+    """Duck-types the parts of openai.OpenAI used for embeddings"""
+
+    def __init__(self):
+        self.requests = 0
+        self.embeddings = SimpleNamespace(create=self._create)
+
+    def with_options(self, **kwargs):
+        return self
+
+    def _create(self, input, model=None):
+        self.requests += 1
+        texts = [input] if isinstance(input, str) else input
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=fake_embedding(text)) for i, text in enumerate(texts)
+        ])
+
+
+def load_collection(corpus: dict, fake_embeddings: bool = True, qdrant=None):
+    """
+    Install a Qdrant client (in-memory unless given) and, unless
+    fake_embeddings is False, the fake embeddings client in the client
+    registry, then ingest the corpus. Returns {chunk text: document id}.
+    """
+    from qdrant_client import QdrantClient
+
+    import clients
+    clients.override("qdrant", qdrant or QdrantClient(":memory:"))
+    if fake_embeddings:
+        clients.override("openai", FakeEmbeddingsClient())
+
+    from data_insertion import insertion
+    insertion.create_collection_if_not_exists()
+    records = [
+        {"text": doc["text"], "source_file": doc["source_file"], "chunk_index": 0, "total_chunks": 1,
+         "file_type": "pdf", "file_hash": doc["id"]}
+        for doc in corpus["documents"]
+    ]
+    insertion.upsert_points(list(insertion.iter_points(records)))
+    return {doc["text"]: doc["id"] for doc in corpus["documents"]}
+
+
+def distractor_records(corpus: dict, count: int, seed: int = 0) -> list:
+    """Ingestion records of chunks made of random corpus words: same vocabulary, no answers"""
+    rng = random.Random(seed)
+    words = " ".join(doc["text"] for doc in corpus["documents"]).split()
+    return [
+        {"text": " ".join(rng.choice(words) for _ in range(60)), "source_file": f"distractors/{i}.pdf",
+         "chunk_index": 0, "total_chunks": 1, "file_type": "pdf", "file_hash": f"distractor-{i}"}
+        for i in range(count)
+    ]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def recall_at_k(retrieved_ids, relevant_ids, k):
+    return len(set(retrieved_ids[:k]) & set(relevant_ids)) / len(relevant_ids)
+
+
+def reciprocal_rank(retrieved_ids, relevant_ids):
+    for rank, doc_id in enumerate(retrieved_ids, start=1):
+        if doc_id in relevant_ids:
+            return 1.0 / rank
+    return 0.0
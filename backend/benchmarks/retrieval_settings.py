@@ -0,0 +1,152 @@
+"""
+Retrieval Settings Benchmark
+============================
+Compares RetrievalConfig settings (top_k, score threshold, HNSW ef / exact
+search, quantization rescoring, source_file filters) on the fixture corpus
+(benchmarks/fixtures/retrieval_corpus.json) plus generated distractor
+chunks, and reports recall@k, MRR, documents returned and search latency.
+Also compares the payload transferred per query when fetching only the
+fields retrieval needs against the full payload.
+
+Runs against an in-memory Qdrant (QdrantClient(":memory:")) with fake
+embeddings by default, so no services are needed. The in-memory engine
+always searches exhaustively, so HNSW ef, exact and quantization settings
+only change results and latency on a real server: pass --qdrant-url (a
+scratch collection is created and dropped) and --quantization to enable
+scalar quantization on it.
+
+Run from the /backend directory:
+    python -m benchmarks.retrieval_settings --distractors 500
+    python -m benchmarks.retrieval_settings --qdrant-url http://localhost:6333 --quantization
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Always a fresh scratch name: with --qdrant-url the collection is dropped at the end
+os.environ["COLLECTION_NAME"] = f"retrieval_settings_{uuid.uuid4().hex[:8]}"
+os.environ.setdefault("EMBEDDING_MODEL", "fake")
+
+from benchmarks.retrieval_fixture import (
+    distractor_records, load_collection, load_corpus, percentile, recall_at_k, reciprocal_rank,
+)
+import clients
+from data_insertion import db_operations, insertion
+from data_insertion.retrieval import RetrievalConfig
+
+SETTINGS = [
+    ("top_k=5 (default)", {}),
+    ("top_k=3", {"top_k": 3}),
+    ("top_k=10", {"top_k": 10}),
+    ("score_threshold=0.3", {"score_threshold": 0.3}),
+    ("score_threshold=0.5", {"score_threshold": 0.5}),
+    ("exact=true", {"exact": True}),
+    ("hnsw_ef=16", {"hnsw_ef": 16}),
+    ("hnsw_ef=256", {"hnsw_ef": 256}),
+    ("rescore=false", {"rescore": False}),
+    ("rescore=true oversampling=2", {"rescore": True, "oversampling": 2.0}),
+    ("source_files=topic folder", "topic"),
+    ("hybrid", {"mode": "hybrid"}),
+]
+
+
+def topic_files(corpus, relevant):
+    """Source files in the same folder as the relevant chunks"""
+    sources = {doc["id"]: doc["source_file"] for doc in corpus["documents"]}
+    folders = {sources[doc_id].split("/")[0] for doc_id in relevant}
+    return [source for source in sources.values() if source.split("/")[0] in folders]
+
+
+def run(corpus, text_to_id, overrides, repeats):
+    recalls, ranks, returned, latencies = [], [], [], []
+    for item in corpus["queries"]:
+        if overrides == "topic":
+            config = RetrievalConfig().with_overrides({"source_files": topic_files(corpus, item["relevant"])})
+        else:
+            config = RetrievalConfig().with_overrides(overrides)
+        query_vector = db_operations.create_embedding(item["query"])
+        for _ in range(repeats):
+            started = time.perf_counter()
+            points = db_operations.search_points(item["query"], query_vector, config)
+            latencies.append(time.perf_counter() - started)
+        retrieved = [text_to_id.get(point.payload["text"]) for point, _ in points]
+        recalls.append(recall_at_k(retrieved, item["relevant"], config.top_k))
+        ranks.append(reciprocal_rank(retrieved, item["relevant"]))
+        returned.append(len(retrieved))
+    return {
+        "recall": sum(recalls) / len(recalls),
+        "mrr": sum(ranks) / len(ranks),
+        "returned": sum(returned) / len(returned),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+    }
+
+
+def payload_kb(corpus, with_payload):
+    """Mean payload size per query for the default top_k"""
+    total = 0
+    for item in corpus["queries"]:
+        result = clients.qdrant_client().query_points(
+            collection_name=db_operations.COLLECTION_NAME,
+            query=db_operations.create_embedding(item["query"]),
+            with_payload=with_payload,
+            limit=RetrievalConfig().top_k,
+        )
+        total += sum(len(json.dumps(point.payload)) for point in result.points)
+    return total / len(corpus["queries"]) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--distractors", type=int, default=500, help="Generated chunks added to the corpus")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed searches per question")
+    parser.add_argument("--qdrant-url", default=None, help="Benchmark a real Qdrant server instead of :memory:")
+    parser.add_argument("--quantization", action="store_true", help="Enable int8 scalar quantization (server only)")
+    args = parser.parse_args()
+
+    qdrant = None
+    if not args.qdrant_url:
+        # Explained in the module docstring
+        warnings.filterwarnings("ignore", message="Local mode performs exact")
+    else:
+        from qdrant_client import QdrantClient
+        qdrant = QdrantClient(url=args.qdrant_url, api_key=os.getenv("QDRANT_API_KEY"))
+    corpus = load_corpus()
+    text_to_id = load_collection(corpus, qdrant=qdrant)
+
+    records = distractor_records(corpus, args.distractors)
+    insertion.upsert_point_stream(insertion.iter_points(records))
+    if args.quantization:
+        from qdrant_client import models
+        clients.qdrant_client().update_collection(
+            collection_name=db_operations.COLLECTION_NAME,
+            quantization_config=models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, always_ram=True)
+            ),
+        )
+
+    try:
+        backend = args.qdrant_url or ":memory:"
+        print(f"[INFO] Qdrant {backend}, {len(corpus['documents']) + len(records)} chunks, "
+              f"{len(corpus['queries'])} questions")
+        print(f"{'setting':<32}{'recall@k':>10}{'MRR':>8}{'docs':>7}{'p50 ms':>9}{'p95 ms':>9}")
+        for name, overrides in SETTINGS:
+            result = run(corpus, text_to_id, overrides, args.repeats)
+            print(f"{name:<32}{result['recall']:>10.3f}{result['mrr']:>8.3f}{result['returned']:>7.1f}"
+                  f"{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}")
+        print(f"[INFO] Payload per query: {payload_kb(corpus, db_operations.PAYLOAD_FIELDS):.2f} KB with "
+              f"{db_operations.PAYLOAD_FIELDS}, {payload_kb(corpus, True):.2f} KB with the full payload")
+    finally:
+        if args.qdrant_url:
+            clients.qdrant_client().delete_collection(db_operations.COLLECTION_NAME)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Retrieval Benchmark Suite
+=========================
+Measures retrieval on its own, without the LLM: every labelled question of
+the fixture corpus (benchmarks/fixtures/retrieval_corpus.json) goes through
+query_documents() and is scored against the source files that answer it.
+For each retrieval setting and concurrency level it reports recall@k (share
+of expected source files among the top k documents), MRR (first document
+from an expected file), p50/p95/p99 latency and throughput (QPS).
+
+Runs fully offline: the corpus plus --distractors generated chunks is
+ingested into an in-memory Qdrant with deterministic fake embeddings (see
+retrieval_fixture.py), so results are reproducible. Query embeddings are
+computed once up front and then served from the query embedding cache, so
+latency covers search, fusion and result mapping, as for a repeated
+question. The in-memory engine is pure Python, so QPS does not grow with
+concurrency there; pass --qdrant-url to measure a real server (a scratch
+collection is created and dropped).
+
+To catch regressions, --save writes the results to JSON and a later run
+with --baseline fails if recall or MRR dropped by more than --tolerance
+(latency changes are reported, not failed on, as they depend on the
+machine). --min-recall / --min-mrr fail on absolute thresholds.
+
+Run from the /backend directory:
+    python -m benchmarks.retrieval_suite --concurrency 1 4 8
+    python -m benchmarks.retrieval_suite --save retrieval_baseline.json
+    python -m benchmarks.retrieval_suite --baseline retrieval_baseline.json
+    python -m benchmarks.retrieval_suite --retrieval '{"mode": "hybrid", "top_k": 3}'
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Always a fresh scratch name: with --qdrant-url the collection is dropped at the end,
+# so it must never be the COLLECTION_NAME of a real deployment
+os.environ["COLLECTION_NAME"] = f"retrieval_suite_{uuid.uuid4().hex[:8]}"
+os.environ.setdefault("EMBEDDING_MODEL", "fake")
+
+from benchmarks.retrieval_fixture import distractor_records, load_collection, load_corpus, percentile
+import clients
+from data_insertion import db_operations, insertion
+from data_insertion.retrieval import RetrievalConfig
+
+SETTINGS = [
+    ("dense", {"mode": "dense"}),
+    ("hybrid", {"mode": "hybrid"}),
+    ("dense top_k=10", {"mode": "dense", "top_k": 10}),
+    ("hybrid top_k=10", {"mode": "hybrid", "top_k": 10}),
+]
+
+
+def labelled_queries(corpus):
+    """[{"query", "expected": source files of the relevant chunks}]"""
+    sources = {doc["id"]: doc["source_file"] for doc in corpus["documents"]}
+    return [{"query": item["query"], "expected": {sources[doc_id] for doc_id in item["relevant"]}}
+            for item in corpus["queries"]]
+
+
+def score(documents, expected, k):
+    files = [document["source_file"] for document in documents]
+    recall = len(set(files[:k]) & expected) / len(expected)
+    rank = next((position for position, name in enumerate(files, start=1) if name in expected), None)
+    return recall, 1.0 / rank if rank else 0.0
+
+
+def timed_query(query, config):
+    started = time.perf_counter()
+    documents = db_operations.query_documents(query, config)
+    return documents, time.perf_counter() - started
+
+
+def run(queries, config, concurrency, rounds):
+    requests = [item for _ in range(rounds) for item in queries]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda item: timed_query(item["query"], config), requests))
+    wall = time.perf_counter() - started
+
+    # Retrieval is deterministic, so quality comes from the first round
+    recalls, ranks = zip(*(score(documents, item["expected"], config.top_k)
+                           for item, (documents, _) in zip(queries, results)))
+    latencies = [latency for _, latency in results]
+    return {
+        "recall": sum(recalls) / len(recalls),
+        "mrr": sum(ranks) / len(ranks),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "qps": len(requests) / wall,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Failure messages for quality drops against a saved run; prints latency changes"""
+    failures = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        for metric in ("recall", "mrr"):
+            if result[metric] < before[metric] - tolerance:
+                failures.append(f"{key}: {metric} {before[metric]:.3f} -> {result[metric]:.3f}")
+        print(f"[INFO] {key}: p95 {before['p95_ms']:.2f} -> {result['p95_ms']:.2f} ms, "
+              f"QPS {before['qps']:.0f} -> {result['qps']:.0f}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4], help="Parallel queries")
+    parser.add_argument("--rounds", type=int, default=5, help="Passes over the questions per measurement")
+    parser.add_argument("--distractors", type=int, default=500, help="Generated chunks added to the corpus")
+    parser.add_argument("--qdrant-url", default=None, help="Benchmark a real Qdrant server instead of :memory:")
+    parser.add_argument("--retrieval", default=None,
+                        help="JSON retrieval settings to benchmark instead of the built-in set")
+    parser.add_argument("--save", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="Fail on recall/MRR drops against a --save file")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="Allowed recall/MRR drop vs the baseline")
+    parser.add_argument("--min-recall", type=float, default=None)
+    parser.add_argument("--min-mrr", type=float, default=None)
+    args = parser.parse_args()
+
+    # The in-memory engine searches exhaustively and warns about ignored search params
+    warnings.filterwarnings("ignore", message="Local mode performs exact")
+    warnings.filterwarnings("ignore", message="Payload indexes have no effect")
+    settings = [("custom", json.loads(args.retrieval))] if args.retrieval else SETTINGS
+
+    qdrant = None
+    if args.qdrant_url:
+        from qdrant_client import QdrantClient
+        qdrant = QdrantClient(url=args.qdrant_url, api_key=os.getenv("QDRANT_API_KEY"))
+    corpus = load_corpus()
+    load_collection(corpus, qdrant=qdrant)
+    results = {}
+    try:
+        insertion.upsert_point_stream(insertion.iter_points(distractor_records(corpus, args.distractors)))
+        queries = labelled_queries(corpus)
+        for item in queries:
+            db_operations.create_embedding(item["query"])
+        print(f"[INFO] Qdrant {args.qdrant_url or ':memory:'}, {len(corpus['documents']) + args.distractors} chunks, "
+              f"{len(queries)} labelled questions, {args.rounds} rounds")
+
+        print(f"{'setting':<20}{'conc':>5}{'recall@k':>10}{'MRR':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'QPS':>9}")
+        for name, overrides in settings:
+            config = RetrievalConfig().with_overrides(overrides)
+            for concurrency in args.concurrency:
+                result = results[f"{name} @{concurrency}"] = run(queries, config, concurrency, args.rounds)
+                print(f"{name:<20}{concurrency:>5}{result['recall']:>10.3f}{result['mrr']:>8.3f}"
+                      f"{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['qps']:>9.0f}")
+    finally:
+        if args.qdrant_url:
+            clients.qdrant_client().delete_collection(db_operations.COLLECTION_NAME)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[INFO] Results saved to {args.save}")
+
+    failures = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            failures.extend(compare(results, json.load(f), args.tolerance))
+    for key, result in results.items():
+        if args.min_recall is not None and result["recall"] < args.min_recall:
+            failures.append(f"{key}: recall {result['recall']:.3f} below {args.min_recall}")
+        if args.min_mrr is not None and result["mrr"] < args.min_mrr:
+            failures.append(f"{key}: MRR {result['mrr']:.3f} below {args.min_mrr}")
+    if failures:
+        raise SystemExit("[FAIL] " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+API Import-Time and Cold-Start Benchmark
+========================================
+Starts fresh interpreters that import the API server module (api.asgi) and
+serve a first /health request, and reports:
+
+- import time and cold start (import + first response), median over runs
+- the slowest imports (from python -X importtime)
+- ingestion-only modules that were loaded anyway
+- clients created at import time (there should be none; see clients.py)
+
+Nothing connects to MongoDB, Qdrant or the LLM server during import, so no
+services are needed. Fails if the median cold start exceeds --budget-ms or
+if an ingestion-only module or a client was loaded at import time.
+
+Run from the /backend directory:
+    python -m benchmarks.startup --runs 5 --budget-ms 3000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must not be imported by the API process
+INGESTION_ONLY_MODULES = [
+    "PyPDF2",
+    "langchain_qdrant",
+    "langchain_text_splitters",
+    "tqdm",
+    "data_insertion.insertion",
+    "data_insertion.extraction",
+]
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import api.asgi
+imported = time.perf_counter()
+response = api.asgi.flask_app.test_client().get("/health")
+served = time.perf_counter()
+import clients
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "cold_start_ms": (served - started) * 1000,
+    "status": response.status_code,
+    "modules": sorted(sys.modules),
+    "clients": clients.initialized(),
+}))
+"""
+
+ENV_DEFAULTS = {
+    "MONGO_URI": "mongodb://localhost:27017/benchmark",
+    "OPENAI_API_KEY": "benchmark",
+    "OPENAI_API_BASE": "http://localhost:9/v1",
+    "GENERATION_MODEL": "stub",
+    "EMBEDDING_MODEL": "stub",
+    "QDRANT_URL": "http://localhost:6333",
+    "COLLECTION_NAME": "benchmark",
+}
+
+
+def run_child(importtime: bool) -> tuple:
+    env = {**ENV_DEFAULTS, **os.environ}
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD]
+    result = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=300)
+    if result.returncode != 0:
+        raise SystemExit(f"[FAIL] importing the API failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(importtime_log: str, top: int) -> list:
+    """Modules by cumulative import time (microseconds), leaving out the API modules themselves"""
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if name not in ("api", "api.app", "api.asgi"):
+            rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if the median cold start is slower")
+    parser.add_argument("--top", type=int, default=10, help="How many of the slowest imports to list")
+    args = parser.parse_args()
+
+    samples = [run_child(importtime=False)[0] for _ in range(args.runs)]
+    profile, importtime_log = run_child(importtime=True)
+
+    import_ms = statistics.median(sample["import_ms"] for sample in samples)
+    cold_start_ms = statistics.median(sample["cold_start_ms"] for sample in samples)
+    print(f"[INFO] {args.runs} runs: import {import_ms:.0f} ms, cold start (first /health) {cold_start_ms:.0f} ms "
+          f"(min {min(s['cold_start_ms'] for s in samples):.0f}, max {max(s['cold_start_ms'] for s in samples):.0f})")
+    print(f"[INFO] {len(profile['modules'])} modules loaded")
+    print(f"{'slowest imports':<48}{'cumulative ms':>14}")
+    for cumulative, name in slowest_imports(importtime_log, args.top):
+        print(f"{name:<48}{cumulative / 1000:>14.1f}")
+
+    failures = []
+    loaded = [name for name in INGESTION_ONLY_MODULES if name in profile["modules"]]
+    if loaded:
+        failures.append(f"ingestion-only modules imported by the API: {', '.join(loaded)}")
+    if profile["clients"]:
+        failures.append(f"clients created at import time: {', '.join(profile['clients'])}")
+    if any(sample["status"] != 200 for sample in samples):
+        failures.append("/health did not answer 200")
+    if args.budget_ms is not None and cold_start_ms > args.budget_ms:
+        failures.append(f"cold start {cold_start_ms:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+
+    if failures:
+        raise SystemExit("[FAIL] " + "; ".join(failures))
+    print("[INFO] No ingestion-only modules or clients loaded at import time")
+
+
+if __name__ == "__main__":
+    main()
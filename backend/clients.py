@@ -0,0 +1,137 @@
+"""
+Shared, lazily created clients.
+
+Every process (API worker, ingestion run, evaluator) gets at most one of each
+client, created on first use rather than at import time. Importing a module
+therefore costs no network round trips and none of the heavier client
+libraries until a request actually needs them, and the API's Mongo
+checkpointer is a single instance shared by the graph and the history routes.
+
+Tests and benchmarks can install ready-made instances with override().
+"""
+
+import hashlib
+import os
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_instances = {}
+_lock = threading.Lock()
+
+
+def _get(key, factory):
+    instance = _instances.get(key)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(key)
+            if instance is None:
+                instance = _instances[key] = factory()
+    return instance
+
+
+def override(key, instance):
+    """Install an instance under a registry key (e.g. "chat_model", "checkpointer")"""
+    with _lock:
+        _instances[key] = instance
+
+
+def initialized():
+    """Keys of the clients created so far"""
+    return sorted(_instances)
+
+
+def _create_openai_client():
+    from openai import OpenAI
+    return OpenAI(base_url=os.getenv("OPENAI_API_BASE"), api_key=os.getenv("OPENAI_API_KEY"))
+
+
+def _create_async_openai_client():
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(base_url=os.getenv("OPENAI_API_BASE"), api_key=os.getenv("OPENAI_API_KEY"))
+
+
+def _create_qdrant_client():
+    from qdrant_client import QdrantClient
+    return QdrantClient(url=os.getenv("QDRANT_URL"), api_key=os.getenv("QDRANT_API_KEY"))
+
+
+def _create_async_qdrant_client():
+    from qdrant_client import AsyncQdrantClient
+    return AsyncQdrantClient(url=os.getenv("QDRANT_URL"), api_key=os.getenv("QDRANT_API_KEY"))
+
+
+def _create_local_index():
+    from data_insertion.local_index import LocalIndex, index_path
+    return LocalIndex(index_path())
+
+
+def _create_mongo_client():
+    from pymongo import MongoClient
+    mongo_uri = os.getenv("MONGO_URI")
+    if not mongo_uri:
+        raise ValueError("MONGO_URI environment variable not set")
+    return MongoClient(mongo_uri)
+
+
+def _create_checkpointer():
+    from db_connect import langgraph_collection
+    from metrics import time_methods
+    # The async methods run these on a thread pool, so both paths are timed
+    return time_methods(langgraph_collection(mongo_client()), {
+        "get_tuple": "checkpoint_get", "put": "checkpoint_put", "put_writes": "checkpoint_put_writes",
+    })
+
+
+def openai_client():
+    return _get("openai", _create_openai_client)
+
+
+def async_openai_client():
+    return _get("async_openai", _create_async_openai_client)
+
+
+def qdrant_client():
+    return _get("qdrant", _create_qdrant_client)
+
+
+def async_qdrant_client():
+    return _get("async_qdrant", _create_async_qdrant_client)
+
+
+def local_index():
+    """The embedded vector index used instead of Qdrant with VECTOR_BACKEND=local"""
+    return _get("local_index", _create_local_index)
+
+
+def mongo_client():
+    """pymongo client for the checkpointer and the conversation archive"""
+    return _get("mongo", _create_mongo_client)
+
+
+def checkpointer():
+    """The MongoDB checkpointer shared by the graph and the API"""
+    return _get("checkpointer", _create_checkpointer)
+
+
+def chat_model(temperature=None, model=None, base_url=None, api_key=None):
+    """
+    ChatOpenAI for GENERATION_MODEL on OPENAI_API_BASE unless given explicitly;
+    one instance per distinct configuration (temperature None = server default).
+    """
+    def create():
+        from langchain_openai import ChatOpenAI
+        kwargs = {} if temperature is None else {"temperature": temperature}
+        return ChatOpenAI(model=model or os.getenv("GENERATION_MODEL"),
+                          base_url=base_url or os.getenv("OPENAI_API_BASE"),
+                          api_key=api_key or os.getenv("OPENAI_API_KEY"), **kwargs)
+
+    if temperature is None and model is None and base_url is None and api_key is None:
+        key = "chat_model"
+    else:
+        # Keys are listed by initialized(), so only a digest of the API key goes in
+        key_digest = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12] if api_key else None
+        key = f"chat_model:{temperature}:{model}:{base_url}:{key_digest}"
+    return _get(key, create)
@@ -0,0 +1,159 @@
+"""
+Batched, concurrent embedding of text chunks.
+
+Instead of one embeddings request per chunk, chunks are grouped into batches
+of EMBEDDING_BATCH_SIZE texts and up to EMBEDDING_CONCURRENCY requests are
+kept in flight on a thread pool. Rate limits (429), server errors (5xx) and
+connection errors are retried with exponential backoff. Results are always
+returned in input order.
+"""
+
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import openai
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+)
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds requested by the server's Retry-After header, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def batched(items: Iterable, batch_size: int) -> Iterator[list]:
+    """Group an iterable into lists of at most batch_size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BatchEmbedder:
+    """
+    Embeds texts through an OpenAI-compatible embeddings endpoint, many
+    texts per request and several requests at a time.
+
+    The client's own retry loop is disabled so that the backoff policy
+    here (which honours Retry-After) is the only one applied.
+    """
+
+    def __init__(
+        self,
+        client: openai.OpenAI,
+        model: str,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        concurrency: int = EMBEDDING_CONCURRENCY,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+    ):
+        self.client = client.with_options(max_retries=0)
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        delay = _retry_after(error)
+        if delay is None:
+            delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+            # Full jitter so that parallel workers don't retry in lockstep
+            delay = random.uniform(0, delay)
+        return delay
+
+    def embed_batch(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Embed one batch with a single request. On a non-retryable error, or
+        once retries are exhausted, every text in the batch maps to None.
+        """
+        inputs = [text.replace("\n", " ") for text in texts]
+        attempt = 0
+        while True:
+            try:
+                response = self.client.embeddings.create(input=inputs, model=self.model)
+                # The API returns items with an index; don't rely on list order
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    logger.exception("Error generating embeddings for batch of %d texts: %s", len(inputs), e)
+                    return [None] * len(inputs)
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                logger.warning("Embedding request failed (%s), retry %d/%d in %.2fs",
+                               e.__class__.__name__, attempt, self.max_retries, delay)
+                time.sleep(delay)
+
+    def embed_batches(
+        self,
+        batches: Iterable[Sequence],
+        text_of: Callable = lambda item: item,
+        max_in_flight: Optional[int] = None,
+    ) -> Iterator[Tuple[Sequence, List[Optional[List[float]]]]]:
+        """
+        Lazily embed a stream of batches, yielding (batch, vectors) pairs in
+        input order. At most max_in_flight batches (default: 2 x concurrency)
+        are submitted ahead of the consumer, so a slow consumer applies
+        backpressure to the producer of batches.
+
+        Batch items may be arbitrary records; text_of extracts their text.
+        """
+        max_in_flight = max(1, max_in_flight or 2 * self.concurrency)
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as pool:
+            try:
+                for batch in batches:
+                    texts = [text_of(item) for item in batch]
+                    pending.append((batch, pool.submit(self.embed_batch, texts)))
+                    if len(pending) >= max_in_flight:
+                        done_batch, future = pending.popleft()
+                        yield done_batch, future.result()
+                while pending:
+                    done_batch, future = pending.popleft()
+                    yield done_batch, future.result()
+            finally:
+                # Consumer stopped early: don't start batches nobody will read
+                for _, future in pending:
+                    future.cancel()
+
+    def embed(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Embed all texts, returning one vector (or None) per text in order."""
+        vectors = []
+        for _, batch_vectors in self.embed_batches(batched(texts, self.batch_size)):
+            vectors.extend(batch_vectors)
+        return vectors
@@ -0,0 +1,190 @@
+"""
+Layout of the Qdrant collection, from QDRANT_* env vars.
+
+CollectionLayout() holds how the dense vectors are stored and indexed:
+the dimension (EMBEDDING_DIMENSION, else detected by embedding a probe text
+with EMBEDDING_MODEL), quantization ("none", "scalar" int8, "binary" 1 bit
+per dimension or "product"), whether the original float32 vectors live on
+disk (mmap) instead of RAM, the HNSW graph parameters and the shard and
+replica counts. create_collection() applies it to a new collection;
+migrations/rebuild_collection.py moves an existing collection to a new
+layout behind the COLLECTION_NAME alias.
+
+With quantization the quantized vectors stay in RAM (QDRANT_QUANTIZATION_ALWAYS_RAM)
+while the originals can go to disk; searches then rank on the quantized
+vectors and re-score the top candidates with the originals (see
+RETRIEVAL_QUANTIZATION_RESCORE / RETRIEVAL_QUANTIZATION_OVERSAMPLING).
+estimate_memory() gives the RAM and disk a layout needs per point count.
+"""
+
+import os
+from typing import NamedTuple, Optional
+
+import clients
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+QUANTIZATIONS = ("none", "scalar", "binary", "product")
+PRODUCT_COMPRESSIONS = (4, 8, 16, 32, 64)
+
+EMBEDDING_DIMENSION = os.getenv("EMBEDDING_DIMENSION")
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+QDRANT_QUANTIZATION_ALWAYS_RAM = os.getenv("QDRANT_QUANTIZATION_ALWAYS_RAM", "true").lower() == "true"
+# Scalar quantization clips the most extreme values to this quantile
+QDRANT_SCALAR_QUANTILE = float(os.getenv("QDRANT_SCALAR_QUANTILE", "0.99"))
+# Product quantization: float32 bytes per quantized byte
+QDRANT_PRODUCT_COMPRESSION = int(os.getenv("QDRANT_PRODUCT_COMPRESSION", "16"))
+# Keep the original float32 vectors memory-mapped on disk instead of in RAM
+QDRANT_ON_DISK_VECTORS = os.getenv("QDRANT_ON_DISK_VECTORS", "false").lower() == "true"
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+QDRANT_HNSW_ON_DISK = os.getenv("QDRANT_HNSW_ON_DISK", "false").lower() == "true"
+QDRANT_SHARDS = int(os.getenv("QDRANT_SHARDS", "1"))
+QDRANT_REPLICAS = int(os.getenv("QDRANT_REPLICAS", "1"))
+
+DIMENSION_PROBE_TEXT = "dimension probe"
+
+
+class CollectionLayout(NamedTuple):
+    quantization: str = QDRANT_QUANTIZATION
+    quantization_always_ram: bool = QDRANT_QUANTIZATION_ALWAYS_RAM
+    scalar_quantile: float = QDRANT_SCALAR_QUANTILE
+    product_compression: int = QDRANT_PRODUCT_COMPRESSION
+    on_disk_vectors: bool = QDRANT_ON_DISK_VECTORS
+    hnsw_m: int = QDRANT_HNSW_M
+    hnsw_ef_construct: int = QDRANT_HNSW_EF_CONSTRUCT
+    hnsw_on_disk: bool = QDRANT_HNSW_ON_DISK
+    shards: int = QDRANT_SHARDS
+    replicas: int = QDRANT_REPLICAS
+
+    def validate(self) -> "CollectionLayout":
+        """The layout itself; raises ValueError on settings Qdrant would reject"""
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {', '.join(QUANTIZATIONS)}")
+        if self.product_compression not in PRODUCT_COMPRESSIONS:
+            raise ValueError(f"product_compression must be one of {PRODUCT_COMPRESSIONS}")
+        if not 0.5 <= self.scalar_quantile <= 1.0:
+            raise ValueError("scalar_quantile must be between 0.5 and 1")
+        if self.hnsw_m < 0 or self.hnsw_ef_construct < 4 or self.shards < 1 or self.replicas < 1:
+            raise ValueError("hnsw_m must be >= 0, hnsw_ef_construct >= 4, shards and replicas >= 1")
+        return self
+
+
+def embedding_dimension(model: Optional[str] = None) -> int:
+    """EMBEDDING_DIMENSION if set, else the length of an embedding of a probe text"""
+    if EMBEDDING_DIMENSION:
+        return int(EMBEDDING_DIMENSION)
+    response = clients.openai_client().embeddings.create(
+        input=[DIMENSION_PROBE_TEXT], model=model or os.getenv("EMBEDDING_MODEL"))
+    dimension = len(response.data[0].embedding)
+    logger.info("Detected embedding dimension %d for model %s", dimension, model or os.getenv("EMBEDDING_MODEL"))
+    return dimension
+
+
+def quantization_config(layout: CollectionLayout):
+    from qdrant_client import models
+
+    if layout.quantization == "scalar":
+        return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8, quantile=layout.scalar_quantile, always_ram=layout.quantization_always_ram))
+    if layout.quantization == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(
+            always_ram=layout.quantization_always_ram))
+    if layout.quantization == "product":
+        return models.ProductQuantization(product=models.ProductQuantizationConfig(
+            compression=models.CompressionRatio(f"x{layout.product_compression}"),
+            always_ram=layout.quantization_always_ram))
+    return None
+
+
+def collection_params(layout: CollectionLayout, dimension: int) -> dict:
+    """Keyword arguments of QdrantClient.create_collection for the dense vectors and the layout"""
+    from qdrant_client import models
+
+    return {
+        "vectors_config": models.VectorParams(size=dimension, distance=models.Distance.COSINE,
+                                              on_disk=layout.on_disk_vectors),
+        "hnsw_config": models.HnswConfigDiff(m=layout.hnsw_m, ef_construct=layout.hnsw_ef_construct,
+                                             on_disk=layout.hnsw_on_disk),
+        "quantization_config": quantization_config(layout),
+        "shard_number": layout.shards,
+        "replication_factor": layout.replicas,
+    }
+
+
+def create_collection(name: str, layout: Optional[CollectionLayout] = None, dimension: Optional[int] = None):
+    """
+    Create the collection with the layout (CollectionLayout() unless given),
+    BM25 sparse vectors for hybrid retrieval and the source_file index.
+    """
+    from qdrant_client import models
+    from data_insertion.sparse import SPARSE_VECTOR_NAME
+
+    layout = (layout or CollectionLayout()).validate()
+    dimension = dimension or embedding_dimension()
+    clients.qdrant_client().create_collection(
+        collection_name=name,
+        # BM25 sparse vectors for hybrid retrieval; Qdrant applies the IDF part
+        sparse_vectors_config={SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)},
+        **collection_params(layout, dimension),
+    )
+    # Incremental ingestion deletes stale points by source file
+    clients.qdrant_client().create_payload_index(
+        collection_name=name,
+        field_name="source_file",
+        field_schema=models.PayloadSchemaType.KEYWORD,
+    )
+    logger.info("Created collection '%s' (%d dimensions, %s)", name, dimension, describe(layout))
+
+
+def collection_exists(name: str) -> bool:
+    """Whether name is a collection or an alias of one"""
+    qdrant = clients.qdrant_client()
+    if name in {collection.name for collection in qdrant.get_collections().collections}:
+        return True
+    return name in {alias.alias_name for alias in qdrant.get_aliases().aliases}
+
+
+def alias_target(name: str) -> Optional[str]:
+    """The collection the alias points to, or None if name is not an alias"""
+    for alias in clients.qdrant_client().get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return None
+
+
+def describe(layout: CollectionLayout) -> str:
+    quantization = layout.quantization
+    if quantization == "product":
+        quantization = f"product x{layout.product_compression}"
+    return (f"quantization {quantization}, vectors {'on disk' if layout.on_disk_vectors else 'in RAM'}, "
+            f"HNSW m={layout.hnsw_m} ef_construct={layout.hnsw_ef_construct}, "
+            f"{layout.shards} shards x {layout.replicas} replicas")
+
+
+def estimate_memory(layout: CollectionLayout, dimension: int, points: int) -> dict:
+    """
+    Rough bytes of the dense vectors and the HNSW graph kept in RAM and left
+    memory-mapped on disk, per replica (payloads and sparse vectors not
+    included): float32 originals, 1 byte (scalar), 1 bit (binary) or
+    4 / compression bytes (product) per dimension, and about 2 * m links of
+    4 bytes per point on the graph's base layer.
+    """
+    original = points * dimension * 4
+    quantized = {
+        "none": 0,
+        "scalar": points * dimension,
+        "binary": points * ((dimension + 7) // 8),
+        "product": points * dimension * 4 // layout.product_compression,
+    }[layout.quantization]
+    graph = points * layout.hnsw_m * 2 * 4
+    ram = disk = 0
+    for size, in_ram in ((original, not layout.on_disk_vectors),
+                         (quantized, layout.quantization_always_ram),
+                         (graph, not layout.hnsw_on_disk)):
+        if in_ram:
+            ram += size
+        else:
+            disk += size
+    return {"ram_bytes": ram, "disk_bytes": disk}
@@ -1,56 +1,205 @@
-from qdrant_client import QdrantClient
+import asyncio
 import os
+from typing import List
 from dotenv import load_dotenv
-from openai import OpenAI
 
 load_dotenv()
 
-QDRANT_URL = os.getenv("QDRANT_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 embedding_model = os.getenv("EMBEDDING_MODEL")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_API_BASE = os.getenv("OPENAI_API_BASE")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME")
 
-# Initialize clients
-client = OpenAI(base_url=OPENAI_API_BASE, api_key=OPENAI_API_KEY)
-qdrant_client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+# OpenAI and Qdrant clients are created on first use (see clients.py)
+import clients
+import metrics
 from logging_config import get_logger
+from data_insertion.embedding_cache import EmbeddingCache
+from data_insertion.local_index import VECTOR_BACKEND
+from data_insertion.sparse import SPARSE_VECTOR_NAME, query_sparse_vector
+from data_insertion.retrieval import (
+    HYBRID_RRF_K, PAYLOAD_FIELDS, RETRIEVAL_TOP_K, RetrievalConfig, RetrievedDocument,
+    query_filter, search_params, to_document,
+)
 
 logger = get_logger(__name__)
 
+# Size, TTL and the optional persistent file come from EMBEDDING_CACHE_* env vars
+query_embedding_cache = EmbeddingCache()
+
 def create_embedding(text, model=embedding_model):
-    """Generate embedding for text using OpenAI API"""
+    """Generate embedding for text using OpenAI API, served from the query cache when possible"""
     try:
+        cached = query_embedding_cache.get(text, model)
+        metrics.CACHE_REQUESTS.inc(cache="query_embedding", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
         text = text.replace("\n", " ")
-        response = client.embeddings.create(input=[text], model=model)
-        return response.data[0].embedding
+        with metrics.timed_call("embedding"):
+            response = clients.openai_client().embeddings.create(input=[text], model=model)
+        embedding = response.data[0].embedding
+        query_embedding_cache.put(text, model, embedding)
+        return embedding
     except Exception as e:
         logger.exception("Error generating embedding: %s", e)
         return None
 
-def query_documents(query):
-    
+async def acreate_embedding(text, model=embedding_model):
+    """Async version of create_embedding, sharing the same query cache"""
     try:
-        query_vector = create_embedding(query)
-        if not query_vector:
-            return None
+        cached = query_embedding_cache.get(text, model)
+        metrics.CACHE_REQUESTS.inc(cache="query_embedding", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+        text = text.replace("\n", " ")
+        with metrics.timed_call("embedding"):
+            response = await clients.async_openai_client().embeddings.create(input=[text], model=model)
+        embedding = response.data[0].embedding
+        query_embedding_cache.put(text, model, embedding)
+        return embedding
+    except Exception as e:
+        logger.exception("Error generating embedding: %s", e)
+        return None
+
+def reciprocal_rank_fusion(rankings, k=HYBRID_RRF_K, limit=RETRIEVAL_TOP_K):
+    """
+    Fuse ranked lists of points: score(p) = sum over lists of 1 / (k + rank of p).
+    Returns (point, fused score) pairs; ties keep the order in which points
+    first appear in the rankings.
+    """
+    scores, points = {}, {}
+    for ranking in rankings:
+        for rank, point in enumerate(ranking, start=1):
+            scores[point.id] = scores.get(point.id, 0.0) + 1.0 / (k + rank)
+            points.setdefault(point.id, point)
+    return [(points[point_id], scores[point_id]) for point_id in sorted(scores, key=scores.get, reverse=True)[:limit]]
+
+def dense_request(query_vector, config, limit):
+    from qdrant_client import models
+
+    return models.QueryRequest(
+        query=query_vector,
+        filter=query_filter(config),
+        params=search_params(config),
+        score_threshold=config.score_threshold,
+        with_payload=PAYLOAD_FIELDS,
+        limit=limit,
+    )
+
+def hybrid_requests(query, query_vector, config):
+    """Dense and (if the query has any terms) sparse search, sent as one batch"""
+    from qdrant_client import models
+
+    prefetch = max(config.prefetch, config.top_k)
+    requests = [dense_request(query_vector, config, prefetch)]
+    indices, values = query_sparse_vector(query)
+    if indices:
+        requests.append(models.QueryRequest(
+            query=models.SparseVector(indices=indices, values=values),
+            using=SPARSE_VECTOR_NAME,
+            filter=query_filter(config),
+            limit=prefetch,
+            with_payload=PAYLOAD_FIELDS,
+        ))
+    return requests
+
+def fuse(responses, config):
+    # Sparse ranking first: on equal fused scores the exact term match wins
+    return reciprocal_rank_fusion([response.points for response in reversed(responses)], config.rrf_k, config.top_k)
+
+_warned_local_hybrid = False
+
+def local_search_points(query_vector, config):
+    """search_points on the embedded index (VECTOR_BACKEND=local), which is dense only"""
+    global _warned_local_hybrid
+    if config.mode == "hybrid" and not _warned_local_hybrid:
+        _warned_local_hybrid = True
+        logger.warning("The local index has no sparse vectors, running hybrid queries as dense")
+    with metrics.timed_call("local_index_query"):
+        return clients.local_index().search(query_vector, config)
 
-        results = []
-        
-        result = qdrant_client.query_points(
+def search_points(query, query_vector, config=None):
+    """(point, score) pairs for the query, best first, dense or hybrid per config.mode"""
+    config = config or RetrievalConfig()
+    if VECTOR_BACKEND == "local":
+        return local_search_points(query_vector, config)
+    if config.mode == "hybrid":
+        try:
+            with metrics.timed_call("qdrant_query"):
+                responses = clients.qdrant_client().query_batch_points(
+                    collection_name=COLLECTION_NAME,
+                    requests=hybrid_requests(query, query_vector, config),
+                )
+            return fuse(responses, config)
+        except Exception as e:
+            # e.g. a collection created before sparse vectors existed
+            logger.warning("Hybrid search failed, falling back to dense search: %s", e)
+    with metrics.timed_call("qdrant_query"):
+        response, = clients.qdrant_client().query_batch_points(
             collection_name=COLLECTION_NAME,
-            query=query_vector,
-            with_payload=["text"],
-            limit=5
+            requests=[dense_request(query_vector, config, config.top_k)],
         )
-        for point in result.points:
-            results.append(point.payload["text"])
+    return [(point, point.score) for point in response.points]
 
-        return results
+async def asearch_points(query, query_vector, config=None):
+    """Async version of search_points"""
+    config = config or RetrievalConfig()
+    if VECTOR_BACKEND == "local":
+        # Keeps the matrix products off the event loop; NumPy releases the GIL for them
+        return await asyncio.to_thread(local_search_points, query_vector, config)
+    if config.mode == "hybrid":
+        try:
+            with metrics.timed_call("qdrant_query"):
+                responses = await clients.async_qdrant_client().query_batch_points(
+                    collection_name=COLLECTION_NAME,
+                    requests=hybrid_requests(query, query_vector, config),
+                )
+            return fuse(responses, config)
+        except Exception as e:
+            logger.warning("Hybrid search failed, falling back to dense search: %s", e)
+    with metrics.timed_call("qdrant_query"):
+        response, = await clients.async_qdrant_client().query_batch_points(
+            collection_name=COLLECTION_NAME,
+            requests=[dense_request(query_vector, config, config.top_k)],
+        )
+    return [(point, point.score) for point in response.points]
+
+def query_documents(query, config: RetrievalConfig | None = None) -> List[RetrievedDocument]:
+    """
+    Documents for the query, best first (RetrievalConfig() settings unless
+    given). Returns an empty list if embedding or search fails.
+    """
+    try:
+        query_vector = create_embedding(query)
+        if not query_vector:
+            return []
+        return [to_document(point, score) for point, score in search_points(query, query_vector, config)]
     except Exception as e:
         logger.exception("Error querying documents: %s", e)
+        return []
+
+async def aquery_documents(query, config: RetrievalConfig | None = None) -> List[RetrievedDocument]:
+    """Async version of query_documents"""
+    try:
+        query_vector = await acreate_embedding(query)
+        if not query_vector:
+            return []
+        return [to_document(point, score) for point, score in await asearch_points(query, query_vector, config)]
+    except Exception as e:
+        logger.exception("Error querying documents: %s", e)
+        return []
+
+
+def collection_version():
+    """
+    Identifies the current contents of the collection. Ingestion stamps the
+    collection metadata with 'ingested_at' after every run; the point count
+    covers servers too old to store collection metadata.
+    """
+    try:
+        if VECTOR_BACKEND == "local":
+            return clients.local_index().version()
+        info = clients.qdrant_client().get_collection(COLLECTION_NAME)
+        metadata = getattr(info.config, "metadata", None) or {}
+        return f"{metadata.get('ingested_at')}:{info.points_count}"
+    except Exception as e:
+        logger.exception("Error reading collection version: %s", e)
         return None
-    
-    
-    
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+Cache for query embeddings.
+
+Queries are keyed on their normalised text (case-folded, whitespace
+collapsed) and the embedding model. A thread-safe in-process LRU tier with
+a TTL answers repeated questions without an API call; an optional SQLite
+tier keeps embeddings across restarts and between worker processes.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "3600"))
+# Optional persistent tier; unset keeps the cache in memory only
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")
+EMBEDDING_CACHE_PERSIST_TTL = float(os.getenv("EMBEDDING_CACHE_PERSIST_TTL", str(7 * 24 * 3600)))
+
+
+def normalize_query(text: str) -> str:
+    """Case-fold and collapse whitespace so trivially different queries share an entry"""
+    return " ".join(text.casefold().split())
+
+
+def cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache. get() checks memory, then SQLite (promoting
+    hits back into memory); put() writes both tiers. Hit and miss counts
+    are available from stats().
+    """
+
+    def __init__(
+        self,
+        max_entries: int = EMBEDDING_CACHE_SIZE,
+        ttl: float = EMBEDDING_CACHE_TTL,
+        path: Optional[str] = EMBEDDING_CACHE_PATH,
+        persist_ttl: float = EMBEDDING_CACHE_PERSIST_TTL,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist_ttl = persist_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT, vector BLOB, created_at REAL)"
+            )
+            self._db.execute(
+                "DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.persist_ttl,)
+            )
+            self._db.commit()
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        key = cache_key(text, model)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, vector = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector FROM embeddings WHERE key = ? AND created_at >= ?",
+                    (key, time.time() - self.persist_ttl),
+                ).fetchone()
+                if row is not None:
+                    vector = array("f", row[0]).tolist()
+                    self._remember(key, vector, now)
+                    self.persistent_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def put(self, text: str, model: str, vector: List[float]):
+        key = cache_key(text, model)
+        with self._lock:
+            self._remember(key, vector, time.monotonic())
+            if self._db is not None:
+                try:
+                    with self._db:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO embeddings (key, model, vector, created_at) VALUES (?, ?, ?, ?)",
+                            (key, model, array("f", vector).tobytes(), time.time()),
+                        )
+                except sqlite3.Error as e:
+                    logger.warning("Could not persist query embedding: %s", e)
+
+    def _remember(self, key: str, vector: List[float], now: float):
+        # Caller holds the lock
+        self._entries[key] = (now + self.ttl, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop the in-memory tier (the persistent tier is kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.persistent_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.persistent_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,171 @@
+"""
+PDF text extraction and chunking, parallelised across processes.
+
+PDF parsing is CPU-bound, so files are extracted and chunked in a pool of
+INGEST_WORKERS processes. Pages are fed into the text splitter as they are
+read instead of building the whole document string first, and each file is
+limited to INGEST_FILE_TIMEOUT seconds so one pathological PDF cannot stall
+a run. This module deliberately imports no API clients, so worker processes
+stay cheap to start.
+"""
+
+import os
+import signal
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import PyPDF2
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+INGEST_FILE_TIMEOUT = float(os.getenv("INGEST_FILE_TIMEOUT", "120"))
+
+# Extra time the parent waits beyond the per-file timeout before giving up
+# on a worker that did not honour its alarm
+TIMEOUT_GRACE = 30.0
+
+# Split the page buffer once it holds this many chunks' worth of text
+BUFFER_CHUNKS = 4
+
+
+@lru_cache(maxsize=None)
+def get_text_splitter(chunk_size: int = 1000, chunk_overlap: int = 200) -> RecursiveCharacterTextSplitter:
+    """Shared splitter per configuration; split_text keeps no state between calls"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+
+
+def iter_pdf_pages(pdf_path: str) -> Iterator[str]:
+    """Yield the text of each page of a PDF"""
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        for page in pdf_reader.pages:
+            yield page.extract_text() or ""
+
+
+def extract_text_from_pdf(pdf_path: str) -> str:
+    """Extract text from PDF file"""
+    try:
+        return "\n".join(iter_pdf_pages(pdf_path)).strip()
+    except Exception as e:
+        logger.exception("Error extracting text from %s: %s", pdf_path, e)
+        return ""
+
+
+def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
+    """Split text into chunks for better vector search"""
+    return get_text_splitter(chunk_size, chunk_overlap).split_text(text)
+
+
+def iter_text_chunks(pages: Iterable[str], chunk_size: int = 1000, chunk_overlap: int = 200) -> Iterator[str]:
+    """
+    Chunk text page by page. Only a few chunks' worth of text is buffered:
+    when the buffer is full it is split and every chunk but the last is
+    emitted. The last one may continue on the next page, so it seeds the
+    next buffer, which also carries the overlap with the emitted chunks.
+    """
+    splitter = get_text_splitter(chunk_size, chunk_overlap)
+    buffer = ""
+    for page in pages:
+        buffer += page + "\n"
+        if len(buffer) < BUFFER_CHUNKS * chunk_size:
+            continue
+        chunks = splitter.split_text(buffer)
+        buffer = chunks.pop() if chunks else ""
+        yield from chunks
+    if buffer.strip():
+        yield from splitter.split_text(buffer)
+
+
+class _Alarm(BaseException):
+    # BaseException so that broad "except Exception" blocks inside the PDF
+    # parser cannot swallow the timeout
+    pass
+
+
+def _raise_alarm(signum, frame):
+    raise _Alarm()
+
+
+def extract_and_chunk(pdf_path: str, timeout: Optional[float] = None) -> List[str]:
+    """
+    Extract and chunk one PDF. Runs inside a worker process; raises
+    TimeoutError if the file takes longer than timeout seconds.
+    """
+    use_alarm = bool(timeout) and hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return list(iter_text_chunks(iter_pdf_pages(pdf_path)))
+    except _Alarm:
+        raise TimeoutError(f"Extraction of {pdf_path} exceeded {timeout}s")
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+
+
+def _log_failure(pdf_path: str, error: BaseException):
+    if isinstance(error, TimeoutError):
+        logger.error("Timed out extracting %s, skipping it", pdf_path)
+    else:
+        logger.error("Error extracting text from %s: %s", pdf_path, error, exc_info=error)
+
+
+def extract_files(
+    pdf_paths: Iterable[str],
+    workers: int = INGEST_WORKERS,
+    timeout: Optional[float] = INGEST_FILE_TIMEOUT,
+) -> Iterator[Tuple[str, Optional[List[str]]]]:
+    """
+    Extract and chunk PDFs on a process pool, yielding (pdf_path, chunks) in
+    input order. chunks is None when a file failed or timed out. At most
+    2 x workers files are queued ahead of the consumer.
+    """
+    if workers <= 1:
+        for pdf_path in pdf_paths:
+            try:
+                yield pdf_path, extract_and_chunk(pdf_path, timeout)
+            except Exception as e:
+                _log_failure(pdf_path, e)
+                yield pdf_path, None
+        return
+
+    pending = deque()
+    stuck = False
+    pool = ProcessPoolExecutor(max_workers=workers)
+
+    def collect():
+        nonlocal stuck
+        pdf_path, future = pending.popleft()
+        try:
+            return pdf_path, future.result(timeout=timeout + TIMEOUT_GRACE if timeout else None)
+        except Exception as e:
+            if not future.done():
+                # The worker did not honour its alarm (e.g. stuck in C code)
+                stuck = True
+            _log_failure(pdf_path, e)
+        return pdf_path, None
+
+    try:
+        for pdf_path in pdf_paths:
+            pending.append((pdf_path, pool.submit(extract_and_chunk, pdf_path, timeout)))
+            if len(pending) >= 2 * workers:
+                yield collect()
+        while pending:
+            yield collect()
+    finally:
+        # Don't block shutdown on a stuck worker
+        pool.shutdown(wait=not stuck, cancel_futures=True)
@@ -2,7 +2,11 @@ import os
 import sys
 import glob
 import uuid
-from typing import List, Dict, Any
+import queue
+import threading
+from functools import lru_cache
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Iterable, Iterator, Set
 from dotenv import load_dotenv
 
 # 1. Add parent directory (backend) to the python path so it can find logging_config
@@ -11,66 +15,47 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # 2. Actually call load_dotenv() to load your `.env` variables
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env'))
 
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams
+from qdrant_client.http.models import SparseVector
 from qdrant_client.http.models import PointStruct
-from openai import OpenAI
-import PyPDF2
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from qdrant_client.http.models import FieldCondition, Filter, FilterSelector, MatchValue
 from tqdm import tqdm
 import logging
 
+import clients
 from logging_config import get_logger
+from data_insertion.batch_embedding import BatchEmbedder, batched
+from data_insertion.collection import collection_exists, create_collection
+from data_insertion.local_index import VECTOR_BACKEND
+from data_insertion.manifest import IngestManifest, file_sha256
+from data_insertion.sparse import SPARSE_VECTOR_NAME, document_sparse_vector
+from data_insertion.extraction import (
+    INGEST_FILE_TIMEOUT,
+    INGEST_WORKERS,
+    extract_and_chunk,
+    extract_files,
+)
 
 
 logger = get_logger(__name__)
-logging.basicConfig(level=logging.INFO)
 
-qdrant_url = os.getenv("QDRANT_URL")
-qdrant_api_key = os.getenv("QDRANT_API_KEY")
 embedding_model = os.getenv("EMBEDDING_MODEL")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_API_BASE = os.getenv("OPENAI_API_BASE")
 COLLECTION_NAME = os.getenv("COLLECTION_NAME")
 
-# Initialize OpenAI client (fixed the API key issue)
-client = OpenAI(base_url=OPENAI_API_BASE, api_key=OPENAI_API_KEY)
+@lru_cache(maxsize=None)
+def get_embedder() -> BatchEmbedder:
+    """Batch size and concurrency come from EMBEDDING_BATCH_SIZE / EMBEDDING_CONCURRENCY"""
+    return BatchEmbedder(clients.openai_client(), embedding_model)
 
 def get_embedding(text, model=embedding_model):
     """Generate embedding for text using OpenAI API"""
     try:
         text = text.replace("\n", " ")
-        response = client.embeddings.create(input=[text], model=model)
+        response = clients.openai_client().embeddings.create(input=[text], model=model)
         return response.data[0].embedding
     except Exception as e:
         logger.exception("Error generating embedding: %s", e)
         return None
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extract text from PDF file"""
-    try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text.strip()
-    except Exception as e:
-        logger.exception("Error extracting text from %s: %s", pdf_path, e)
-        return ""
-
-def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
-    """Split text into chunks for better vector search"""
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len,
-        separators=["\n\n", "\n", " ", ""]
-    )
-    chunks = text_splitter.split_text(text)
-    return chunks
-
 def find_all_pdf_files(data_folder: str) -> List[str]:
     """Find all PDF files in the data folder recursively"""
     pdf_pattern = os.path.join(data_folder, "**", "*.pdf")
@@ -78,61 +63,111 @@ def find_all_pdf_files(data_folder: str) -> List[str]:
     return pdf_files
 
 def create_collection_if_not_exists():
-    """Create Qdrant collection if it doesn't exist"""
+    """Create the Qdrant collection with the configured layout (see collection.py) if it doesn't exist"""
+    if VECTOR_BACKEND == "local":
+        # Created on first use; the dimension is taken from the first vectors
+        logger.info("Using the local index at %s", clients.local_index().path)
+        return
     try:
-        # Check if collection exists
-        collections = qdrant_client.get_collections()
-        collection_names = [col.name for col in collections.collections]
-        
-        if COLLECTION_NAME not in collection_names:
+        # COLLECTION_NAME may be an alias after migrations.rebuild_collection
+        if not collection_exists(COLLECTION_NAME):
             logger.info("Creating collection: %s", COLLECTION_NAME)
-            qdrant_client.create_collection(
-                collection_name=COLLECTION_NAME,
-                vectors_config=VectorParams(size=1024, distance=Distance.COSINE),
-            )
-            logger.info("Collection '%s' created successfully", COLLECTION_NAME)
+            create_collection(COLLECTION_NAME)
         else:
             logger.info("Collection '%s' already exists", COLLECTION_NAME)
     except Exception as e:
         logger.exception("Error creating collection: %s", e)
 
-def process_pdf_file(pdf_path: str, base_folder: str) -> List[Dict[str, Any]]:
-    """Process a single PDF file and return chunks with metadata"""
+@lru_cache(maxsize=None)
+def collection_has_sparse_vectors() -> bool:
+    """
+    Whether the collection stores BM25 sparse vectors. Collections created
+    before hybrid retrieval have none and cannot gain them in place; they
+    keep getting dense vectors only until they are re-created.
+    """
+    if VECTOR_BACKEND == "local":
+        return False
+    try:
+        info = clients.qdrant_client().get_collection(COLLECTION_NAME)
+        return SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+    except Exception as e:
+        logger.warning("Could not read the collection's sparse vector config: %s", e)
+        return False
+
+def chunk_records(chunks: List[str], source_file: str, file_hash: str) -> List[Dict[str, Any]]:
+    """Payloads for the non-empty chunks of a file"""
+    return [
+        {
+            'text': chunk,
+            'source_file': source_file,
+            'chunk_index': i,
+            'total_chunks': len(chunks),
+            'file_type': 'pdf',
+            'file_hash': file_hash
+        }
+        for i, chunk in enumerate(chunks)
+        if chunk.strip()  # Only process non-empty chunks
+    ]
+
+def iter_pdf_chunks(pdf_path: str, base_folder: str, file_hash: str | None = None) -> Iterator[Dict[str, Any]]:
+    """Extract and chunk a single PDF in this process, yielding non-empty chunks with their payload"""
     logger.info("Processing: %s", pdf_path)
-    
-    # Extract text from PDF
-    text = extract_text_from_pdf(pdf_path)
-    if not text:
+    chunks = extract_and_chunk(pdf_path, INGEST_FILE_TIMEOUT)
+    if not chunks:
         logger.warning("No text extracted from %s", pdf_path)
-        return []
-    
-    # Chunk the text
-    chunks = chunk_text(text)
+        return
     logger.info("Created %d chunks from %s", len(chunks), pdf_path)
-    
-    # Prepare data for Qdrant
-    points_data = []
-    relative_path = os.path.relpath(pdf_path, base_folder)
-    
-    for i, chunk in enumerate(chunks):
-        if chunk.strip():  # Only process non-empty chunks
-            # Generate embedding
-            embedding = get_embedding(chunk)
-            if embedding:
-                point_data = {
-                    'id': str(uuid.uuid4()),
-                    'vector': embedding,
-                    'payload': {
-                        'text': chunk,
-                        'source_file': relative_path,
-                        'chunk_index': i,
-                        'total_chunks': len(chunks),
-                        'file_type': 'pdf'
-                    }
-                }
-                points_data.append(point_data)
-    
-    return points_data
+    yield from chunk_records(chunks, os.path.relpath(pdf_path, base_folder), file_hash or file_sha256(pdf_path))
+
+# Fixed namespace so point ids are stable across runs and machines
+POINT_ID_NAMESPACE = uuid.UUID("6f1c3b1e-8a47-4c39-9d0e-3f4f2b7a9c51")
+
+def point_id(file_hash: str, chunk_index: int) -> str:
+    """Deterministic point id for a chunk of a given file version"""
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{file_hash}:{chunk_index}"))
+
+def build_point(record: Dict[str, Any], embedding: List[float]) -> Dict[str, Any]:
+    """Turn a chunk record and its embedding into point data for Qdrant"""
+    return {
+        'id': point_id(record['file_hash'], record['chunk_index']),
+        'vector': embedding,
+        'sparse_vector': document_sparse_vector(record['text']),
+        'payload': record
+    }
+
+def point_vectors(point: Dict[str, Any]):
+    """Dense vector alone, or dense + sparse if the collection stores sparse vectors"""
+    if not collection_has_sparse_vectors():
+        return point['vector']
+    indices, values = point['sparse_vector']
+    return {'': point['vector'], SPARSE_VECTOR_NAME: SparseVector(indices=indices, values=values)}
+
+def process_pdf_file(pdf_path: str, base_folder: str) -> List[Dict[str, Any]]:
+    """Process a single PDF file and return chunks with metadata"""
+    records = list(iter_pdf_chunks(pdf_path, base_folder))
+    # Embed the file's chunks in batched requests
+    embeddings = get_embedder().embed([record['text'] for record in records])
+    return [build_point(record, embedding) for record, embedding in zip(records, embeddings) if embedding]
+
+def upsert_points(points_data: List[Dict[str, Any]]):
+    """Upsert one batch of point data to Qdrant (or the local index)"""
+    if VECTOR_BACKEND == "local":
+        clients.local_index().upsert((point['id'], point['vector'], point['payload']) for point in points_data)
+        return
+    # Convert to PointStruct objects
+    points = [
+        PointStruct(
+            id=point['id'],
+            vector=point_vectors(point),
+            payload=point['payload']
+        )
+        for point in points_data
+    ]
+    clients.qdrant_client().upsert(
+        collection_name=COLLECTION_NAME,
+        wait=True,
+        points=points,
+    )
 
 def insert_points_to_qdrant(points_data: List[Dict[str, Any]], batch_size: int = 100):
     """Insert points to Qdrant in batches"""
@@ -144,71 +179,205 @@ def insert_points_to_qdrant(points_data: List[Dict[str, Any]], batch_size: int =
     # Process in batches
     for i in tqdm(range(0, len(points_data), batch_size), desc="Inserting batches"):
         batch = points_data[i:i + batch_size]
-        
-        # Convert to PointStruct objects
-        points = [
-            PointStruct(
-                id=point['id'],
-                vector=point['vector'],
-                payload=point['payload']
-            )
-            for point in batch
-        ]
-        
         try:
-            qdrant_client.upsert(
-                collection_name=COLLECTION_NAME,
-                wait=True,
-                points=points,
-            )
+            upsert_points(batch)
         except Exception as e:
             logger.exception("Error inserting batch %d: %s", i//batch_size + 1, e)
 
-# Initialize Qdrant client
-qdrant_client = QdrantClient(
-    url=qdrant_url, 
-    api_key=qdrant_api_key,
-)
+# ─── Streaming pipeline ───────────────────────────────────────────────────────
+# files -> chunks -> embedding batches -> point batches -> background upserts.
+# Every stage is a generator, so only a bounded number of batches is ever held
+# in memory and points land in Qdrant while later files are still being read.
+
+INGEST_UPSERT_BATCH_SIZE = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", "100"))
+INGEST_MAX_IN_FLIGHT = int(os.getenv("INGEST_MAX_IN_FLIGHT", "8"))
+
+def iter_pdf_files(data_folder: str) -> Iterator[str]:
+    """Lazily find PDF files in the data folder recursively"""
+    return glob.iglob(os.path.join(data_folder, "**", "*.pdf"), recursive=True)
+
+def delete_source_points(source_file: str):
+    """Delete every point that was built from the given source file"""
+    if VECTOR_BACKEND == "local":
+        clients.local_index().delete_source_file(source_file)
+        return
+    clients.qdrant_client().delete(
+        collection_name=COLLECTION_NAME,
+        points_selector=FilterSelector(
+            filter=Filter(must=[FieldCondition(key="source_file", match=MatchValue(value=source_file))])
+        ),
+        wait=True,
+    )
+
+def plan_file(source_file: str, file_hash: str, manifest: IngestManifest) -> Set[int] | None:
+    """
+    Decide what to do with a file before extracting it. Returns the chunk
+    indices already in Qdrant, or None if the file can be skipped.
+
+    Unchanged, completed files are skipped. New or changed files first lose
+    any points of their previous version. A file left incomplete by an
+    interrupted run keeps its upserted chunks, so only the rest are embedded.
+    """
+    entry = manifest.get_file(source_file)
+
+    if entry and entry.file_hash == file_hash:
+        if entry.complete:
+            logger.debug("Skipping unchanged file: %s", source_file)
+            return None
+        done = manifest.upserted_chunks(source_file)
+        logger.info("Resuming %s: %d chunks already upserted", source_file, len(done))
+        return done
+
+    if entry:
+        logger.info("File changed, replacing its points: %s", source_file)
+    # Also clears points a pre-manifest run may have left for this file
+    delete_source_points(source_file)
+    manifest.start_file(source_file, file_hash)
+    return set()
+
+def iter_chunk_records(pdf_files: Iterable[str], base_folder: str, manifest: IngestManifest | None = None,
+                       workers: int = INGEST_WORKERS) -> Iterator[Dict[str, Any]]:
+    """
+    Chunk records for every file that needs (re-)ingesting. Files are hashed
+    and checked against the manifest here, then extracted and chunked on a
+    pool of worker processes. A failing file is logged and skipped; with a
+    manifest it stays incomplete and is retried on the next run.
+    """
+    plans = {}
+
+    def planned_files():
+        for pdf_file in tqdm(pdf_files, desc="Processing PDF files", unit="file"):
+            source_file = os.path.relpath(pdf_file, base_folder)
+            try:
+                file_hash = file_sha256(pdf_file)
+                done = plan_file(source_file, file_hash, manifest) if manifest is not None else set()
+            except Exception as e:
+                logger.exception("Error processing %s: %s", pdf_file, e)
+                continue
+            if done is not None:
+                plans[pdf_file] = (file_hash, done)
+                yield pdf_file
+
+    for pdf_file, chunks in extract_files(planned_files(), workers):
+        file_hash, done = plans.pop(pdf_file)
+        if chunks is None:
+            continue
+        source_file = os.path.relpath(pdf_file, base_folder)
+        records = chunk_records(chunks, source_file, file_hash)
+        if records:
+            logger.info("Created %d chunks from %s", len(chunks), pdf_file)
+        else:
+            logger.warning("No text extracted from %s", pdf_file)
+        if manifest is not None:
+            manifest.set_expected_chunks(source_file, len(records))
+        for record in records:
+            if record['chunk_index'] not in done:
+                yield record
+
+def purge_removed_files(seen_files: Iterable[str], manifest: IngestManifest) -> int:
+    """Delete points and manifest entries of files that no longer exist"""
+    removed = manifest.source_files() - set(seen_files)
+    for source_file in removed:
+        logger.info("File removed, purging its points: %s", source_file)
+        delete_source_points(source_file)
+        manifest.remove_file(source_file)
+    return len(removed)
+
+def iter_points(records: Iterable[Dict[str, Any]], max_in_flight: int = INGEST_MAX_IN_FLIGHT) -> Iterator[Dict[str, Any]]:
+    """Embed chunk records in batches, yielding point data in chunk order"""
+    embedder = get_embedder()
+    batches = batched(records, embedder.batch_size)
+    for batch, embeddings in embedder.embed_batches(batches, text_of=lambda record: record['text'], max_in_flight=max_in_flight):
+        for record, embedding in zip(batch, embeddings):
+            if embedding:
+                yield build_point(record, embedding)
+
+def upsert_point_stream(points: Iterable[Dict[str, Any]], batch_size: int = INGEST_UPSERT_BATCH_SIZE,
+                        max_in_flight: int = INGEST_MAX_IN_FLIGHT, manifest: IngestManifest | None = None) -> int:
+    """
+    Upsert points from a stream on a background thread.
+
+    Batches are handed over through a queue of at most max_in_flight entries:
+    when Qdrant falls behind, the queue fills up and the embedding stages
+    block instead of accumulating points in memory. Upserted chunks are
+    recorded in the manifest, if given. Returns the number of points upserted.
+    """
+    point_batches = queue.Queue(maxsize=max(1, max_in_flight))
+    upserted = 0
+
+    def writer():
+        nonlocal upserted
+        batch_number = 0
+        while True:
+            batch = point_batches.get()
+            if batch is None:
+                return
+            batch_number += 1
+            try:
+                upsert_points(batch)
+                upserted += len(batch)
+                if manifest is not None:
+                    manifest.record_upserted(point['payload'] for point in batch)
+            except Exception as e:
+                logger.exception("Error inserting batch %d: %s", batch_number, e)
+
+    writer_thread = threading.Thread(target=writer, name="qdrant-upsert", daemon=True)
+    writer_thread.start()
+    try:
+        for batch in batched(points, batch_size):
+            point_batches.put(batch)
+    finally:
+        point_batches.put(None)
+        writer_thread.join()
+    return upserted
+
+def mark_collection_ingested():
+    """Stamp the collection so caches built on its old contents get invalidated"""
+    if VECTOR_BACKEND == "local":
+        # Also the time to drop the rows of replaced and deleted points
+        clients.local_index().compact()
+        clients.local_index().mark_ingested()
+        return
+    try:
+        clients.qdrant_client().update_collection(
+            collection_name=COLLECTION_NAME,
+            metadata={'ingested_at': datetime.now(timezone.utc).isoformat()},
+        )
+    except Exception as e:
+        # Older Qdrant servers have no collection metadata; caches fall back to the point count
+        logger.warning("Could not update collection metadata: %s", e)
 
 def main():
-    """Main function to process all PDF files and insert into Qdrant"""
+    """Main function to incrementally stream new and changed PDF files into Qdrant"""
+    logging.basicConfig(level=logging.INFO)
     logger.info("Starting PDF to Qdrant insertion process...")
     
     # Create collection if it doesn't exist
     create_collection_if_not_exists()
     
-    # Find all PDF files
     data_folder = "data_insertion/data"
+    # Separate entries per backend, so switching backends ingests everything again
+    manifest = IngestManifest(COLLECTION_NAME if VECTOR_BACKEND == "qdrant" else f"{VECTOR_BACKEND}:{COLLECTION_NAME}")
+    seen_files = []
 
-    pdf_files = find_all_pdf_files(data_folder)
-    
-    if not pdf_files:
-        logger.warning("No PDF files found in the data folder")
-        return
-    
-    logger.info("Found %d PDF files to process", len(pdf_files))
-    
-    # Process all PDF files
-    all_points_data = []
-    
-    for pdf_file in tqdm(pdf_files, desc="Processing PDF files"):
-        try:
-            points_data = process_pdf_file(pdf_file, data_folder)
-            all_points_data.extend(points_data)
-        except Exception as e:
-            logger.exception("Error processing %s: %s", pdf_file, e)
-            continue
-    
-    logger.info("Total points to insert: %d", len(all_points_data))
-    
-    # Insert all points to Qdrant
-    if all_points_data:
-        insert_points_to_qdrant(all_points_data)
-        logger.info("PDF insertion to Qdrant completed successfully!")
-    else:
-        logger.info("No data to insert")
+    def track(pdf_files):
+        for pdf_file in pdf_files:
+            seen_files.append(os.path.relpath(pdf_file, data_folder))
+            yield pdf_file
+
+    try:
+        records = iter_chunk_records(track(iter_pdf_files(data_folder)), data_folder, manifest)
+        upserted = upsert_point_stream(iter_points(records), manifest=manifest)
+        purged = purge_removed_files(seen_files, manifest)
+    finally:
+        manifest.close()
+
+    if upserted or purged:
+        mark_collection_ingested()
+
+    logger.info("PDF insertion to Qdrant completed! %d files scanned, %d points upserted, %d removed files purged",
+                len(seen_files), upserted, purged)
 
 # Run the main function
 if __name__ == "__main__":
     main()
-
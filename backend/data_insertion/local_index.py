@@ -0,0 +1,364 @@
+"""
+Embedded vector index: an in-process alternative to Qdrant.
+
+With VECTOR_BACKEND=local, ingestion writes to and query_documents() reads
+from a directory under LOCAL_INDEX_DIR (one per COLLECTION_NAME) instead of
+a Qdrant server:
+
+- vectors-<generation>.<dtype>: the unit-length embeddings as one row-major
+  matrix, float32 or, with LOCAL_INDEX_DTYPE=int8, scaled by 127 to a
+  quarter of the size. Searches memory-map it read-only, so every worker
+  process on the machine shares the same pages of the OS page cache.
+- points.sqlite3: point id, source file and JSON payload per row, the
+  deleted rows and the index metadata.
+
+Search is exact: cosine scores of the query against every live row (matrix
+products over LOCAL_INDEX_BLOCK_ROWS rows at a time) with the top k kept by
+argpartition. It covers dense retrieval with top_k, score_threshold and
+source_files; there are no BM25 sparse vectors, so hybrid queries run as
+dense ones. The index suits small and medium collections: the cost grows
+linearly with the number of points.
+
+Rows are only appended. Replacing or deleting points marks their rows
+deleted, and compact() rewrites the live rows to a new generation once
+more than LOCAL_INDEX_COMPACT_RATIO of the rows are deleted. One process
+writes at a time (ingestion); readers pick up its commits on their next
+search.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# "qdrant" (default) or "local" (this module)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant").lower()
+LOCAL_INDEX_DIR = os.getenv(
+    "LOCAL_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "local_index_data"))
+# Only applies when an index is created; an existing index keeps its dtype
+LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "float32").lower()
+# Rows scored per matrix product; bounds the scratch memory of a search (int8
+# blocks are converted to float32 first)
+LOCAL_INDEX_BLOCK_ROWS = int(os.getenv("LOCAL_INDEX_BLOCK_ROWS", "16384"))
+LOCAL_INDEX_COMPACT_RATIO = float(os.getenv("LOCAL_INDEX_COMPACT_RATIO", "0.2"))
+
+DTYPES = {"float32": np.float32, "int8": np.int8}
+INT8_SCALE = 127.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS points (
+    row INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    source_file TEXT,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS points_source_file ON points (source_file);
+CREATE TABLE IF NOT EXISTS deleted (
+    row INTEGER PRIMARY KEY
+);
+"""
+
+
+class LocalPoint(NamedTuple):
+    """The parts of a Qdrant ScoredPoint that to_document() reads"""
+    id: str
+    payload: Dict[str, Any]
+
+
+class Snapshot(NamedTuple):
+    """What one search sees: a committed state of the index"""
+    generation: int
+    dtype: str
+    vectors: Optional[np.ndarray]  # memory-mapped, None while the index is empty
+    deleted: np.ndarray  # row numbers
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def top_k(scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The k best (scores, rows) of each query row, unordered"""
+    if scores.shape[1] <= k:
+        return scores, rows
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(scores, best, axis=1), np.take_along_axis(rows, best, axis=1)
+
+
+class LocalIndex:
+    """
+    The index in one directory. Safe to share between threads: searches
+    only hold the lock to read the payloads of their hits.
+    """
+
+    def __init__(self, path: str, dtype: str = LOCAL_INDEX_DTYPE, block_rows: int = LOCAL_INDEX_BLOCK_ROWS):
+        if dtype not in DTYPES:
+            raise ValueError(f"LOCAL_INDEX_DTYPE must be one of {', '.join(DTYPES)}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.block_rows = block_rows
+        self._lock = threading.Lock()
+        # Transactions are managed explicitly (BEGIN IMMEDIATE for writes)
+        self._conn = sqlite3.connect(os.path.join(path, "points.sqlite3"), check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('dtype', ?)", (dtype,))
+        self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', '0')")
+        self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('rows', '0')")
+        self._snapshot = None
+        self._data_version = None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ─── Reading ──────────────────────────────────────────────────────────
+
+    def _meta(self) -> Dict[str, str]:
+        # Caller holds the lock
+        return dict(self._conn.execute("SELECT key, value FROM meta"))
+
+    def _vector_file(self, generation: int, dtype: str) -> str:
+        return os.path.join(self.path, f"vectors-{generation}.{dtype}")
+
+    def snapshot(self) -> Snapshot:
+        """The current committed state, re-read when any connection committed since the last call"""
+        with self._lock:
+            # Changes whenever another connection (e.g. the ingestion process) commits
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._snapshot is not None and data_version == self._data_version:
+                return self._snapshot
+            self._conn.execute("BEGIN")
+            try:
+                meta = self._meta()
+                deleted = np.fromiter((row for row, in self._conn.execute("SELECT row FROM deleted")), dtype=np.int64)
+            finally:
+                self._conn.execute("COMMIT")
+            generation, dtype, rows = int(meta["generation"]), meta["dtype"], int(meta["rows"])
+            vectors = None
+            if rows:
+                # Rows an unfinished write appended past the committed count are not mapped
+                vectors = np.memmap(self._vector_file(generation, dtype), dtype=DTYPES[dtype], mode="r",
+                                    shape=(rows, int(meta["dimension"])))
+            self._snapshot = Snapshot(generation, dtype, vectors, deleted)
+            self._data_version = data_version
+            return self._snapshot
+
+    def _source_file_rows(self, source_files: Iterable[str]) -> np.ndarray:
+        source_files = list(source_files)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT row FROM points WHERE source_file IN ({', '.join('?' * len(source_files))}) ORDER BY row",
+                source_files)
+            return np.fromiter((row for row, in rows), dtype=np.int64)
+
+    def search_batch(self, query_vectors, k: int, score_threshold: Optional[float] = None,
+                     source_files: Iterable[str] = ()) -> List[List[Tuple[LocalPoint, float]]]:
+        """
+        Exact top-k per query vector, best first: (point, cosine score) pairs
+        with score >= score_threshold, only from source_files if given.
+        """
+        queries = normalize(np.atleast_2d(np.asarray(query_vectors, dtype=np.float32)))
+        for _ in range(2):
+            snapshot = self.snapshot()
+            if snapshot.vectors is None:
+                return [[] for _ in queries]
+            scores, rows = self._score(snapshot, queries, k, self._source_file_rows(source_files)
+                                       if source_files else None)
+            results = self._points(snapshot, scores, rows, score_threshold)
+            if results is not None:
+                return results
+            # compact() renumbered the rows between scoring and reading the payloads
+        raise RuntimeError("The local index is being compacted, retry")
+
+    def search(self, query_vector, config) -> List[Tuple[LocalPoint, float]]:
+        """search_batch() for one query with a RetrievalConfig's top_k, score_threshold and source_files"""
+        return self.search_batch([query_vector], config.top_k, config.score_threshold, config.source_files)[0]
+
+    def _score(self, snapshot: Snapshot, queries: np.ndarray, k: int, candidates: Optional[np.ndarray]):
+        vectors = snapshot.vectors
+        if queries.shape[1] != vectors.shape[1]:
+            raise ValueError(f"Query has {queries.shape[1]} dimensions, the index {vectors.shape[1]}")
+        if snapshot.dtype == "int8":
+            queries = queries / INT8_SCALE
+        if candidates is not None:
+            # Rows committed after the snapshot are not mapped
+            candidates = candidates[candidates < len(vectors)]
+        total = len(vectors) if candidates is None else len(candidates)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, total, self.block_rows):
+            if candidates is None:
+                rows = np.arange(start, min(start + self.block_rows, total))
+                block = vectors[start:start + self.block_rows]
+            else:
+                rows = candidates[start:start + self.block_rows]
+                block = vectors[rows]
+            scores = queries @ block.T.astype(np.float32, copy=False)
+            if len(snapshot.deleted):
+                scores[:, np.isin(rows, snapshot.deleted)] = -np.inf
+            best_scores, best_rows = top_k(np.hstack([best_scores, scores]),
+                                           np.hstack([best_rows, np.broadcast_to(rows, scores.shape)]), k)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_rows, order, axis=1)
+
+    def _points(self, snapshot: Snapshot, scores: np.ndarray, rows: np.ndarray, score_threshold: Optional[float]):
+        """Results with their payloads, or None if the index is no longer at the snapshot's generation"""
+        wanted = {int(row) for row in rows[np.isfinite(scores)]}
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if int(self._meta()["generation"]) != snapshot.generation:
+                    return None
+                points = {}
+                wanted = list(wanted)
+                for start in range(0, len(wanted), 500):
+                    batch = wanted[start:start + 500]
+                    for row, point_id, payload in self._conn.execute(
+                            f"SELECT row, id, payload FROM points WHERE row IN ({', '.join('?' * len(batch))})",
+                            batch):
+                        points[row] = LocalPoint(point_id, json.loads(payload))
+            finally:
+                self._conn.execute("COMMIT")
+        return [
+            # Rows replaced or deleted after the snapshot have no payload any more
+            [(points[int(row)], float(score)) for score, row in zip(query_scores, query_rows)
+             if np.isfinite(score) and int(row) in points
+             and (score_threshold is None or score >= score_threshold)]
+            for query_scores, query_rows in zip(scores, rows)
+        ]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM points").fetchone()[0]
+
+    def version(self) -> str:
+        """Changes with every ingestion run that changed the index (see collection_version)"""
+        with self._lock:
+            ingested_at = self._meta().get("ingested_at")
+        return f"{ingested_at}:{self.count()}"
+
+    # ─── Writing ──────────────────────────────────────────────────────────
+
+    @contextmanager
+    def _write(self):
+        """Lock, IMMEDIATE transaction (one writer across processes) and the current metadata"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._meta()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._snapshot = None
+
+    def _delete_rows(self, rows: List[int]):
+        # Caller is in a write transaction
+        self._conn.executemany("DELETE FROM points WHERE row = ?", ((row,) for row in rows))
+        self._conn.executemany("INSERT OR IGNORE INTO deleted (row) VALUES (?)", ((row,) for row in rows))
+
+    def upsert(self, points: Iterable[Tuple[str, List[float], Dict[str, Any]]]) -> int:
+        """Add (id, vector, payload) points, replacing points with the same id; returns how many"""
+        points = list({point_id: (point_id, vector, payload) for point_id, vector, payload in points}.values())
+        if not points:
+            return 0
+        vectors = normalize(np.asarray([vector for _, vector, _ in points], dtype=np.float32))
+        with self._write() as meta:
+            dimension = int(meta.get("dimension") or vectors.shape[1])
+            if vectors.shape[1] != dimension:
+                raise ValueError(f"Vectors have {vectors.shape[1]} dimensions, the index {dimension}")
+            if "dimension" not in meta:
+                self._conn.execute("INSERT INTO meta (key, value) VALUES ('dimension', ?)", (str(dimension),))
+            dtype, rows = meta["dtype"], int(meta["rows"])
+            if dtype == "int8":
+                vectors = np.round(vectors * INT8_SCALE)
+            data = vectors.astype(DTYPES[dtype])
+
+            ids = [point_id for point_id, _, _ in points]
+            replaced = [row for start in range(0, len(ids), 500) for row, in self._conn.execute(
+                f"SELECT row FROM points WHERE id IN ({', '.join('?' * len(ids[start:start + 500]))})",
+                ids[start:start + 500])]
+            self._delete_rows(replaced)
+
+            with open(self._vector_file(int(meta["generation"]), dtype), "ab+") as f:
+                # Drop rows a failed write appended without committing
+                f.truncate(rows * data.itemsize * dimension)
+                f.write(data.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self._conn.executemany(
+                "INSERT INTO points (row, id, source_file, payload) VALUES (?, ?, ?, ?)",
+                ((rows + i, point_id, payload.get("source_file"), json.dumps(payload, ensure_ascii=False))
+                 for i, (point_id, _, payload) in enumerate(points)))
+            self._conn.execute("UPDATE meta SET value = ? WHERE key = 'rows'", (str(rows + len(points)),))
+        return len(points)
+
+    def delete_source_file(self, source_file: str) -> int:
+        """Delete every point of the source file; returns how many"""
+        with self._write():
+            rows = [row for row, in self._conn.execute("SELECT row FROM points WHERE source_file = ?",
+                                                       (source_file,))]
+            self._delete_rows(rows)
+        return len(rows)
+
+    def mark_ingested(self):
+        """Stamp the index like ingestion stamps the Qdrant collection, so caches see the change"""
+        with self._write():
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('ingested_at', ?)",
+                               (datetime.now(timezone.utc).isoformat(),))
+
+    def compact(self, min_deleted_ratio: float = LOCAL_INDEX_COMPACT_RATIO) -> bool:
+        """
+        Rewrite the live rows to a new vector file if more than
+        min_deleted_ratio of the rows are deleted. Searches running on the
+        old file keep it until they finish (it is unlinked, not truncated).
+        """
+        with self._write() as meta:
+            rows = int(meta["rows"])
+            deleted = self._conn.execute("SELECT COUNT(*) FROM deleted").fetchone()[0]
+            if not rows or deleted <= rows * min_deleted_ratio:
+                return False
+            generation, dtype, dimension = int(meta["generation"]), meta["dtype"], int(meta["dimension"])
+            live = np.fromiter((row for row, in self._conn.execute("SELECT row FROM points ORDER BY row")),
+                               dtype=np.int64)
+            old = np.memmap(self._vector_file(generation, dtype), dtype=DTYPES[dtype], mode="r",
+                            shape=(rows, dimension))
+            with open(self._vector_file(generation + 1, dtype), "wb") as f:
+                for start in range(0, len(live), self.block_rows):
+                    f.write(np.ascontiguousarray(old[live[start:start + self.block_rows]]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            del old
+            # Ascending order: every new row number is free by the time it is assigned
+            self._conn.executemany("UPDATE points SET row = ? WHERE row = ?",
+                                   ((new, int(row)) for new, row in enumerate(live)))
+            self._conn.execute("DELETE FROM deleted")
+            self._conn.execute("UPDATE meta SET value = ? WHERE key = 'rows'", (str(len(live)),))
+            self._conn.execute("UPDATE meta SET value = ? WHERE key = 'generation'", (str(generation + 1),))
+        try:
+            os.remove(self._vector_file(generation, dtype))
+        except OSError as e:
+            logger.warning("Could not remove the old vector file: %s", e)
+        logger.info("Compacted local index %s: %d rows, %d deleted rows dropped", self.path, len(live), deleted)
+        return True
+
+
+def index_path(collection: Optional[str] = None) -> str:
+    return os.path.join(LOCAL_INDEX_DIR, collection or os.getenv("COLLECTION_NAME") or "default")
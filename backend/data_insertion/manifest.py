@@ -0,0 +1,145 @@
+"""
+SQLite manifest of what has already been ingested into Qdrant.
+
+For every (collection, source_file) the manifest stores the content hash the
+points were built from, how many chunks the file produced and which chunk
+indices have been upserted. Ingestion uses it to skip unchanged files,
+replace changed ones, purge removed ones and resume interrupted runs.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Iterable, NamedTuple, Optional, Set
+
+INGEST_MANIFEST_PATH = os.getenv(
+    "INGEST_MANIFEST_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_manifest.sqlite3"),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    collection TEXT NOT NULL,
+    source_file TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    expected_chunks INTEGER,
+    complete INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (collection, source_file)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    collection TEXT NOT NULL,
+    source_file TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    PRIMARY KEY (collection, source_file, chunk_index)
+);
+"""
+
+
+def file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    """Content hash of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FileEntry(NamedTuple):
+    file_hash: str
+    expected_chunks: Optional[int]
+    complete: bool
+
+
+class IngestManifest:
+    """
+    Manifest for one collection. Safe to share between the chunking thread
+    and the upsert writer thread.
+    """
+
+    def __init__(self, collection: str, path: str = INGEST_MANIFEST_PATH):
+        self.collection = collection
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get_file(self, source_file: str) -> Optional[FileEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_hash, expected_chunks, complete FROM files WHERE collection = ? AND source_file = ?",
+                (self.collection, source_file),
+            ).fetchone()
+        if row is None:
+            return None
+        return FileEntry(row[0], row[1], bool(row[2]))
+
+    def source_files(self) -> Set[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT source_file FROM files WHERE collection = ?", (self.collection,))
+            return {row[0] for row in rows}
+
+    def upserted_chunks(self, source_file: str) -> Set[int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_index FROM chunks WHERE collection = ? AND source_file = ?",
+                (self.collection, source_file),
+            )
+            return {row[0] for row in rows}
+
+    def start_file(self, source_file: str, file_hash: str):
+        """Register a new or changed file, forgetting any chunks of an older version"""
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM chunks WHERE collection = ? AND source_file = ?", (self.collection, source_file)
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (collection, source_file, file_hash, expected_chunks, complete, updated_at) "
+                "VALUES (?, ?, ?, NULL, 0, ?)",
+                (self.collection, source_file, file_hash, now),
+            )
+
+    def set_expected_chunks(self, source_file: str, expected_chunks: int):
+        """Record how many chunks the file produced; completes it if all are already upserted"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE files SET expected_chunks = ? WHERE collection = ? AND source_file = ?",
+                (expected_chunks, self.collection, source_file),
+            )
+            self._complete_if_done(source_file)
+
+    def record_upserted(self, payloads: Iterable[dict]):
+        """Mark chunks as upserted and complete every file that has all of its chunks stored"""
+        rows = [(self.collection, payload["source_file"], payload["chunk_index"]) for payload in payloads]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunks (collection, source_file, chunk_index) VALUES (?, ?, ?)", rows
+            )
+            for source_file in {row[1] for row in rows}:
+                self._complete_if_done(source_file)
+
+    def remove_file(self, source_file: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM chunks WHERE collection = ? AND source_file = ?", (self.collection, source_file)
+            )
+            self._conn.execute(
+                "DELETE FROM files WHERE collection = ? AND source_file = ?", (self.collection, source_file)
+            )
+
+    def _complete_if_done(self, source_file: str):
+        # Caller holds the lock and the transaction
+        now = datetime.now(timezone.utc).isoformat()
+        self._conn.execute(
+            "UPDATE files SET complete = 1, updated_at = ? "
+            "WHERE collection = ? AND source_file = ? AND complete = 0 AND expected_chunks IS NOT NULL "
+            "AND expected_chunks <= (SELECT COUNT(*) FROM chunks WHERE collection = ? AND source_file = ?)",
+            (now, self.collection, source_file, self.collection, source_file),
+        )
@@ -0,0 +1,146 @@
+"""
+Retrieval settings and result type.
+
+RetrievalConfig() holds the defaults from the RETRIEVAL_* / HYBRID_* env
+vars; with_overrides() applies validated per-request overrides (the
+"retrieval" object of the /query body). Search results are plain dicts
+(RetrievedDocument), so they can be checkpointed, cached and sent as JSON
+as they are, and carry what callers need to dedupe and cite.
+"""
+
+import os
+from typing import List, NamedTuple, NotRequired, Optional, Tuple, TypedDict
+
+
+def _optional(name, convert):
+    value = os.getenv(name)
+    return convert(value) if value not in (None, "") else None
+
+
+# "dense" searches the embedding only; "hybrid" also searches the BM25 sparse
+# vectors (see sparse.py) and fuses both rankings with reciprocal rank fusion
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense").lower()
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+RETRIEVAL_MAX_TOP_K = 50
+# Minimum dense similarity; in hybrid mode it applies to the dense candidates
+RETRIEVAL_SCORE_THRESHOLD = _optional("RETRIEVAL_SCORE_THRESHOLD", float)
+# HNSW beam size at query time (server default when unset) and brute-force search
+RETRIEVAL_HNSW_EF = _optional("RETRIEVAL_HNSW_EF", int)
+RETRIEVAL_EXACT = os.getenv("RETRIEVAL_EXACT", "false").lower() == "true"
+# Only used by collections with quantization: re-score with the original vectors,
+# fetching oversampling x top_k quantized candidates
+RETRIEVAL_QUANTIZATION_RESCORE = _optional("RETRIEVAL_QUANTIZATION_RESCORE", lambda v: v.lower() == "true")
+RETRIEVAL_QUANTIZATION_OVERSAMPLING = _optional("RETRIEVAL_QUANTIZATION_OVERSAMPLING", float)
+# RRF constant: larger values flatten the difference between top and lower ranks
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Candidates fetched from each of the dense and sparse searches before fusion
+HYBRID_PREFETCH = int(os.getenv("HYBRID_PREFETCH", "20"))
+HYBRID_MAX_PREFETCH = 200
+
+# Payload fields fetched with each point; the rest of the payload stays in Qdrant
+PAYLOAD_FIELDS = ["text", "source_file", "chunk_index"]
+
+
+class RetrievedDocument(TypedDict):
+    id: str
+    score: float
+    text: str
+    source_file: Optional[str]
+    chunk_index: Optional[int]
+    # Set by the rerank node (langgraph_comp/rerank.py)
+    rerank_score: NotRequired[float]
+
+
+class RetrievalConfig(NamedTuple):
+    top_k: int = RETRIEVAL_TOP_K
+    score_threshold: Optional[float] = RETRIEVAL_SCORE_THRESHOLD
+    mode: str = RETRIEVAL_MODE
+    hnsw_ef: Optional[int] = RETRIEVAL_HNSW_EF
+    exact: bool = RETRIEVAL_EXACT
+    rescore: Optional[bool] = RETRIEVAL_QUANTIZATION_RESCORE
+    oversampling: Optional[float] = RETRIEVAL_QUANTIZATION_OVERSAMPLING
+    # Only search chunks of these files (payload source_file); empty = all files
+    source_files: Tuple[str, ...] = ()
+    rrf_k: int = HYBRID_RRF_K
+    prefetch: int = HYBRID_PREFETCH
+
+    def with_overrides(self, overrides: Optional[dict]) -> "RetrievalConfig":
+        """Copy with the given fields replaced; raises ValueError on unknown fields or bad values"""
+        if not overrides:
+            return self
+        if not isinstance(overrides, dict):
+            raise ValueError("'retrieval' must be an object")
+        unknown = set(overrides) - set(self._fields)
+        if unknown:
+            raise ValueError(f"Unknown retrieval settings: {', '.join(sorted(unknown))}")
+        return self._replace(**{name: _validate(name, value) for name, value in overrides.items()})
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _validate(name, value):
+    if name == "top_k":
+        if not _is_int(value) or not 1 <= value <= RETRIEVAL_MAX_TOP_K:
+            raise ValueError(f"top_k must be an integer between 1 and {RETRIEVAL_MAX_TOP_K}")
+    elif name == "mode":
+        if value not in ("dense", "hybrid"):
+            raise ValueError("mode must be 'dense' or 'hybrid'")
+    elif name in ("exact", "rescore"):
+        if not isinstance(value, bool) and not (name == "rescore" and value is None):
+            raise ValueError(f"{name} must be true or false")
+    elif name == "source_files":
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            raise ValueError("source_files must be a list of file names")
+        return tuple(value)
+    elif value is None and name in ("score_threshold", "hnsw_ef", "oversampling"):
+        return None
+    elif name in ("score_threshold", "oversampling"):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{name} must be a number")
+        if name == "oversampling" and value < 1:
+            raise ValueError("oversampling must be at least 1")
+        return float(value)
+    elif name in ("hnsw_ef", "rrf_k", "prefetch"):
+        upper = HYBRID_MAX_PREFETCH if name == "prefetch" else 4096
+        if not _is_int(value) or not 1 <= value <= upper:
+            raise ValueError(f"{name} must be an integer between 1 and {upper}")
+    return value
+
+
+def search_params(config: RetrievalConfig):
+    """Qdrant SearchParams for the config, or None to use the collection defaults"""
+    from qdrant_client import models
+
+    quantization = None
+    if config.rescore is not None or config.oversampling is not None:
+        quantization = models.QuantizationSearchParams(rescore=config.rescore, oversampling=config.oversampling)
+    if config.hnsw_ef is None and not config.exact and quantization is None:
+        return None
+    return models.SearchParams(hnsw_ef=config.hnsw_ef, exact=config.exact, quantization=quantization)
+
+
+def query_filter(config: RetrievalConfig):
+    """Qdrant Filter restricting the search to config.source_files, or None"""
+    if not config.source_files:
+        return None
+    from qdrant_client import models
+    return models.Filter(must=[
+        models.FieldCondition(key="source_file", match=models.MatchAny(any=list(config.source_files)))
+    ])
+
+
+def to_document(point, score: float) -> RetrievedDocument:
+    payload = point.payload or {}
+    return {
+        "id": str(point.id),
+        "score": score,
+        "text": payload.get("text", ""),
+        "source_file": payload.get("source_file"),
+        "chunk_index": payload.get("chunk_index"),
+    }
+
+
+def document_texts(documents: List[RetrievedDocument]) -> List[str]:
+    return [document["text"] for document in documents]
@@ -0,0 +1,69 @@
+"""
+BM25 sparse vectors for hybrid retrieval.
+
+Chunks are stored in Qdrant with a sparse vector next to the dense one. Each
+token maps to a fixed index (crc32 of the token), so no vocabulary has to be
+kept in sync between ingestion and queries. Documents carry the BM25 term
+frequency part; the collection's IDF modifier makes Qdrant apply the inverse
+document frequency at query time, so query vectors are just the query terms.
+
+Identifiers are kept whole ("conversationbuffermemory", "initialize_agent")
+and also split into their parts, so both exact and partial matches score.
+"""
+
+import os
+import re
+import zlib
+from collections import Counter
+from typing import List, Tuple
+
+SPARSE_VECTOR_NAME = os.getenv("SPARSE_VECTOR_NAME", "bm25")
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Typical tokens per chunk (1000-character chunks, see extraction.py)
+BM25_AVG_DOC_TOKENS = float(os.getenv("BM25_AVG_DOC_TOKENS", "160"))
+
+WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+# Splits snake_case and CamelCase identifiers: "initialize_agent" -> initialize, agent
+IDENTIFIER_PART_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i",
+    "in", "is", "it", "its", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when",
+    "which", "with", "you", "your",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for word in WORD_PATTERN.findall(text):
+        lower = word.lower()
+        if lower not in STOPWORDS and len(lower) > 1:
+            tokens.append(lower)
+        parts = IDENTIFIER_PART_PATTERN.findall(word)
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts if len(part) > 1 and part.lower() not in STOPWORDS)
+    return tokens
+
+
+def token_index(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def document_sparse_vector(text: str) -> Tuple[List[int], List[float]]:
+    """(indices, values) of a chunk: BM25 term-frequency weights"""
+    tokens = tokenize(text)
+    if not tokens:
+        return [], []
+    length_norm = 1 - BM25_B + BM25_B * len(tokens) / BM25_AVG_DOC_TOKENS
+    weights = {}
+    for token, tf in Counter(tokens).items():
+        index = token_index(token)
+        weights[index] = weights.get(index, 0.0) + tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+    return list(weights), list(weights.values())
+
+
+def query_sparse_vector(text: str) -> Tuple[List[int], List[float]]:
+    """(indices, values) of a query: each distinct term once"""
+    indices = sorted({token_index(token) for token in tokenize(text)})
+    return indices, [1.0] * len(indices)
@@ -1,16 +1,20 @@
 import os
-from pymongo import MongoClient
-from langgraph.checkpoint.mongodb import MongoDBSaver
 
-def langgraph_collection():
+def langgraph_collection(client=None):
     """
-    Returns a MongoDBSaver instance connected to the configured MongoDB.
+    Returns a MongoDBSaver instance connected to the configured MongoDB,
+    using the given MongoClient if any.
+    Use clients.checkpointer() for the shared instance.
     """
-    mongo_uri = os.getenv("MONGO_URI")
-    if not mongo_uri:
-        raise ValueError("MONGO_URI environment variable not set")
-    
-    client = MongoClient(mongo_uri)
+    # Imported here so that importing this module stays cheap
+    from pymongo import MongoClient
+    from langgraph.checkpoint.mongodb import MongoDBSaver
+
+    if client is None:
+        mongo_uri = os.getenv("MONGO_URI")
+        if not mongo_uri:
+            raise ValueError("MONGO_URI environment variable not set")
+        client = MongoClient(mongo_uri)
     # Use a specific database for langgraph checkpoints, e.g., 'langgraph_checkpoints'
     # or the same database as the app if preferred. Here we use 'langgraph'.
     checkpointer = MongoDBSaver(client)
@@ -8,12 +8,33 @@ Evaluates the Langchain-chatbot RAG pipeline using 4 LLM-as-judge metrics:
 3. Groundedness  - Response vs retrieved documents (no reference needed)
 4. Retrieval Relevance - Retrieved docs vs input question (no reference needed)
 
+With --offline the run needs no LangSmith: examples are read from a local
+JSONL dataset (evaluators/datasets/rag_eval.jsonl, seeded from EXAMPLES),
+targets and judges run on --max-concurrency threads, and per-example scores
+with retrieval and generation latency are written to a JSONL results file.
+In both modes judge verdicts are cached by (prompt, model) in SQLite
+(judge_cache.py), so unchanged answers are not graded again.
+
+--judge-mode per-metric (the default, EVAL_JUDGE_MODE) makes one judge
+call per metric; combined grades all four metrics in one structured call
+per example. --offline --compare grades the same answers both ways and reports
+their agreement and the judge calls, tokens and time each mode used.
+
 Run from the /backend directory:
     python -m evaluators.evaluate_rag
+    python -m evaluators.evaluate_rag --offline --max-concurrency 8
+    python -m evaluators.evaluate_rag --offline --compare
 """
 
+import argparse
+import inspect
+import json
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 
 # ─── Path setup so the script finds sibling modules ───────────────────────────
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -22,13 +43,16 @@ from dotenv import load_dotenv
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
 
 # ─── Imports ──────────────────────────────────────────────────────────────────
-from typing import List
+from typing import List, Optional
 from typing_extensions import Annotated, TypedDict
 
-from langchain_openai import ChatOpenAI
-from langsmith import Client, traceable
+from langsmith import Client, traceable, tracing_context
 
+import clients
 from data_insertion.db_operations import query_documents
+from data_insertion.retrieval import document_texts
+from evaluators.judge_cache import JudgeCache
+from langgraph_comp.context import build_context
 from logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -38,10 +62,15 @@ OPENAI_API_KEY   = os.getenv("OPENAI_API_KEY", "lm-studio")
 OPENAI_API_BASE  = os.getenv("OPENAI_API_BASE", "http://192.168.0.103:1234/v1")
 GENERATION_MODEL = os.getenv("GENERATION_MODEL", "qwen/qwen3-1.7b")
 LANGSMITH_API_KEY = os.getenv("LANGSMITH_API_KEY")
+EVAL_MAX_CONCURRENCY = int(os.getenv("EVAL_MAX_CONCURRENCY", "4"))
+
+EVALUATORS_DIR = os.path.dirname(os.path.abspath(__file__))
+LOCAL_DATASET_PATH = os.path.join(EVALUATORS_DIR, "datasets", "rag_eval.jsonl")
+RESULTS_DIR = os.path.join(EVALUATORS_DIR, "results")
 
 # ─── LLMs ─────────────────────────────────────────────────────────────────────
 # RAG bot LLM  (temperature=1 -> creative answers)
-rag_llm = ChatOpenAI(
+rag_llm = clients.chat_model(
     model=GENERATION_MODEL,
     base_url=OPENAI_API_BASE,
     api_key=OPENAI_API_KEY,
@@ -49,7 +78,7 @@ rag_llm = ChatOpenAI(
 )
 
 # Evaluator LLM (temperature=0 -> deterministic judgements)
-eval_llm = ChatOpenAI(
+eval_llm = clients.chat_model(
     model=GENERATION_MODEL,
     base_url=OPENAI_API_BASE,
     api_key=OPENAI_API_KEY,
@@ -68,25 +97,33 @@ with open(PROMPT_PATH, "r", encoding="utf-8") as f:
 def rag_bot(question: str) -> dict:
     """
     Retrieves relevant documents from Qdrant then generates a concise answer.
-    Returns a dict with 'answer' (str) and 'documents' (List[str]).
+    Returns a dict with 'answer' (str), 'documents' (List[str]) and the
+    retrieval and generation time in seconds.
     """
     logger.info("RAG bot invoked for question: %s", question)
 
-    # Retrieve from Qdrant (returns list of text strings)
-    docs: List[str] = query_documents(query=question) or []
+    # Retrieve from Qdrant (documents with scores and sources; only the text is graded)
+    started = time.perf_counter()
+    retrieved = query_documents(query=question)
+    retrieval_seconds = time.perf_counter() - started
+    docs: List[str] = document_texts(retrieved)
 
-    docs_string = "\n\n".join(docs) if docs else "No relevant documents found."
+    # Same token-budgeted context the graph builds
+    docs_string = build_context(retrieved)[0] if docs else "No relevant documents found."
 
     prompt = RAG_PROMPT_TEMPLATE.format(context=docs_string, question=question)
 
+    started = time.perf_counter()
     ai_msg = rag_llm.invoke(prompt)
+    generation_seconds = time.perf_counter() - started
 
     # Clean the <think> tags just like in graph.py for qwen
     clean_text = re.sub(r"<think>.*?</think>", "", ai_msg.content, flags=re.DOTALL).strip()
     
     logger.info("Generated answer: %s", clean_text[:120])
 
-    return {"answer": clean_text, "documents": docs}
+    return {"answer": clean_text, "documents": docs,
+            "retrieval_seconds": retrieval_seconds, "generation_seconds": generation_seconds}
 
 
 # ─── Dataset ───────────────────────────────────────────────────────────────────
@@ -160,11 +197,24 @@ class RetrievalRelevanceGrade(TypedDict):
     relevant: Annotated[bool, ..., "True if retrieved docs are relevant to the question"]
 
 
+class CombinedGrade(TypedDict):
+    correctness_explanation: Annotated[str, ..., "Step-by-step reasoning before the correctness verdict"]
+    correct: Annotated[bool, ..., "True if the answer is factually correct vs ground truth"]
+    relevance_explanation: Annotated[str, ..., "Step-by-step reasoning before the relevance verdict"]
+    relevant: Annotated[bool, ..., "True if the answer addresses the question"]
+    groundedness_explanation: Annotated[str, ..., "Step-by-step reasoning before the groundedness verdict"]
+    grounded: Annotated[bool, ..., "True if the answer is grounded in the retrieved documents"]
+    retrieval_relevance_explanation: Annotated[str, ..., "Step-by-step reasoning before the retrieval verdict"]
+    retrieval_relevant: Annotated[bool, ..., "True if retrieved docs are relevant to the question"]
+
+
 # ─── Evaluator LLMs with structured output ────────────────────────────────────
-correctness_llm        = eval_llm.with_structured_output(CorrectnessGrade,        method="json_schema", strict=True)
-relevance_llm          = eval_llm.with_structured_output(RelevanceGrade,          method="json_schema", strict=True)
-grounded_llm           = eval_llm.with_structured_output(GroundedGrade,           method="json_schema", strict=True)
-retrieval_relevance_llm = eval_llm.with_structured_output(RetrievalRelevanceGrade, method="json_schema", strict=True)
+# include_raw keeps the AIMessage, whose usage_metadata holds the token counts
+correctness_llm        = eval_llm.with_structured_output(CorrectnessGrade,        method="json_schema", strict=True, include_raw=True)
+relevance_llm          = eval_llm.with_structured_output(RelevanceGrade,          method="json_schema", strict=True, include_raw=True)
+grounded_llm           = eval_llm.with_structured_output(GroundedGrade,           method="json_schema", strict=True, include_raw=True)
+retrieval_relevance_llm = eval_llm.with_structured_output(RetrievalRelevanceGrade, method="json_schema", strict=True, include_raw=True)
+combined_llm           = eval_llm.with_structured_output(CombinedGrade,           method="json_schema", strict=True, include_raw=True)
 
 
 # ─── Evaluator prompts ─────────────────────────────────────────────────────────
@@ -219,9 +269,78 @@ A relevance value of False means the FACTS are completely unrelated to the QUEST
 
 Reason step-by-step before giving your verdict."""
 
+COMBINED_INSTRUCTIONS = """You are a teacher grading a quiz.
+You will be given a QUESTION, the GROUND TRUTH (correct) ANSWER, FACTS (retrieved documents)
+and the STUDENT ANSWER. Grade four things independently, reasoning step-by-step about each
+one in its explanation field before giving its verdict.
+
+1. correct: the STUDENT ANSWER is factually accurate relative to the GROUND TRUTH ANSWER and
+   contains no conflicting statements. Extra correct information is OK.
+2. relevant: the STUDENT ANSWER is concise, directly addresses the QUESTION and helps answer it.
+3. grounded: the STUDENT ANSWER is grounded in the FACTS and contains NO hallucinated
+   information outside the FACTS.
+4. retrieval_relevant: the FACTS contain keywords or semantic meaning related to the QUESTION.
+   Some unrelated information is OK as long as the FACTS are largely relevant; False only if
+   the FACTS are completely unrelated to the QUESTION.
+
+A verdict is True only if ALL of its criteria are met."""
+
+# Metric names (the per-metric evaluator functions) -> CombinedGrade verdict field
+COMBINED_FIELDS = {
+    "correctness": "correct",
+    "relevance": "relevant",
+    "groundedness": "grounded",
+    "retrieval_relevance": "retrieval_relevant",
+}
+
 
 # ─── Evaluator functions ───────────────────────────────────────────────────────
 
+# Replaced by main(); None disables the verdict cache
+judge_cache = None
+
+
+# Per judge name: LLM calls, cached verdicts, tokens and seconds spent waiting for the LLM
+judge_usage = {}
+_usage_lock = threading.Lock()
+
+
+def record_usage(name: str, seconds: float = 0.0, usage: Optional[dict] = None, cached: bool = False):
+    with _usage_lock:
+        totals = judge_usage.setdefault(
+            name, {"calls": 0, "cached": 0, "input_tokens": 0, "output_tokens": 0, "seconds": 0.0}
+        )
+        if cached:
+            totals["cached"] += 1
+            return
+        totals["calls"] += 1
+        totals["seconds"] += seconds
+        totals["input_tokens"] += (usage or {}).get("input_tokens", 0)
+        totals["output_tokens"] += (usage or {}).get("output_tokens", 0)
+
+
+def judge(name: str, llm, instructions: str, prompt: str) -> dict:
+    """Grade with an evaluator LLM, reusing the cached verdict for an identical prompt"""
+    messages = [
+        {"role": "system", "content": instructions},
+        {"role": "user",   "content": prompt},
+    ]
+    if judge_cache is not None:
+        verdict = judge_cache.get(messages, GENERATION_MODEL)
+        if verdict is not None:
+            record_usage(name, cached=True)
+            return verdict
+    started = time.perf_counter()
+    response = llm.invoke(messages)
+    record_usage(name, time.perf_counter() - started, getattr(response["raw"], "usage_metadata", None))
+    if response["parsed"] is None:
+        raise ValueError(f"{name} judge returned no verdict: {response['parsing_error']}")
+    verdict = response["parsed"]
+    if judge_cache is not None:
+        judge_cache.put(messages, GENERATION_MODEL, verdict)
+    return verdict
+
+
 def correctness(inputs: dict, outputs: dict, reference_outputs: dict) -> bool:
     """Evaluates factual correctness of the answer against a reference answer."""
     prompt = (
@@ -229,10 +348,7 @@ def correctness(inputs: dict, outputs: dict, reference_outputs: dict) -> bool:
         f"GROUND TRUTH ANSWER: {reference_outputs['answer']}\n"
         f"STUDENT ANSWER: {outputs['answer']}"
     )
-    grade = correctness_llm.invoke([
-        {"role": "system", "content": CORRECTNESS_INSTRUCTIONS},
-        {"role": "user",   "content": prompt},
-    ])
+    grade = judge("correctness", correctness_llm, CORRECTNESS_INSTRUCTIONS, prompt)
     logger.info("[correctness] %s -> %s | %s", inputs["question"][:60], grade["correct"], grade["explanation"][:80])
     return grade["correct"]
 
@@ -243,10 +359,7 @@ def relevance(inputs: dict, outputs: dict) -> bool:
         f"QUESTION: {inputs['question']}\n"
         f"STUDENT ANSWER: {outputs['answer']}"
     )
-    grade = relevance_llm.invoke([
-        {"role": "system", "content": RELEVANCE_INSTRUCTIONS},
-        {"role": "user",   "content": prompt},
-    ])
+    grade = judge("relevance", relevance_llm, RELEVANCE_INSTRUCTIONS, prompt)
     logger.info("[relevance] %s -> %s | %s", inputs["question"][:60], grade["relevant"], grade["explanation"][:80])
     return grade["relevant"]
 
@@ -259,10 +372,7 @@ def groundedness(inputs: dict, outputs: dict) -> bool:
         f"FACTS:\n{doc_string}\n\n"
         f"STUDENT ANSWER: {outputs['answer']}"
     )
-    grade = grounded_llm.invoke([
-        {"role": "system", "content": GROUNDED_INSTRUCTIONS},
-        {"role": "user",   "content": prompt},
-    ])
+    grade = judge("groundedness", grounded_llm, GROUNDED_INSTRUCTIONS, prompt)
     logger.info("[groundedness] %s -> %s | %s", inputs["question"][:60], grade["grounded"], grade["explanation"][:80])
     return grade["grounded"]
 
@@ -275,17 +385,214 @@ def retrieval_relevance(inputs: dict, outputs: dict) -> bool:
         f"QUESTION: {inputs['question']}\n\n"
         f"FACTS:\n{doc_string}"
     )
-    grade = retrieval_relevance_llm.invoke([
-        {"role": "system", "content": RETRIEVAL_RELEVANCE_INSTRUCTIONS},
-        {"role": "user",   "content": prompt},
-    ])
+    grade = judge("retrieval_relevance", retrieval_relevance_llm, RETRIEVAL_RELEVANCE_INSTRUCTIONS, prompt)
     logger.info("[retrieval_relevance] %s -> %s | %s", inputs["question"][:60], grade["relevant"], grade["explanation"][:80])
     return grade["relevant"]
 
 
+def combined(inputs: dict, outputs: dict, reference_outputs: dict) -> dict:
+    """Grades all four metrics in a single structured call; one result per metric name."""
+    docs = outputs.get("documents", [])
+    doc_string = "\n\n".join(docs) if docs else "No documents retrieved."
+    prompt = (
+        f"QUESTION: {inputs['question']}\n"
+        f"GROUND TRUTH ANSWER: {reference_outputs['answer']}\n\n"
+        f"FACTS:\n{doc_string}\n\n"
+        f"STUDENT ANSWER: {outputs['answer']}"
+    )
+    grade = judge("combined", combined_llm, COMBINED_INSTRUCTIONS, prompt)
+    logger.info("[combined] %s -> %s", inputs["question"][:60],
+                {metric: grade[field] for metric, field in COMBINED_FIELDS.items()})
+    return {"results": [
+        {"key": metric, "score": grade[field], "comment": grade[f"{metric}_explanation"]}
+        for metric, field in COMBINED_FIELDS.items()
+    ]}
+
+
+# ─── Offline evaluation ───────────────────────────────────────────────────────
+
+EVALUATORS = [correctness, groundedness, relevance, retrieval_relevance]
+# "per-metric" makes one judge call per metric; "combined" one call per example
+JUDGE_MODES = {"per-metric": EVALUATORS, "combined": [combined]}
+EVAL_JUDGE_MODE = os.getenv("EVAL_JUDGE_MODE", "per-metric")
+
+
+def load_local_dataset(path: str = LOCAL_DATASET_PATH) -> List[dict]:
+    """Examples ({"inputs", "outputs"}) from a JSONL file, created from EXAMPLES if missing"""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for example in EXAMPLES:
+                f.write(json.dumps(example) + "\n")
+        print(f"[INFO] Wrote {len(EXAMPLES)} examples to {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_target(example: dict) -> dict:
+    with tracing_context(enabled=False):
+        return rag_bot(example["inputs"]["question"])
+
+
+def run_judge(evaluator, example: dict, outputs: dict) -> dict:
+    """{metric: verdict} from one evaluator function"""
+    kwargs = {"inputs": example["inputs"], "outputs": outputs}
+    if "reference_outputs" in inspect.signature(evaluator).parameters:
+        kwargs["reference_outputs"] = example["outputs"]
+    with tracing_context(enabled=False):
+        value = evaluator(**kwargs)
+    if isinstance(value, dict) and "results" in value:
+        return {result["key"]: bool(result["score"]) for result in value["results"]}
+    return {evaluator.__name__: bool(value)}
+
+
+def evaluate_offline(examples: List[dict], max_concurrency: int, modes: List[str]) -> List[dict]:
+    """
+    Run every example and its judges on a thread pool. Judges for an example
+    are queued as soon as its answer is ready, so targets and judges overlap.
+    With several judge modes each answer is graded by all of them.
+    """
+    results = [
+        {"question": example["inputs"]["question"], "reference": example["outputs"].get("answer"),
+         "scores": {mode: {} for mode in modes}, "errors": {}}
+        for example in examples
+    ]
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        targets = {pool.submit(run_target, example): index for index, example in enumerate(examples)}
+        judges = {}
+        for future in as_completed(targets):
+            index = targets[future]
+            try:
+                outputs = future.result()
+            except Exception as e:
+                logger.exception("RAG bot failed for %s", results[index]["question"])
+                results[index]["errors"]["target"] = str(e)
+                continue
+            results[index].update(
+                answer=outputs["answer"],
+                documents=len(outputs["documents"]),
+                retrieval_seconds=round(outputs["retrieval_seconds"], 4),
+                generation_seconds=round(outputs["generation_seconds"], 4),
+            )
+            for mode in modes:
+                for evaluator in JUDGE_MODES[mode]:
+                    future = pool.submit(run_judge, evaluator, examples[index], outputs)
+                    judges[future] = (index, mode, evaluator.__name__)
+
+        for future in as_completed(judges):
+            index, mode, name = judges[future]
+            try:
+                results[index]["scores"][mode].update(future.result())
+            except Exception as e:
+                logger.exception("Judge %s failed for %s", name, results[index]["question"])
+                results[index]["errors"][f"{mode}:{name}"] = str(e)
+    return results
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def mode_usage(mode: str) -> dict:
+    """judge_usage totals of the judges a mode runs"""
+    totals = {"calls": 0, "cached": 0, "input_tokens": 0, "output_tokens": 0, "seconds": 0.0}
+    for evaluator in JUDGE_MODES[mode]:
+        for field, value in judge_usage.get(evaluator.__name__, {}).items():
+            totals[field] += value
+    return totals
+
+
+def print_summary(results: List[dict], elapsed: float, modes: List[str]):
+    print(f"\n── Offline evaluation: {len(results)} examples in {elapsed:.1f}s ──────────")
+    for mode in modes:
+        print(f"[{mode} judge]")
+        for metric in COMBINED_FIELDS:
+            scores = [r["scores"][mode][metric] for r in results if metric in r["scores"][mode]]
+            if scores:
+                print(f"  {metric:<22}{sum(scores) / len(scores):>7.2f}  ({len(scores)} graded)")
+    for field in ("retrieval_seconds", "generation_seconds"):
+        values = [r[field] for r in results if field in r]
+        if values:
+            print(f"{field:<24}p50 {percentile(values, 50):.3f}s  p95 {percentile(values, 95):.3f}s")
+    failed = sum(1 for r in results if r["errors"])
+    if failed:
+        print(f"[WARN] {failed} examples had errors (see the results file)")
+    if judge_cache is not None:
+        stats = judge_cache.stats()
+        print(f"[INFO] Judge cache: {stats['hits']} hits, {stats['misses']} misses")
+
+
+def print_comparison(results: List[dict], baseline: str = "per-metric", candidate: str = "combined"):
+    """Agreement of the two judge modes per metric, and what each cost"""
+    print(f"\n── {candidate} vs {baseline} judge ───────────────────────────")
+    print(f"{'metric':<22}{'agreement':>10}{'compared':>10}  disagreements")
+    for metric in COMBINED_FIELDS:
+        pairs = [(r["question"], r["scores"][baseline][metric], r["scores"][candidate][metric])
+                 for r in results if metric in r["scores"][baseline] and metric in r["scores"][candidate]]
+        if not pairs:
+            continue
+        disagreements = [question[:40] for question, a, b in pairs if a != b]
+        agreement = 1 - len(disagreements) / len(pairs)
+        print(f"{metric:<22}{agreement:>10.2f}{len(pairs):>10}  {'; '.join(disagreements) or '-'}")
+
+    print(f"\n{'judge':<12}{'calls':>7}{'input tok':>11}{'output tok':>12}{'LLM s':>9}{'s/example':>11}")
+    usage = {mode: mode_usage(mode) for mode in (baseline, candidate)}
+    for mode, totals in usage.items():
+        print(f"{mode:<12}{totals['calls']:>7}{totals['input_tokens']:>11}{totals['output_tokens']:>12}"
+              f"{totals['seconds']:>9.1f}{totals['seconds'] / max(len(results), 1):>11.2f}")
+    base, cand = usage[baseline], usage[candidate]
+    for field, label in (("calls", "calls"), ("input_tokens", "input tokens"),
+                         ("output_tokens", "output tokens"), ("seconds", "judge LLM time")):
+        if base[field]:
+            print(f"[INFO] {candidate} saves {1 - cand[field] / base[field]:.0%} of {label}")
+
+
+def main_offline(args):
+    examples = load_local_dataset(args.dataset)
+    modes = ["per-metric", "combined"] if args.compare else [args.judge_mode]
+    print(f"[INFO] Evaluating {len(examples)} examples offline with the {' and '.join(modes)} judge "
+          f"(max concurrency {args.max_concurrency}) ...")
+    started = time.perf_counter()
+    results = evaluate_offline(examples, args.max_concurrency, modes)
+    elapsed = time.perf_counter() - started
+
+    output = args.output or os.path.join(RESULTS_DIR, f"rag-eval-{datetime.now():%Y%m%d-%H%M%S}.jsonl")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+    print_summary(results, elapsed, modes)
+    if args.compare:
+        print_comparison(results)
+    print(f"[INFO] Results written to {output}")
+
+
 # ─── Main ─────────────────────────────────────────────────────────────────────
 
 def main():
+    global judge_cache
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--offline", action="store_true", help="Evaluate a local dataset without LangSmith")
+    parser.add_argument("--dataset", default=LOCAL_DATASET_PATH, help="Local JSONL dataset (--offline)")
+    parser.add_argument("--output", default=None, help="Results file (--offline, default evaluators/results/)")
+    parser.add_argument("--max-concurrency", type=int, default=EVAL_MAX_CONCURRENCY,
+                        help="Examples and judges evaluated in parallel")
+    parser.add_argument("--judge-mode", choices=sorted(JUDGE_MODES), default=EVAL_JUDGE_MODE,
+                        help="One judge call per metric, or one combined call per example")
+    parser.add_argument("--compare", action="store_true",
+                        help="Grade with both judge modes and report agreement and cost (--offline, no cache)")
+    parser.add_argument("--no-judge-cache", action="store_true", help="Grade every answer again")
+    args = parser.parse_args()
+
+    # Cached verdicts would hide the calls and tokens being compared
+    if not args.no_judge_cache and not args.compare:
+        judge_cache = JudgeCache()
+    if args.offline:
+        main_offline(args)
+        return
+
     client = Client(api_key=LANGSMITH_API_KEY)
 
     # ── Create dataset (idempotent) ──────────────────────────────────────────
@@ -307,12 +614,14 @@ def main():
     experiment_results = client.evaluate(
         target,
         data=DATASET_NAME,
-        evaluators=[correctness, groundedness, relevance, retrieval_relevance],
+        evaluators=JUDGE_MODES[args.judge_mode],
         experiment_prefix="rag-langchain-chatbot",
+        max_concurrency=args.max_concurrency,
         metadata={
             "version":    "qdrant+qwen3-1.7b",
             "model":      GENERATION_MODEL,
             "embeddings": os.getenv("EMBEDDING_MODEL", "text-embedding-bge-m3"),
+            "judge_mode": args.judge_mode,
         },
     )
 
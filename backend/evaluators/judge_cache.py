@@ -0,0 +1,72 @@
+"""
+Cache for LLM-as-judge verdicts.
+
+A verdict is keyed on the judge model and the exact messages sent to it,
+so re-running an evaluation only grades answers (or documents) that
+changed. Verdicts are kept in SQLite so they survive between runs; the
+cache is shared by the evaluation threads.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+EVAL_JUDGE_CACHE_PATH = os.getenv(
+    "EVAL_JUDGE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "judge_cache.sqlite3"),
+)
+
+
+def verdict_key(messages: list, model: str) -> str:
+    payload = json.dumps(messages, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{model}\0{payload}".encode("utf-8")).hexdigest()
+
+
+class JudgeCache:
+    """Verdicts (JSON-serialisable dicts) by (messages, model); hit and miss counts in stats()"""
+
+    def __init__(self, path: str = EVAL_JUDGE_CACHE_PATH):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, model TEXT, verdict TEXT, created_at REAL)"
+        )
+        self._db.commit()
+
+    def get(self, messages: list, model: str) -> Optional[dict]:
+        key = verdict_key(messages, model)
+        with self._lock:
+            row = self._db.execute("SELECT verdict FROM verdicts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, messages: list, model: str, verdict: dict):
+        key = verdict_key(messages, model)
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO verdicts (key, model, verdict, created_at) VALUES (?, ?, ?, ?)",
+                        (key, model, json.dumps(verdict), time.time()),
+                    )
+            except sqlite3.Error as e:
+                logger.warning("Could not cache judge verdict: %s", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,154 @@
+"""
+Semantic answer cache for the RAG graph.
+
+Previously answered questions are kept in a small in-process vector index
+(a NumPy matrix of normalised query embeddings). A new question whose
+cosine similarity to a cached one reaches ANSWER_CACHE_THRESHOLD is answered
+with the cached answer and documents, skipping retrieval and generation.
+
+Cached answers are only valid for the collection contents they were built
+from, so the cache tracks a collection version (see
+data_insertion.db_operations.collection_version) and empties itself when
+ingestion changes the collection.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+# How often (seconds) to ask Qdrant whether the collection changed
+ANSWER_CACHE_VERSION_CHECK = float(os.getenv("ANSWER_CACHE_VERSION_CHECK", "30"))
+
+
+class SemanticAnswerCache:
+    """
+    Fixed-capacity cache; once full, the oldest entry is overwritten.
+    lookup() returns the best entry above the threshold or None, and every
+    hit adds the generation time originally spent on that answer to
+    saved_seconds.
+    """
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        version_fn: Optional[Callable[[], Optional[str]]] = None,
+        version_check_interval: float = ANSWER_CACHE_VERSION_CHECK,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_fn = version_fn
+        self.version_check_interval = version_check_interval
+        self._lock = threading.Lock()
+        self._vectors = None  # allocated on first store, once the dimension is known
+        self._expires = np.zeros(max_entries)
+        self._entries: List[Optional[dict]] = [None] * max_entries
+        self._next_slot = 0
+        self._version = None
+        self._version_checked_at = float("-inf")
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.invalidations = 0
+
+    def _check_version(self):
+        """
+        Poll version_fn at most every version_check_interval seconds and clear
+        the cache if the collection changed. version_fn is a network round
+        trip, so it runs without the lock; concurrent lookups don't wait on it.
+        """
+        if self.version_fn is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._version_checked_at < self.version_check_interval:
+                return
+            # Claim this check, so one caller per interval polls
+            self._version_checked_at = now
+        version = self.version_fn()
+        if version is None:
+            # Collection unreachable; keep serving what we have
+            return
+        with self._lock:
+            if self._version is not None and version != self._version:
+                logger.info("Collection changed (%s -> %s), clearing answer cache", self._version, version)
+                self._clear()
+                self.invalidations += 1
+            self._version = version
+
+    def _clear(self):
+        self._expires[:] = 0
+        self._entries = [None] * self.max_entries
+        self._next_slot = 0
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding) -> Optional[dict]:
+        """Return the cached entry most similar to the query embedding, if similar enough"""
+        self._check_version()
+        with self._lock:
+            if self._vectors is None or embedding is None:
+                self.misses += 1
+                return None
+            scores = self._vectors @ self._normalize(embedding)
+            scores[self._expires <= time.monotonic()] = -np.inf
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            if score < self.threshold:
+                self.misses += 1
+                return None
+            entry = self._entries[best]
+            self.hits += 1
+            self.saved_seconds += entry["generation_seconds"]
+            return dict(entry, similarity=score)
+
+    def store(self, embedding, query: str, answer: str, retrieved_docs, generation_seconds: float):
+        if embedding is None:
+            return
+        vector = self._normalize(embedding)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            slot = self._next_slot
+            self._next_slot = (slot + 1) % self.max_entries
+            self._vectors[slot] = vector
+            self._expires[slot] = time.monotonic() + self.ttl
+            self._entries[slot] = {
+                "query": query,
+                "answer": answer,
+                "retrieved_docs": retrieved_docs,
+                "generation_seconds": generation_seconds,
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": sum(entry is not None for entry in self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,186 @@
+"""
+Token-budgeted prompt context.
+
+Retrieved chunks overlap (the splitter repeats 200 characters between
+neighbouring chunks) and used to be pasted into the prompt as a Python list.
+build_context() instead:
+
+1. drops duplicate chunks,
+2. joins chunks that are neighbours in the same file (consecutive
+   chunk_index) into one block, cutting the repeated overlap,
+3. orders blocks by their best rerank or retrieval score,
+4. packs them into CONTEXT_TOKEN_BUDGET tokens, shortening a block that
+   only partly fits and skipping ones too large for what is left, so
+   smaller, lower-scored blocks can still use the remaining budget.
+
+Tokens are counted with tiktoken (CONTEXT_TOKENIZER_ENCODING); if it cannot
+be loaded (e.g. no network to fetch the encoding), is disabled
+(CONTEXT_TOKENIZER_ENCODING=none) or is still loading, ~4 characters per
+token. The API loads it in the background at startup (warm_up()), so a
+request never waits for tiktoken to download the encoding.
+Counts only need to be close: the budget bounds prompt size, and with it
+time to first token, rather than fitting a hard model limit.
+"""
+
+import math
+import os
+import threading
+from typing import List, Optional, Tuple
+
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# "none" (or empty) skips tiktoken, and any download, and always estimates from characters
+CONTEXT_TOKENIZER_ENCODING = os.getenv("CONTEXT_TOKENIZER_ENCODING", "cl100k_base")
+TOKENIZER_DISABLED = CONTEXT_TOKENIZER_ENCODING.strip().lower() in ("", "none")
+# A block shortened to fewer tokens than this is left out instead
+CONTEXT_MIN_BLOCK_TOKENS = 50
+# Longest overlap looked for between neighbouring chunks (splitter overlap is 200)
+MAX_CHUNK_OVERLAP_CHARS = 400
+MIN_CHUNK_OVERLAP_CHARS = 20
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_loaded = TOKENIZER_DISABLED
+_encoding_lock = threading.Lock()
+_warm_up_started = threading.Event()
+
+
+def load_encoding():
+    """Load the tiktoken encoding once (may download it); returns it, or None if unavailable"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(CONTEXT_TOKENIZER_ENCODING)
+                except Exception as e:
+                    logger.warning("tiktoken unavailable (%s), estimating tokens from characters", e)
+                _encoding_loaded = True
+    return _encoding
+
+
+def warm_up():
+    """Start loading the encoding in a background thread; called once at API startup"""
+    if _encoding_loaded or _warm_up_started.is_set():
+        return
+    _warm_up_started.set()
+    threading.Thread(target=load_encoding, name="tokenizer-warm-up", daemon=True).start()
+
+
+def get_encoding():
+    """
+    The tiktoken encoding, or None if it is unavailable. Once warm_up() has
+    started, this never blocks: None until the background load finishes.
+    Processes that never warm up (scripts, benchmarks) load it here.
+    """
+    if _encoding_loaded or _warm_up_started.is_set():
+        return _encoding
+    return load_encoding()
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def join_overlapping(first: str, second: str) -> str:
+    """Concatenate neighbouring chunks, keeping text they share only once"""
+    longest = min(len(first), len(second), MAX_CHUNK_OVERLAP_CHARS)
+    for size in range(longest, MIN_CHUNK_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first}\n{second}"
+
+
+def relevance(document: dict) -> float:
+    """Rerank score if the documents were reranked, else the retrieval score"""
+    return document.get("rerank_score", document.get("score", 0.0))
+
+
+def merge_documents(documents: List[dict]) -> List[dict]:
+    """
+    Drop duplicates and join runs of neighbouring chunks of the same file.
+    Returns blocks {"text", "score", "source_file", "chunk_indices"}, best score first.
+    """
+    unique = {}
+    for document in documents:
+        if document.get("chunk_index") is not None:
+            key = (document.get("source_file"), document["chunk_index"])
+        else:
+            key = ("", document["text"])
+        if key not in unique or relevance(document) > relevance(unique[key]):
+            unique[key] = document
+
+    blocks = []
+    ordered = sorted(unique.values(), key=lambda d: (d.get("source_file") or "", d.get("chunk_index") or 0))
+    for document in ordered:
+        previous = blocks[-1] if blocks else None
+        index = document.get("chunk_index")
+        if (previous is not None and index is not None
+                and previous["source_file"] == document.get("source_file")
+                and previous["chunk_indices"][-1] == index - 1):
+            previous["text"] = join_overlapping(previous["text"], document["text"])
+            previous["score"] = max(previous["score"], relevance(document))
+            previous["chunk_indices"].append(index)
+        else:
+            blocks.append({
+                "text": document["text"],
+                "score": relevance(document),
+                "source_file": document.get("source_file"),
+                "chunk_indices": [index] if index is not None else [],
+            })
+    # Stable sort: equal scores keep file order
+    return sorted(blocks, key=lambda block: block["score"], reverse=True)
+
+
+def format_block(number: int, block: dict) -> str:
+    header = f"[{number}]" + (f" {block['source_file']}" if block.get("source_file") else "")
+    return f"{header}\n{block['text'].strip()}"
+
+
+def build_context(documents: List[dict], budget: Optional[int] = None) -> Tuple[str, dict]:
+    """
+    Prompt context from retrieved documents, within budget tokens
+    (CONTEXT_TOKEN_BUDGET by default). Returns (context, stats).
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    blocks = merge_documents(documents or [])
+    parts, used, truncated = [], 0, False
+    for block in blocks:
+        text = format_block(len(parts) + 1, block)
+        # Blocks are separated by a blank line
+        tokens = count_tokens(text) + (1 if parts else 0)
+        if used + tokens > budget:
+            # Some context is lost whether the block is shortened or skipped
+            truncated = True
+            remaining = budget - used - (1 if parts else 0)
+            if remaining < CONTEXT_MIN_BLOCK_TOKENS:
+                continue
+            text = truncate_to_tokens(text, remaining)
+            parts.append(text)
+            used += count_tokens(text) + (1 if len(parts) > 1 else 0)
+            continue
+        parts.append(text)
+        used += tokens
+
+    stats = {
+        "documents": len(documents or []),
+        "blocks": len(blocks),
+        "packed_blocks": len(parts),
+        "context_tokens": used,
+        "truncated": truncated,
+    }
+    return "\n\n".join(parts), stats
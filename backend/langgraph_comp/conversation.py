@@ -0,0 +1,211 @@
+"""
+Conversation transcript and bounded conversation memory.
+
+Every completed turn is written to the conversation archive as one compact
+document (thread_id, turn, question, answer, timestamp). The archive is the
+read model behind /thread_history, so the API pages through plain documents
+instead of deserialising LangChain messages from checkpoints.
+
+State.messages grows by a Human/AI pair every turn and the whole list is
+serialised into every checkpoint. To keep checkpoints small:
+
+- Only the last CONVERSATION_WINDOW_TURNS turns stay in the live state. Older
+  turns are already in the archive and are removed from the state with
+  RemoveMessage.
+- After every query, all but the last CHECKPOINT_KEEP_LAST checkpoints of
+  the thread (and their pending writes) are deleted. The latest checkpoint
+  holds the complete live state, so older ones only matter for time travel,
+  which the API does not use.
+
+Setting either value to 0 disables that part.
+"""
+
+import os
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, RemoveMessage
+
+import clients
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+CONVERSATION_WINDOW_TURNS = int(os.getenv("CONVERSATION_WINDOW_TURNS", "20"))
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "3"))
+# Defaults to the database MongoDBSaver keeps checkpoints in
+CONVERSATION_ARCHIVE_DB = os.getenv("CONVERSATION_ARCHIVE_DB", "checkpointing_db")
+CONVERSATION_ARCHIVE_COLLECTION = os.getenv("CONVERSATION_ARCHIVE_COLLECTION", "conversation_archive")
+
+_indexed = threading.Event()
+
+
+def archive_collection():
+    collection = clients.mongo_client()[CONVERSATION_ARCHIVE_DB][CONVERSATION_ARCHIVE_COLLECTION]
+    if not _indexed.is_set():
+        collection.create_index([("thread_id", 1), ("turn", 1)], unique=True)
+        _indexed.set()
+    return collection
+
+
+def split_window(messages: List[BaseMessage], window_turns: int) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+    """Split messages into (older, recent) so that recent holds the last window_turns turns"""
+    keep = 2 * window_turns
+    if window_turns <= 0 or len(messages) <= keep:
+        return [], messages
+    return messages[:-keep], messages[-keep:]
+
+
+def message_text(message: BaseMessage) -> str:
+    # Older answers were stored as [text, documents]
+    if isinstance(message.content, list) and message.content:
+        return message.content[0]
+    return message.content
+
+
+def turn_documents(thread_id: str, messages: List[BaseMessage], first_turn: int,
+                   timestamp: Optional[datetime] = None) -> List[dict]:
+    """Archive documents for Human/AI message pairs, numbered from first_turn"""
+    timestamp = timestamp or datetime.now(timezone.utc)
+    documents = []
+    for offset in range(0, len(messages) - 1, 2):
+        question, answer = messages[offset], messages[offset + 1]
+        documents.append({
+            "thread_id": thread_id,
+            "turn": first_turn + offset // 2,
+            "question": message_text(question),
+            "answer": message_text(answer),
+            "timestamp": timestamp,
+        })
+    return documents
+
+
+def archive_turns(thread_id: str, messages: List[BaseMessage], first_turn: int,
+                  timestamp: Optional[datetime] = None) -> int:
+    """
+    Store turns in the archive; idempotent, so a retried node or a re-run
+    backfill cannot duplicate or overwrite them. Returns the number of new turns.
+    """
+    from pymongo import UpdateOne
+
+    documents = turn_documents(thread_id, messages, first_turn, timestamp)
+    if not documents:
+        return 0
+    result = archive_collection().bulk_write([
+        UpdateOne({"thread_id": doc["thread_id"], "turn": doc["turn"]}, {"$setOnInsert": doc}, upsert=True)
+        for doc in documents
+    ], ordered=False)
+    return result.upserted_count
+
+
+def record_turn(thread_id: str, turn: int, question: str, answer: str):
+    """Write a completed turn to the archive (the /thread_history read model)"""
+    archive_collection().update_one(
+        {"thread_id": thread_id, "turn": turn},
+        {"$setOnInsert": {
+            "question": question,
+            "answer": answer,
+            "timestamp": datetime.now(timezone.utc),
+        }},
+        upsert=True,
+    )
+
+
+def turn_page(thread_id: str, before: Optional[int] = None, limit: int = 50) -> Tuple[List[dict], bool]:
+    """
+    Up to limit turns older than turn number `before` (the newest turns when
+    None), oldest first, and whether older turns remain.
+    """
+    query = {"thread_id": thread_id}
+    if before is not None:
+        query["turn"] = {"$lt": before}
+    newest_first = list(archive_collection().find(
+        query, {"_id": 0, "turn": 1, "question": 1, "answer": 1, "timestamp": 1}
+    ).sort("turn", -1).limit(limit + 1))
+    return newest_first[:limit][::-1], len(newest_first) > limit
+
+
+def missing_turns(turns: List[dict], has_more: bool, before: Optional[int] = None) -> bool:
+    """
+    Whether a turn_page() result skips turns: its turn numbers are not
+    consecutive, it does not end just before `before`, or it is the first
+    page of the conversation but does not start at turn 0. Threads from
+    before the archive existed look like this until backfill_thread() runs,
+    even after new turns were recorded.
+    """
+    if not turns:
+        return before is None or before > 0
+    first, last = turns[0]["turn"], turns[-1]["turn"]
+    if last - first + 1 != len(turns):
+        return True
+    if before is not None and last != before - 1:
+        return True
+    return not has_more and first != 0
+
+
+def backfill_thread(checkpointer, thread_id: str) -> int:
+    """
+    Archive the turns still held in a thread's latest checkpoint, for threads
+    recorded before the archive existed. Returns the number of new turns.
+    """
+    checkpoint_tuple = checkpointer.get_tuple({"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}})
+    if checkpoint_tuple is None:
+        return 0
+    checkpoint = checkpoint_tuple.checkpoint
+    values = checkpoint.get("channel_values", {})
+    timestamp = datetime.fromisoformat(checkpoint["ts"]) if checkpoint.get("ts") else None
+    return archive_turns(thread_id, values.get("messages") or [], values.get("archived_turns") or 0, timestamp)
+
+
+def window_update(state: dict, thread_id: str, window_turns: int = CONVERSATION_WINDOW_TURNS) -> dict:
+    """
+    State update that archives the turns outside the window and removes them
+    from State.messages. Empty when the conversation still fits.
+    """
+    older, _ = split_window(state.get("messages") or [], window_turns)
+    if not older:
+        return {}
+    archived = state.get("archived_turns") or 0
+    # Normally a no-op: record_turn() archived these turns when they completed
+    archive_turns(thread_id, older, archived)
+    logger.info("Moved %d turns of thread %s out of the conversation window", len(older) // 2, thread_id)
+    return {
+        "messages": [RemoveMessage(id=message.id) for message in older],
+        "archived_turns": archived + len(older) // 2,
+    }
+
+
+def prune_checkpoints(checkpointer, thread_id: str, keep_last: int = CHECKPOINT_KEEP_LAST) -> int:
+    """
+    Delete all but the newest keep_last checkpoints of a thread, with their
+    pending writes. Returns the number of checkpoints deleted. Only
+    MongoDBSaver is supported; other savers are left untouched.
+    """
+    checkpoints = getattr(checkpointer, "checkpoint_collection", None)
+    writes = getattr(checkpointer, "writes_collection", None)
+    if keep_last <= 0 or checkpoints is None or writes is None:
+        return 0
+
+    # Checkpoint ids are time-ordered, newest first
+    stale = [
+        doc["checkpoint_id"]
+        for doc in checkpoints.find(
+            {"thread_id": thread_id, "checkpoint_ns": ""}, {"checkpoint_id": 1, "_id": 0}
+        ).sort("checkpoint_id", -1).skip(keep_last)
+    ]
+    if not stale:
+        return 0
+    checkpoints.delete_many({"thread_id": thread_id, "checkpoint_ns": "", "checkpoint_id": {"$in": stale}})
+    writes.delete_many({"thread_id": thread_id, "checkpoint_ns": "", "checkpoint_id": {"$in": stale}})
+    return len(stale)
+
+
+def prune_thread_checkpoints(thread_id: str):
+    """prune_checkpoints() on the shared checkpointer; never fails the request"""
+    try:
+        pruned = prune_checkpoints(clients.checkpointer(), thread_id)
+        if pruned:
+            logger.debug("Pruned %d checkpoints of thread %s", pruned, thread_id)
+    except Exception as e:
+        logger.warning("Could not prune checkpoints of thread %s: %s", thread_id, e)
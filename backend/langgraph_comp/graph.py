@@ -1,136 +1,438 @@
+import asyncio
 import os
+import threading
+import time
 from typing import TypedDict, List, Annotated
 from dotenv import load_dotenv
-from openai import OpenAI
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
-import re
-from db_connect import langgraph_collection
+from langchain_core.runnables import RunnableLambda
+import clients
+import metrics
 
 # Import functions from data_insertion folder
-from data_insertion.db_operations import query_documents
-from data_insertion.insertion import qdrant_client
+from data_insertion.db_operations import (
+    query_documents, create_embedding, collection_version, aquery_documents, acreate_embedding
+)
+from data_insertion.retrieval import RetrievalConfig
+from langgraph_comp.think_filter import strip_think_tags
+from langgraph_comp.answer_cache import SemanticAnswerCache, ANSWER_CACHE_ENABLED
+from langgraph_comp.context import build_context as build_prompt_context, count_tokens
+from langgraph_comp.conversation import record_turn, window_update
+from langgraph_comp.rerank import RERANK_ENABLED, arerank_documents, candidate_config, rerank_documents
 from logging_config import get_logger
 
 load_dotenv()
 
-# Environment variables
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_API_BASE = os.getenv("OPENAI_API_BASE")
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
-GENERATION_MODEL = os.getenv("GENERATION_MODEL")
-
-# Initialize OpenAI client
-openai_client = OpenAI(base_url=OPENAI_API_BASE, api_key=OPENAI_API_KEY)
-
-llm = ChatOpenAI(model=GENERATION_MODEL, base_url=OPENAI_API_BASE, api_key=OPENAI_API_KEY)
-
 
 # Define the state schema
 class State(TypedDict):
     query: str
+    # data_insertion.retrieval.RetrievedDocument dicts
     retrieved_docs: List[dict]
+    # Prompt context packed from retrieved_docs (see langgraph_comp/context.py)
+    context: str
+    prompt_tokens: int
     answer: str
     messages: Annotated[List[BaseMessage], add_messages]
     headline: str
+    # True only on the turn that produced the headline; callers reset it in the input
+    headline_generated: bool
+    cache_hit: bool
+    # Turns moved out of messages into the conversation archive
+    archived_turns: int
 
 
 logger = get_logger(__name__)
 
+# Opt-in via ANSWER_CACHE_ENABLED; invalidated whenever ingestion changes the collection
+answer_cache = SemanticAnswerCache(version_fn=collection_version) if ANSWER_CACHE_ENABLED else None
+
+
+def cache_lookup_update(query, entry):
+    metrics.CACHE_REQUESTS.inc(cache="answer", result="miss" if entry is None else "hit")
+    if entry is None:
+        return {"cache_hit": False}
+
+    stats = answer_cache.stats()
+    logger.info("Answer cache hit (similarity %.3f, saved ~%.2fs; hit rate %.1f%%, %.1fs saved in total) "
+                "for query: %s", entry["similarity"], entry["generation_seconds"], stats["hit_rate"] * 100,
+                stats["saved_seconds"], query)
+    return {
+        "cache_hit": True,
+        "retrieved_docs": entry["retrieved_docs"],
+        "answer": entry["answer"],
+    }
+
+
+def retrieval_overrides(config):
+    """Per-request retrieval settings (the "retrieval" object of the /query body)"""
+    return (config or {}).get("configurable", {}).get("retrieval")
+
+
+def lookup_answer_cache(state, config):
+    """
+    Look the query up in the semantic answer cache. On a hit the cached
+    answer and documents are returned and retrieval and generation are skipped.
+    Requests with their own retrieval settings always retrieve.
+    """
+    if retrieval_overrides(config):
+        return {"cache_hit": False}
+    query = state['query']
+    return cache_lookup_update(query, answer_cache.lookup(create_embedding(query)))
+
+
+async def alookup_answer_cache(state, config):
+    """Async version of lookup_answer_cache"""
+    if retrieval_overrides(config):
+        return {"cache_hit": False}
+    query = state['query']
+    embedding = await acreate_embedding(query)
+    # lookup() may poll Qdrant for the collection version, so keep it off the event loop
+    entry = await asyncio.to_thread(answer_cache.lookup, embedding)
+    return cache_lookup_update(query, entry)
 
-def retrieve(state):
+
+def answer_from_cache(state):
+    """
+    Record the cached answer in the conversation like a generated one.
+    """
+    return {
+        "messages": [
+            HumanMessage(content=state['query']),
+            AIMessage(content=state['answer'])
+        ]
+    }
+
+
+def route_after_cache(state):
+    return "answer_from_cache" if state.get("cache_hit") else "retrieve"
+
+
+def retrieve(state, config):
     """
     Retrieve relevant documents from Qdrant based on the query.
     Uses functions from data_insertion folder.
     """
-    print(f"DEBUG: Retrieving documents for query: {state.get('query')}")
     logger.info("Retrieving documents for query: %s", state.get('query'))
 
     query = state['query']
-    results = query_documents(query=query)
-    state['retrieved_docs'] = results
-    return state
+    results = query_documents(query=query, config=retrieval_config(config))
+    # Only return the update: generate_headline runs in the same step and
+    # also writes headline_generated
+    return {"retrieved_docs": results}
+
+
+async def aretrieve(state, config):
+    """Async version of retrieve, using the async OpenAI and Qdrant clients"""
+    logger.info("Retrieving documents for query: %s", state.get('query'))
+    return {"retrieved_docs": await aquery_documents(query=state['query'], config=retrieval_config(config))}
+
+
+def retrieval_config(config):
+    """Settings for retrieve: the request's, with top_k raised to the rerank candidates when reranking"""
+    retrieval = RetrievalConfig().with_overrides(retrieval_overrides(config))
+    return candidate_config(retrieval) if RERANK_ENABLED else retrieval
+
+
+def rerank(state, config):
+    """
+    Reorder the over-fetched candidates with the configured scorer and keep
+    the requested top_k (dense order if scoring fails or times out).
+    """
+    top_k = RetrievalConfig().with_overrides(retrieval_overrides(config)).top_k
+    return {"retrieved_docs": rerank_documents(state['query'], state['retrieved_docs'], top_k)}
+
+
+async def arerank(state, config):
+    """Async version of rerank; scoring runs off the event loop"""
+    top_k = RetrievalConfig().with_overrides(retrieval_overrides(config)).top_k
+    return {"retrieved_docs": await arerank_documents(state['query'], state['retrieved_docs'], top_k)}
 
 
 PROMPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rag_prompt.md")
 with open(PROMPT_PATH, "r", encoding="utf-8") as f:
     RAG_PROMPT_TEMPLATE = f.read()
 
-def generate(state):
+GENERATION_ERROR_ANSWER = "Sorry, I encountered an error while generating the answer."
+
+
+def build_context(state):
+    """
+    Pack the retrieved documents into the token-budgeted prompt context and
+    count the tokens of the full prompt.
+    """
+    context, stats = build_prompt_context(state['retrieved_docs'])
+    prompt_tokens = count_tokens(RAG_PROMPT_TEMPLATE.format(context=context, question=state['query']))
+    logger.info("Prompt: %d tokens (%d context tokens, %d of %d blocks from %d documents%s)",
+                prompt_tokens, stats["context_tokens"], stats["packed_blocks"], stats["blocks"],
+                stats["documents"], ", truncated" if stats["truncated"] else "")
+    return {"context": context, "prompt_tokens": prompt_tokens}
+
+
+def record_token_usage(call, response, prompt_tokens=None):
+    """
+    Count the call's tokens in rag_llm_tokens_total: the provider's usage
+    metadata, else estimates (the prompt_tokens from build_context, the
+    answer counted with the context tokenizer).
+    """
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens") is None and prompt_tokens is None:
+        return
+    metrics.LLM_TOKENS.inc(usage.get("input_tokens", prompt_tokens), call=call, kind="prompt")
+    completion = usage.get("output_tokens")
+    if completion is None:
+        completion = count_tokens(response.content if isinstance(response.content, str) else str(response.content))
+    metrics.LLM_TOKENS.inc(completion, call=call, kind="completion")
+
+
+def generation_output(query, content):
+    """State update for a generated answer: the visible text plus the new conversation messages"""
+    clean_text = strip_think_tags(content)
+    return {
+        "answer": clean_text,
+        "messages": [
+            HumanMessage(content=query),
+            AIMessage(content=clean_text) # Or [clean_text, retrieved_docs] if we want to store docs
+        ]
+    }
+
+
+def generate(state, config):
     """
     Generate an answer based on the query and retrieved documents.
     """
-    print("DEBUG: Generating answer...")
     logger.info("Generating answer...")
     
     query = state['query']
     retrieved_docs = state['retrieved_docs']
     try:
-        
-        prompt = RAG_PROMPT_TEMPLATE.format(context=retrieved_docs, question=query)
-        
-        response = llm.invoke(prompt)
-        clean_text = re.sub(r"<think>.*?</think>", "", response.content, flags=re.DOTALL).strip()
-        state['answer'] = clean_text
-        
-        # Update messages
+        prompt = RAG_PROMPT_TEMPLATE.format(context=state['context'], question=query)
+
+        started = time.perf_counter()
+        with metrics.timed_call("llm_generate"):
+            response = clients.chat_model().invoke(prompt)
+        record_token_usage("llm_generate", response, state.get('prompt_tokens'))
         # We return the NEW messages to be added
-        output = {
-            "answer": clean_text,
-            "messages": [
-                HumanMessage(content=query),
-                AIMessage(content=clean_text) # Or [clean_text, retrieved_docs] if we want to store docs
-            ]
-        }
-        print(f"DEBUG: Generate output: {output}")
+        output = generation_output(query, response.content)
+
+        # Answers produced with per-request retrieval overrides are not stored
+        if answer_cache is not None and not retrieval_overrides(config):
+            answer_cache.store(create_embedding(query), query, output["answer"], retrieved_docs,
+                               time.perf_counter() - started)
+
+        logger.debug("Generate output: %s", output)
+        return output
+    except Exception as e:
+        logger.exception("Error generating answer: %s", e)
+        return {"answer": GENERATION_ERROR_ANSWER}
+
+
+async def agenerate(state, config):
+    """Async version of generate; the LLM call does not hold a thread while waiting"""
+    logger.info("Generating answer...")
+    query = state['query']
+    retrieved_docs = state['retrieved_docs']
+    try:
+        prompt = RAG_PROMPT_TEMPLATE.format(context=state['context'], question=query)
+
+        started = time.perf_counter()
+        with metrics.timed_call("llm_generate"):
+            response = await clients.chat_model().ainvoke(prompt)
+        record_token_usage("llm_generate", response, state.get('prompt_tokens'))
+        output = generation_output(query, response.content)
+
+        if answer_cache is not None and not retrieval_overrides(config):
+            answer_cache.store(await acreate_embedding(query), query, output["answer"], retrieved_docs,
+                               time.perf_counter() - started)
         return output
     except Exception as e:
         logger.exception("Error generating answer: %s", e)
-        print(f"DEBUG: Error generating answer: {e}")
-        state['answer'] = "Sorry, I encountered an error while generating the answer."
-        return state
+        return {"answer": GENERATION_ERROR_ANSWER}
+
+# "llm" asks the model for a headline; "truncate" and "keywords" build one from the query without an LLM call
+HEADLINE_MODE = os.getenv("HEADLINE_MODE", "llm").lower()
+HEADLINE_MAX_WORDS = 5
+
+HEADLINE_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did", "i", "me", "my", "you",
+    "your", "we", "it", "its", "of", "in", "on", "to", "for", "with", "and", "or", "what", "how", "why",
+    "when", "where", "which", "who", "can", "could", "should", "would", "please", "explain", "tell",
+    "about", "this", "that", "there", "from", "by", "as", "at", "into", "between", "vs",
+}
+
+
+def truncated_headline(query: str) -> str:
+    words = query.replace('"', '').split()
+    headline = " ".join(words[:HEADLINE_MAX_WORDS])
+    return headline + ("..." if len(words) > HEADLINE_MAX_WORDS else "")
+
+
+def keyword_headline(query: str) -> str:
+    words = [word.strip("?!.,;:()[]'\"") for word in query.split()]
+    keywords = [word for word in words if word and word.lower() not in HEADLINE_STOPWORDS]
+    if not keywords:
+        return truncated_headline(query)
+    # Keep identifiers such as LCEL or initialize_agent as typed
+    return " ".join(word.capitalize() if word.isalpha() and word.islower() else word
+                    for word in keywords[:HEADLINE_MAX_WORDS])
+
+
+def rule_based_headline(query: str):
+    """Headline built without an LLM call, or None in "llm" mode"""
+    if HEADLINE_MODE == "truncate":
+        return truncated_headline(query)
+    if HEADLINE_MODE == "keywords":
+        return keyword_headline(query)
+    return None
+
+
+def headline_prompt(query: str) -> str:
+    return f"Generate a very short, concise headline (max 5 words) for this user query. Do not use quotes. Query: {query}"
+
 
 def generate_headline(state):
     """
     Generate a short headline based on the user query.
+    Only runs on the first turn of a thread (see route_start).
     """
-    # Only generate if not already present or if it's the default
-    # Since we don't have easy access to the "previous" state here without checkpointer logic inside the node,
-    # we can check if 'headline' is in state. 
-    # However, for a new turn, state might be merged.
-    # Let's just generate it based on the query. The app.py can decide whether to save it or not.
-    # Or better, we generate it and return it.
-    
     query = state['query']
+    headline = rule_based_headline(query)
+    if headline is not None:
+        return {"headline": headline, "headline_generated": True}
+
     try:
-        prompt = f"Generate a very short, concise headline (max 5 words) for this user query. Do not use quotes. Query: {query}"
-        response = llm.invoke(prompt)
-        headline = response.content.strip().replace('"', '')
-        return {"headline": headline}
+        prompt = headline_prompt(query)
+        with metrics.timed_call("llm_headline"):
+            response = clients.chat_model().invoke(prompt)
+        record_token_usage("llm_headline", response, count_tokens(prompt))
+        headline = strip_think_tags(response.content).replace('"', '')
+        return {"headline": headline, "headline_generated": True}
     except Exception as e:
-        logger.error(f"Error generating headline: {e}")
-        return {"headline": "Conversation"}
+        logger.error("Error generating headline: %s", e)
+        return {"headline": "Conversation", "headline_generated": True}
 
-# Initialize checkpointer
-checkpointer = langgraph_collection()
 
-langchain_graph = (
+async def agenerate_headline(state):
+    """Async version of generate_headline"""
+    query = state['query']
+    headline = rule_based_headline(query)
+    if headline is not None:
+        return {"headline": headline, "headline_generated": True}
+
+    try:
+        prompt = headline_prompt(query)
+        with metrics.timed_call("llm_headline"):
+            response = await clients.chat_model().ainvoke(prompt)
+        record_token_usage("llm_headline", response, count_tokens(prompt))
+        headline = strip_think_tags(response.content).replace('"', '')
+        return {"headline": headline, "headline_generated": True}
+    except Exception as e:
+        logger.error("Error generating headline: %s", e)
+        return {"headline": "Conversation", "headline_generated": True}
+
+
+def finish_turn_update(state, thread_id):
+    if state.get("answer") == GENERATION_ERROR_ANSWER:
+        # Failed generations add no messages, so there is no turn to record
+        return {}
+    # The turn just answered is the last message pair
+    turn = (state.get("archived_turns") or 0) + len(state["messages"]) // 2 - 1
+    try:
+        record_turn(thread_id, turn, state["query"], state["answer"])
+    except Exception as e:
+        metrics.ERRORS.inc(stage="record_turn")
+        logger.warning("Could not record turn %d of thread %s: %s", turn, thread_id, e)
+    return window_update(state, thread_id)
+
+
+def finish_turn(state, config):
+    """
+    Record the completed turn in the conversation archive (the read model
+    behind /thread_history), then keep only the last
+    CONVERSATION_WINDOW_TURNS turns in the state (see conversation.py).
+    """
+    return finish_turn_update(state, config["configurable"]["thread_id"])
+
+
+async def afinish_turn(state, config):
+    """Async version of finish_turn"""
+    return await asyncio.to_thread(finish_turn_update, state, config["configurable"]["thread_id"])
+
+
+def node(func, afunc=None):
+    """
+    Graph node with a sync and an async implementation: invoke()/stream()
+    (Flask) run func, ainvoke()/astream() (ASGI, see api/asgi.py) run afunc.
+    Both are timed in rag_node_duration_seconds (see metrics.py).
+    """
+    name = func.__name__
+    return RunnableLambda(metrics.time_node(name, func), afunc=metrics.time_node(name, afunc), name=name)
+
+builder = (
     StateGraph(State)
-    .add_node("retrieve", retrieve)
-    .add_node("generate", generate)
-    .add_node("generate_headline", generate_headline)
-    .add_edge(START, "retrieve")
-    .add_edge(START, "generate_headline")
-    .add_edge("retrieve", "generate")
-    .add_edge("generate", END)
+    .add_node("retrieve", node(retrieve, aretrieve))
+    .add_node("build_context", node(build_context))
+    .add_node("generate", node(generate, agenerate))
+    .add_node("generate_headline", node(generate_headline, agenerate_headline))
+    .add_node("finish_turn", node(finish_turn, afinish_turn))
+    .add_edge("build_context", "generate")
+    .add_edge("generate", "finish_turn")
     .add_edge("generate_headline", END)
-    .compile(checkpointer=checkpointer)
+    .add_edge("finish_turn", END)
 )
 
+# The node whose update carries the documents the prompt is built from
+DOCUMENTS_NODE = "rerank" if RERANK_ENABLED else "retrieve"
+
+if RERANK_ENABLED:
+    (
+        builder
+        .add_node("rerank", node(rerank, arerank))
+        .add_edge("retrieve", "rerank")
+        .add_edge("rerank", "build_context")
+    )
+else:
+    builder.add_edge("retrieve", "build_context")
+
+if answer_cache is not None:
+    (
+        builder
+        .add_node("lookup_answer_cache", node(lookup_answer_cache, alookup_answer_cache))
+        .add_node("answer_from_cache", node(answer_from_cache))
+        .add_conditional_edges("lookup_answer_cache", route_after_cache, ["retrieve", "answer_from_cache"])
+        .add_edge("answer_from_cache", "finish_turn")
+    )
+
+FIRST_NODE = "lookup_answer_cache" if answer_cache is not None else "retrieve"
 
 
+def route_start(state):
+    """
+    Fan out from START. The headline is checkpointed with the thread, so
+    once a thread has one, follow-up turns skip the headline LLM call.
+    """
+    if state.get("headline"):
+        return [FIRST_NODE]
+    return [FIRST_NODE, "generate_headline"]
+
 
+builder.add_conditional_edges(START, route_start, [FIRST_NODE, "generate_headline"])
 
+_graph = None
+_graph_lock = threading.Lock()
 
+
+def get_graph():
+    """
+    The compiled graph, built on first use with the shared checkpointer.
+    MongoDBSaver implements the async checkpoint methods too (on a thread
+    pool), so the same graph serves invoke()/stream() and ainvoke()/astream().
+    """
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                _graph = builder.compile(checkpointer=clients.checkpointer())
+    return _graph
@@ -0,0 +1,203 @@
+"""
+Reranking of retrieved candidates.
+
+With RERANK_ENABLED the graph over-fetches RERANK_CANDIDATES documents and
+the rerank node orders them with a scorer, keeping the requested top_k, so
+the prompt gets a few highly relevant chunks instead of the raw dense top 5.
+
+A scorer is a callable scorer(query, documents) -> one score per document,
+higher is better. Built in (RERANK_SCORER):
+
+- "lexical": BM25 over the candidate set (vectorised with numpy, same
+  tokenizer as the sparse vectors), blended with the dense similarity.
+  Takes a few milliseconds for 50 candidates.
+- "cross-encoder": a sentence-transformers CrossEncoder (RERANK_MODEL) on
+  CPU, scoring (query, chunk) pairs in batches of RERANK_BATCH_SIZE. Needs
+  `pip install sentence-transformers`; the model is loaded on first use.
+
+Other scorers can be added with register_scorer(). Scoring runs on a small
+thread pool; if it fails or takes longer than RERANK_TIMEOUT seconds the
+candidates keep their dense order.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional, Sequence
+
+from data_insertion.retrieval import RetrievalConfig, RetrievedDocument
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_SCORER = os.getenv("RERANK_SCORER", "lexical").lower()
+# Documents fetched from Qdrant before reranking down to top_k
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+RERANK_TIMEOUT = float(os.getenv("RERANK_TIMEOUT", "2.0"))
+RERANK_WORKERS = int(os.getenv("RERANK_WORKERS", "4"))
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+# Share of the lexical score's BM25 part; the rest is the dense similarity
+RERANK_LEXICAL_WEIGHT = float(os.getenv("RERANK_LEXICAL_WEIGHT", "0.5"))
+
+Scorer = Callable[[str, List[RetrievedDocument]], Sequence[float]]
+
+_factories: Dict[str, Callable[[], Scorer]] = {}
+_scorers: Dict[str, Scorer] = {}
+_lock = threading.Lock()
+_executor = None
+
+
+def register_scorer(name: str, factory: Callable[[], Scorer]):
+    """Make a scorer available as RERANK_SCORER=name; factory() is called once, on first use"""
+    with _lock:
+        _factories[name] = factory
+        _scorers.pop(name, None)
+
+
+def get_scorer(name: Optional[str] = None) -> Scorer:
+    name = name or RERANK_SCORER
+    scorer = _scorers.get(name)
+    if scorer is None:
+        with _lock:
+            scorer = _scorers.get(name)
+            if scorer is None:
+                if name not in _factories:
+                    raise ValueError(f"Unknown reranker '{name}' (known: {', '.join(sorted(_factories))})")
+                scorer = _scorers[name] = _factories[name]()
+    return scorer
+
+
+def min_max(values):
+    import numpy as np
+    spread = values.max() - values.min()
+    return (values - values.min()) / spread if spread > 0 else np.zeros_like(values)
+
+
+def lexical_scorer() -> Scorer:
+    import numpy as np
+    from data_insertion.sparse import BM25_B, BM25_K1, tokenize
+
+    def score(query, documents):
+        dense = np.array([document["score"] for document in documents], dtype=np.float32)
+        terms = {term: column for column, term in enumerate(dict.fromkeys(tokenize(query)))}
+        if not terms:
+            return dense
+
+        # Term frequencies of the query terms, one row per candidate
+        tf = np.zeros((len(documents), len(terms)), dtype=np.float32)
+        lengths = np.empty(len(documents), dtype=np.float32)
+        for row, document in enumerate(documents):
+            tokens = tokenize(document["text"])
+            lengths[row] = len(tokens)
+            for token in tokens:
+                column = terms.get(token)
+                if column is not None:
+                    tf[row, column] += 1
+
+        df = np.count_nonzero(tf, axis=0)
+        idf = np.log1p((len(documents) - df + 0.5) / (df + 0.5))
+        length_norm = 1 - BM25_B + BM25_B * lengths / max(lengths.mean(), 1.0)
+        bm25 = (tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm[:, None])) @ idf
+        return RERANK_LEXICAL_WEIGHT * min_max(bm25) + (1 - RERANK_LEXICAL_WEIGHT) * min_max(dense)
+
+    return score
+
+
+def cross_encoder_scorer() -> Scorer:
+    try:
+        from sentence_transformers import CrossEncoder
+    except ImportError as e:
+        raise RuntimeError("RERANK_SCORER=cross-encoder needs sentence-transformers "
+                           "(pip install sentence-transformers)") from e
+
+    logger.info("Loading cross-encoder %s", RERANK_MODEL)
+    model = CrossEncoder(RERANK_MODEL, device="cpu")
+
+    def score(query, documents):
+        return model.predict([(query, document["text"]) for document in documents],
+                             batch_size=RERANK_BATCH_SIZE, convert_to_numpy=True, show_progress_bar=False)
+
+    return score
+
+
+register_scorer("lexical", lexical_scorer)
+register_scorer("cross-encoder", cross_encoder_scorer)
+
+
+def executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=RERANK_WORKERS, thread_name_prefix="rerank")
+    return _executor
+
+
+def candidate_config(config: RetrievalConfig) -> RetrievalConfig:
+    """The retrieval config with top_k raised to the rerank candidate count"""
+    return config._replace(top_k=max(config.top_k, RERANK_CANDIDATES))
+
+
+def score_documents(query: str, documents: List[RetrievedDocument], scorer_name: Optional[str] = None):
+    import numpy as np
+    return np.asarray(get_scorer(scorer_name)(query, documents), dtype=np.float32)
+
+
+def ranked(documents, scores, top_k) -> List[RetrievedDocument]:
+    import numpy as np
+    # Stable, so equal scores keep the dense order
+    order = np.argsort(-scores, kind="stable")[:top_k]
+    return [dict(documents[i], rerank_score=float(scores[i])) for i in order]
+
+
+def log_rerank(documents, started, scorer_name, error=None):
+    elapsed = (time.perf_counter() - started) * 1000
+    if error is None:
+        logger.info("Reranked %d candidates with %s in %.1fms", len(documents), scorer_name, elapsed)
+    else:
+        logger.warning("Reranking %d candidates with %s failed after %.1fms, keeping dense order: %s",
+                       len(documents), scorer_name, elapsed, error)
+
+
+def rerank_documents(query: str, documents: List[RetrievedDocument], top_k: int,
+                     scorer_name: Optional[str] = None, timeout: Optional[float] = None) -> List[RetrievedDocument]:
+    """The top_k documents by scorer score, or the first top_k in dense order on failure or timeout"""
+    if len(documents) <= 1:
+        return documents[:top_k]
+    scorer_name = scorer_name or RERANK_SCORER
+    started = time.perf_counter()
+    future = executor().submit(score_documents, query, documents, scorer_name)
+    try:
+        scores = future.result(timeout=RERANK_TIMEOUT if timeout is None else timeout)
+    except FutureTimeoutError:
+        log_rerank(documents, started, scorer_name, "timed out")
+        return documents[:top_k]
+    except Exception as e:
+        log_rerank(documents, started, scorer_name, e)
+        return documents[:top_k]
+    log_rerank(documents, started, scorer_name)
+    return ranked(documents, scores, top_k)
+
+
+async def arerank_documents(query: str, documents: List[RetrievedDocument], top_k: int,
+                            scorer_name: Optional[str] = None, timeout: Optional[float] = None) -> List[RetrievedDocument]:
+    """Async version of rerank_documents; the event loop is not blocked while scoring"""
+    if len(documents) <= 1:
+        return documents[:top_k]
+    scorer_name = scorer_name or RERANK_SCORER
+    started = time.perf_counter()
+    future = executor().submit(score_documents, query, documents, scorer_name)
+    try:
+        scores = await asyncio.wait_for(asyncio.wrap_future(future), RERANK_TIMEOUT if timeout is None else timeout)
+    except asyncio.TimeoutError:
+        log_rerank(documents, started, scorer_name, "timed out")
+        return documents[:top_k]
+    except Exception as e:
+        log_rerank(documents, started, scorer_name, e)
+        return documents[:top_k]
+    log_rerank(documents, started, scorer_name)
+    return ranked(documents, scores, top_k)
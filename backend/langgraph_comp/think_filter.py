@@ -0,0 +1,74 @@
+"""
+Incremental removal of <think>...</think> spans from LLM output.
+
+Reasoning models (e.g. qwen3) wrap their chain-of-thought in <think> tags.
+When the answer is streamed token by token the tags can be split across
+chunks, so a whole-string regex cannot be used; ThinkTagFilter keeps just
+enough buffered text to recognise a tag that straddles two chunks.
+"""
+
+OPEN_TAG = "<think>"
+CLOSE_TAG = "</think>"
+
+
+def _partial_tag_length(text: str, tag: str) -> int:
+    """Length of the longest suffix of text that is a proper prefix of tag."""
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:size]):
+            return size
+    return 0
+
+
+class ThinkTagFilter:
+    """
+    Feed streamed chunks in with feed() and get back only the visible text.
+    Call flush() once the stream ends to release any held-back characters.
+    Leading whitespace of the visible answer is dropped, mirroring the
+    .strip() applied to non-streamed answers.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_think = False
+        self._started = False
+
+    def _emit(self, text: str) -> str:
+        if not self._started:
+            text = text.lstrip()
+            if text:
+                self._started = True
+        return text
+
+    def feed(self, chunk: str) -> str:
+        if not chunk:
+            return ""
+        self._buffer += chunk
+        visible = []
+        while self._buffer:
+            tag = CLOSE_TAG if self._in_think else OPEN_TAG
+            index = self._buffer.find(tag)
+            if index != -1:
+                if not self._in_think:
+                    visible.append(self._buffer[:index])
+                self._buffer = self._buffer[index + len(tag):]
+                self._in_think = not self._in_think
+                continue
+            # No complete tag: keep a possible partial tag for the next chunk
+            held = _partial_tag_length(self._buffer, tag)
+            if not self._in_think:
+                visible.append(self._buffer[:len(self._buffer) - held])
+            self._buffer = self._buffer[len(self._buffer) - held:]
+            break
+        return self._emit("".join(visible))
+
+    def flush(self) -> str:
+        """Return any text held back waiting for a tag. An unclosed <think> is dropped."""
+        remainder = "" if self._in_think else self._buffer
+        self._buffer = ""
+        return self._emit(remainder)
+
+
+def strip_think_tags(text: str) -> str:
+    """Remove every <think>...</think> span from a complete response."""
+    think_filter = ThinkTagFilter()
+    return (think_filter.feed(text) + think_filter.flush()).strip()
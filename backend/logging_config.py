@@ -1,6 +1,31 @@
+"""
+Logging for the backend.
+
+Request threads and event loop tasks never write log output themselves:
+the 'backend' logger has a single QueueHandler, and a background
+QueueListener thread owns the rotating file handler (logs/backend.log) and
+the console handler. A request only pays for building the message; when the
+queue is full (a stuck disk or console) records are dropped rather than
+blocking the request.
+
+The log file gets one JSON object per record (LOG_FORMAT), the console
+plain text unless LOG_CONSOLE_FORMAT=json. JSON records carry the request
+and thread ids bound with bind_log_context(), so every line of a request
+can be found by its X-Request-ID. Messages longer than
+LOG_MAX_MESSAGE_CHARS are truncated. Verbose dumps belong at DEBUG with
+%-style arguments, so they are only formatted when LOG_LEVEL=DEBUG.
+"""
+
+import atexit
+import contextvars
+import copy
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 # Ensure logs directory exists (project-level logs/ folder)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -11,19 +36,129 @@ BACKEND_LOG = os.path.join(LOG_DIR, 'backend.log')
 
 FORMAT = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_CONSOLE_FORMAT = os.getenv("LOG_CONSOLE_FORMAT", "text").lower()
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "2000"))
+# Records waiting for the listener thread; more are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Fields added to every record of the current request (request_id, thread_id)
+_log_context = contextvars.ContextVar("log_context", default={})
+
+
+def bind_log_context(**fields):
+    """Add fields (request_id, thread_id, ...) to the records of the current request or task"""
+    _log_context.set({**_log_context.get(), **fields})
+
+
+def clear_log_context():
+    _log_context.set({})
+
 
-def _setup_file_logger(name: str, filename: str, level=logging.INFO):
+def truncate(text: str, limit: int = LOG_MAX_MESSAGE_CHARS) -> str:
+    if limit <= 0 or len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [truncated {len(text) - limit} chars]"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, message, the bound context and exc"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "context", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def formatter(kind: str) -> logging.Formatter:
+    return JsonFormatter() if kind == "json" else logging.Formatter(FORMAT)
+
+
+class LogQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread. Only the message is resolved (and
+    truncated) here, so arguments that change later are logged as they were;
+    JSON encoding, tracebacks and I/O happen on the listener thread.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = truncate(record.getMessage())
+        record.args = None
+        record.context = _log_context.get()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1:
+                sys.stderr.write("Log queue full, dropping records\n")
+
+
+def file_handler(filename: str, kind: str = LOG_FORMAT) -> logging.Handler:
+    handler = RotatingFileHandler(filename, maxBytes=5 * 1024 * 1024, backupCount=5, encoding='utf-8')
+    handler.setFormatter(formatter(kind))
+    return handler
+
+
+def console_handler(kind: str = LOG_CONSOLE_FORMAT) -> logging.Handler:
+    handler = logging.StreamHandler()
+    handler.setFormatter(formatter(kind))
+    return handler
+
+
+_listener = None
+
+
+def start_listener(log_queue, handlers):
+    """Start the thread that writes the queued records to the handlers"""
+    global _listener
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_listener():
+    """Write out the queued records and stop the listener thread"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def _setup_file_logger(name: str, filename: str, level=LOG_LEVEL):
     logger = logging.getLogger(name)
     # Avoid adding handlers multiple times when imported repeatedly
     if not logger.handlers:
         logger.setLevel(level)
-        fh = RotatingFileHandler(filename, maxBytes=5 * 1024 * 1024, backupCount=5, encoding='utf-8')
-        fh.setFormatter(logging.Formatter(FORMAT))
-        logger.addHandler(fh)
+        queue_handler = LogQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        logger.addHandler(queue_handler)
         # Also log to console for convenience
-        sh = logging.StreamHandler()
-        sh.setFormatter(logging.Formatter(FORMAT))
-        logger.addHandler(sh)
+        handlers = [file_handler(filename), console_handler()]
+        start_listener(queue_handler.queue, handlers)
+        atexit.register(stop_listener)
+
+        def restart_in_child():
+            # A forked worker (gunicorn --preload) inherits neither the listener
+            # thread nor a usable queue lock
+            queue_handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+            start_listener(queue_handler.queue, handlers)
+
+        os.register_at_fork(after_in_child=restart_in_child)
     return logger
 
 
@@ -0,0 +1,197 @@
+"""
+In-process metrics, exported in the Prometheus text format at /metrics.
+
+Counters and histograms live in this process (each API worker has its own;
+Prometheus sums them across scrape targets). Recording is a dict lookup, a
+bisect and a few additions under a per-metric lock, a few microseconds, so
+instrumentation stays on in production. The instrumented stages are:
+
+- rag_http_request_duration_seconds: API requests by route and status
+- rag_node_duration_seconds: each LangGraph node (graph.node())
+- rag_call_duration_seconds: external calls (embeddings, Qdrant, LLM,
+  MongoDB checkpoints and thread bookkeeping)
+- rag_llm_tokens_total, rag_cache_requests_total, rag_errors_total
+"""
+
+import bisect
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Sequence, Tuple
+
+# Seconds; LLM calls on a local model can take tens of seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_string(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_string(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(labels[name] for name in self.labelnames))
+        return series[2] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, (list(series[0]), series[1], series[2])) for key, series in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _label_string(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_string(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    metric = Counter(name, documentation, labelnames)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    metric = Histogram(name, documentation, labelnames, buckets)
+    _registry.append(metric)
+    return metric
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_LATENCY = histogram(
+    "rag_http_request_duration_seconds", "API request latency (streams: until the last event)",
+    ["method", "route", "status"],
+)
+NODE_LATENCY = histogram("rag_node_duration_seconds", "LangGraph node latency", ["node"])
+CALL_LATENCY = histogram("rag_call_duration_seconds", "Latency of calls to external services", ["call"])
+LLM_TOKENS = counter("rag_llm_tokens_total", "LLM tokens by call and kind (prompt/completion)", ["call", "kind"])
+CACHE_REQUESTS = counter("rag_cache_requests_total", "Cache lookups by cache and result (hit/miss)",
+                         ["cache", "result"])
+ERRORS = counter("rag_errors_total", "Errors by stage, including ones answered with a fallback", ["stage"])
+
+
+@contextmanager
+def timed(metric: Histogram, error_stage: str = None, **labels):
+    """Observe the block's duration on metric; exceptions also count in rag_errors_total"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if error_stage:
+            ERRORS.inc(stage=error_stage)
+        raise
+    finally:
+        metric.observe(time.perf_counter() - started, **labels)
+
+
+def timed_call(call: str):
+    """timed() for an external call"""
+    return timed(CALL_LATENCY, call, call=call)
+
+
+def time_node(name: str, func):
+    """Wrap a graph node function (sync or async) to record rag_node_duration_seconds"""
+    if func is None:
+        return None
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with timed(NODE_LATENCY, name, node=name):
+                return await func(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with timed(NODE_LATENCY, name, node=name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def time_methods(instance, calls: Dict[str, str]):
+    """Record rag_call_duration_seconds for the given methods of an instance ({method: call name})"""
+    for method, call in calls.items():
+        original = getattr(instance, method)
+
+        def wrapper(*args, _original=original, _call=call, **kwargs):
+            with timed_call(_call):
+                return _original(*args, **kwargs)
+
+        setattr(instance, method, functools.wraps(original)(wrapper))
+    return instance
@@ -0,0 +1,78 @@
+"""
+Write the turns of existing threads to the conversation archive, the read
+model behind the paginated /thread_history (see langgraph_comp/conversation.py).
+
+New turns are archived as they complete. Threads from before that only have
+their transcript in the latest checkpoint's messages; this copies those
+turns over. Idempotent: turns are upserted on (thread_id, turn) with
+$setOnInsert, so re-running never duplicates or overwrites a turn.
+
+/thread_history also backfills a thread, once, on the first read that finds
+turns missing from the archive, so running this job is optional but avoids
+that one-off cost. Backfilled threads are flagged (ChatThread.archive_backfilled)
+so the API does not read their checkpoint again.
+
+Run from the /backend directory:
+    python -m migrations.backfill_thread_turns --dry-run
+    python -m migrations.backfill_thread_turns
+    python -m migrations.backfill_thread_turns --thread-id <id>
+"""
+
+import argparse
+import os
+import sys
+
+import mongoengine as me
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clients
+from models import ChatThread
+from langgraph_comp.conversation import backfill_thread
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def checkpointed_threads(checkpointer):
+    return checkpointer.checkpoint_collection.distinct("thread_id", {"checkpoint_ns": ""})
+
+
+def backfill(thread_ids=None, dry_run=False):
+    checkpointer = clients.checkpointer()
+    thread_ids = thread_ids or checkpointed_threads(checkpointer)
+    if dry_run:
+        logger.info("Would backfill %d threads", len(thread_ids))
+        return len(thread_ids), 0
+
+    backfilled_turns = 0
+    for done, thread_id in enumerate(thread_ids, 1):
+        try:
+            backfilled_turns += backfill_thread(checkpointer, thread_id)
+            ChatThread.objects(thread_id=thread_id).update(set__archive_backfilled=True)
+        except Exception as e:
+            logger.error("Could not backfill thread %s: %s", thread_id, e)
+        if done % 500 == 0:
+            logger.info("Backfilled %d/%d threads", done, len(thread_ids))
+
+    logger.info("Backfilled %d turns of %d threads", backfilled_turns, len(thread_ids))
+    return len(thread_ids), backfilled_turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Only count the threads that would be scanned")
+    parser.add_argument("--thread-id", action="append", default=None,
+                        help="Backfill only this thread (repeatable)")
+    args = parser.parse_args()
+
+    mongo_uri = os.getenv("MONGO_URI")
+    if not mongo_uri:
+        raise ValueError("MONGO_URI environment variable not set")
+    # ChatThread (the archive_backfilled flag) goes through MongoEngine
+    me.connect(host=mongo_uri)
+    backfill(thread_ids=args.thread_id, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
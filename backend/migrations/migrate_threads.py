@@ -0,0 +1,90 @@
+"""
+Move threads embedded in User documents (User.threads) into the threads
+collection (models.ChatThread).
+
+Idempotent: threads are upserted on (user, thread_id) with $setOnInsert, so
+re-running never overwrites a thread the API already created or renamed.
+Once a user's threads are copied, the embedded list is removed from the
+user document (unless --keep-embedded).
+
+Run from the /backend directory:
+    python -m migrations.migrate_threads --dry-run
+    python -m migrations.migrate_threads
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+import mongoengine as me
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import User, ChatThread
+from logging_config import get_logger
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Threads saved before timestamps were recorded sort last
+MISSING_TIMESTAMP = datetime(1970, 1, 1)
+
+
+def thread_upserts(user_id, embedded_threads):
+    for thread in embedded_threads:
+        if not thread.get("thread_id"):
+            continue
+        yield UpdateOne(
+            {"user": user_id, "thread_id": thread["thread_id"]},
+            {"$setOnInsert": {
+                "timestamp": thread.get("timestamp") or MISSING_TIMESTAMP,
+                "headline": thread.get("headline") or "New Conversation",
+                "active": thread.get("active", True),
+            }},
+            upsert=True,
+        )
+
+
+def migrate(dry_run=False, keep_embedded=False):
+    users = User._get_collection()
+    threads = ChatThread._get_collection()
+    # Creates the (user, thread_id) unique index before any writes
+    ChatThread.ensure_indexes()
+
+    migrated_users = migrated_threads = 0
+    for user in users.find({"threads.0": {"$exists": True}}, {"threads": 1}):
+        operations = list(thread_upserts(user["_id"], user["threads"]))
+        migrated_users += 1
+        migrated_threads += len(operations)
+        if dry_run:
+            continue
+        if operations:
+            threads.bulk_write(operations, ordered=False)
+        if not keep_embedded:
+            users.update_one({"_id": user["_id"]}, {"$unset": {"threads": ""}})
+
+    logger.info("%s %d threads of %d users", "Would migrate" if dry_run else "Migrated",
+                migrated_threads, migrated_users)
+    return migrated_users, migrated_threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Only count what would be migrated")
+    parser.add_argument("--keep-embedded", action="store_true",
+                        help="Leave User.threads in place after copying")
+    args = parser.parse_args()
+
+    mongo_uri = os.getenv("MONGO_URI")
+    if not mongo_uri:
+        raise ValueError("MONGO_URI environment variable not set")
+    me.connect(host=mongo_uri)
+    migrate(dry_run=args.dry_run, keep_embedded=args.keep_embedded)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Rebuild the Qdrant collection with the layout from the QDRANT_* env vars
+(quantization, on-disk vectors, HNSW, shards; see data_insertion/collection.py).
+
+Quantization, sharding and most storage settings cannot be changed on a
+collection with data, so this copies every point (vectors and payload, no
+re-embedding) into a new collection named COLLECTION_NAME_<timestamp>,
+checks the point count and points the COLLECTION_NAME alias at it. Points
+of collections from before hybrid retrieval get their BM25 sparse vectors
+on the way. The API and ingestion keep using COLLECTION_NAME throughout.
+
+- If COLLECTION_NAME is already an alias (a previous rebuild), the switch
+  is atomic and the old collection is deleted afterwards (--keep-old keeps it).
+- If COLLECTION_NAME is still a plain collection, an alias cannot take its
+  name while it exists: it is deleted right before the alias is created,
+  so queries fail for a moment. This needs --replace-collection.
+
+Do not ingest while this runs; points written to the old collection after
+they were copied would be lost.
+
+Run from the /backend directory:
+    python -m migrations.rebuild_collection --dry-run
+    QDRANT_QUANTIZATION=scalar QDRANT_ON_DISK_VECTORS=true python -m migrations.rebuild_collection
+    python -m migrations.rebuild_collection --layout '{"quantization": "binary"}' --replace-collection
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clients
+from data_insertion.collection import CollectionLayout, alias_target, create_collection, describe, estimate_memory
+from data_insertion.sparse import SPARSE_VECTOR_NAME, document_sparse_vector
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+COLLECTION_NAME = os.getenv("COLLECTION_NAME")
+
+
+def point_vectors(point):
+    """The point's dense and sparse vectors, computing the sparse one from the text if missing"""
+    from qdrant_client import models
+
+    vectors = point.vector if isinstance(point.vector, dict) else {"": point.vector}
+    if SPARSE_VECTOR_NAME not in vectors:
+        indices, values = document_sparse_vector((point.payload or {}).get("text", ""))
+        vectors = {**vectors, SPARSE_VECTOR_NAME: models.SparseVector(indices=indices, values=values)}
+    return vectors
+
+
+def copy_points(source, target, batch_size):
+    from qdrant_client import models
+
+    qdrant = clients.qdrant_client()
+    copied, offset = 0, None
+    while True:
+        points, offset = qdrant.scroll(collection_name=source, limit=batch_size, offset=offset,
+                                       with_payload=True, with_vectors=True)
+        if points:
+            qdrant.upsert(collection_name=target, wait=True, points=[
+                models.PointStruct(id=point.id, vector=point_vectors(point), payload=point.payload)
+                for point in points
+            ])
+            copied += len(points)
+            logger.info("Copied %d points", copied)
+        if offset is None:
+            return copied
+
+
+def switch_alias(alias, source, target, source_is_alias):
+    from qdrant_client import models
+
+    qdrant = clients.qdrant_client()
+    operations = [models.CreateAliasOperation(create_alias=models.CreateAlias(collection_name=target,
+                                                                              alias_name=alias))]
+    if source_is_alias:
+        operations.insert(0, models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias)))
+    else:
+        logger.warning("Deleting collection '%s' to put an alias in its place", source)
+        qdrant.delete_collection(source)
+    qdrant.update_collection_aliases(change_aliases_operations=operations)
+    logger.info("Alias '%s' now points to '%s'", alias, target)
+
+
+def rebuild(layout, dry_run=False, keep_old=False, replace_collection=False, batch_size=256):
+    """Returns the name of the new collection (None on a dry run)"""
+    qdrant = clients.qdrant_client()
+    source = alias_target(COLLECTION_NAME)
+    source_is_alias = source is not None
+    source = source or COLLECTION_NAME
+    info = qdrant.get_collection(source)
+    vectors = info.config.params.vectors
+    dimension = (vectors.get("") if isinstance(vectors, dict) else vectors).size
+    # points_count is approximate; the copy is checked against an exact count
+    points = qdrant.count(collection_name=source, exact=True).count
+    memory = estimate_memory(layout, dimension, points)
+    logger.info("'%s' (%s): %d points of %d dimensions -> %s, ~%.1f MB in RAM, ~%.1f MB on disk",
+                COLLECTION_NAME, f"alias of {source}" if source_is_alias else "collection", points, dimension,
+                describe(layout), memory["ram_bytes"] / 1e6, memory["disk_bytes"] / 1e6)
+    if dry_run:
+        return None
+    if not source_is_alias and not replace_collection:
+        raise SystemExit(f"'{COLLECTION_NAME}' is a collection, not an alias: rerun with --replace-collection "
+                         "to delete it once copied (queries fail until the alias exists)")
+
+    target = f"{COLLECTION_NAME}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    create_collection(target, layout, dimension)
+    copied = copy_points(source, target, batch_size)
+    count = qdrant.count(collection_name=target, exact=True).count
+    if count != points:
+        raise SystemExit(f"Copied {copied} points but '{target}' holds {count} of {points}; "
+                         f"'{COLLECTION_NAME}' is unchanged, delete '{target}' and retry")
+    # Keeps ingested_at: same contents, so cached answers (see collection_version) stay valid
+    metadata = getattr(info.config, "metadata", None) or {}
+    try:
+        qdrant.update_collection(collection_name=target, metadata={**metadata, "rebuilt_from": source})
+    except Exception as e:
+        logger.warning("Could not copy collection metadata: %s", e)
+
+    switch_alias(COLLECTION_NAME, source, target, source_is_alias)
+    if source_is_alias and not keep_old:
+        qdrant.delete_collection(source)
+        logger.info("Deleted old collection '%s'", source)
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Only print the current and new layout")
+    parser.add_argument("--layout", default=None, help="JSON CollectionLayout fields overriding the env vars")
+    parser.add_argument("--keep-old", action="store_true", help="Keep the previous collection after the switch")
+    parser.add_argument("--replace-collection", action="store_true",
+                        help="Allow deleting COLLECTION_NAME when it is a plain collection")
+    parser.add_argument("--batch-size", type=int, default=256, help="Points per scroll/upsert batch")
+    args = parser.parse_args()
+
+    layout = CollectionLayout()._replace(**json.loads(args.layout or "{}")).validate()
+    rebuild(layout, args.dry_run, args.keep_old, args.replace_collection, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
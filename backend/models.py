@@ -6,6 +6,8 @@ def init_db(app):
     me.connect(host=app.config['MONGODB_HOST'])
 
 
+# Legacy: threads used to be embedded in the User document. They now live in
+# the ChatThread collection; migrations/migrate_threads.py moves old data over.
 class ThreadInfo(me.EmbeddedDocument):
     thread_id = me.StringField(required=True)
     timestamp = me.DateTimeField(default=None)
@@ -19,5 +21,31 @@ class User(me.Document, UserMixin):
     active = me.BooleanField(default=True)
     fs_uniquifier = me.StringField(max_length=64, unique=True)
     confirmed_at = me.DateTimeField()
-    threads = me.ListField(me.EmbeddedDocumentField(ThreadInfo), default=[])
+    threads = me.ListField(me.EmbeddedDocumentField(ThreadInfo), default=[]) # Legacy, see ChatThread
     roles = me.ListField(me.StringField(), default=[]) # Dummy field for Flask-Security
+
+
+class ChatThread(me.Document):
+    """
+    One conversation thread of a user, in its own collection so that adding,
+    renaming or deleting a thread is a single indexed update instead of a
+    rewrite of the whole User document.
+    """
+    user = me.ReferenceField(User, required=True)
+    thread_id = me.StringField(required=True)
+    timestamp = me.DateTimeField(default=None)
+    headline = me.StringField(max_length=255)
+    active = me.BooleanField(default=True)
+    # Set once the turns in the thread's checkpoint were copied to the
+    # conversation archive (or there were none), so /thread_history reads
+    # the checkpoint for that at most once per thread
+    archive_backfilled = me.BooleanField(default=False)
+
+    meta = {
+        'collection': 'threads',
+        'indexes': [
+            {'fields': ['user', 'thread_id'], 'unique': True},
+            # Newest-first listing for /user_threads
+            {'fields': ['user', 'active', '-timestamp', '-thread_id']},
+        ],
+    }
@@ -0,0 +1,166 @@
+"""
+On-demand request profiling.
+
+With PROFILING_ENABLED=true the API can profile single requests and write
+the result to PROFILE_DIR (logs/profiles/ by default):
+
+- on request: a request whose X-Profile header (or ?profile= parameter)
+  equals PROFILE_TOKEN is profiled; the response names the file in
+  X-Profile-File. Without a token nobody can trigger it.
+- sampled: with PROFILE_SAMPLE_EVERY=N, one in every N requests is profiled.
+
+PROFILE_FORMAT picks the profiler: "pstats" runs cProfile (deterministic,
+open with `python -m pstats` or snakeviz) and "collapsed" samples the
+stacks of all threads every PROFILE_INTERVAL_MS and writes collapsed stacks
+(one "frame;frame;... count" line per stack, for flamegraph.pl or
+speedscope). Both see the whole interpreter, including the LangGraph worker
+threads running the request's nodes, so requests served at the same time
+show up too. One request is profiled at a time; others are not profiled
+while it runs.
+
+When PROFILING_ENABLED is false (the default) the API registers no
+profiling hooks at all.
+"""
+
+import cProfile
+import hmac
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from logging_config import LOG_DIR, get_logger
+
+logger = get_logger(__name__)
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+# Value of the X-Profile header / ?profile= parameter that profiles a request; empty disables it
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+# Profile one in every N requests; 0 disables sampling
+PROFILE_SAMPLE_EVERY = int(os.getenv("PROFILE_SAMPLE_EVERY", "0"))
+PROFILE_FORMAT = os.getenv("PROFILE_FORMAT", "pstats").lower()
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(LOG_DIR, "profiles"))
+
+# Leaf frames of threads that are only waiting (idle pool workers, the event loop's
+# select, pymongo's monitors between checks); left out of collapsed stacks
+IDLE_FRAMES = {("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select"),
+               ("thread.py", "_worker"), ("threading.py", "_wait_for_tstate_lock"),
+               ("periodic_executor.py", "_run")}
+
+_requests = itertools.count(1)
+_active = threading.Lock()
+
+
+def reason_to_profile(token):
+    """"requested" for a valid token, "sampled" for every PROFILE_SAMPLE_EVERY-th request, else None"""
+    if PROFILE_TOKEN and token and hmac.compare_digest(token, PROFILE_TOKEN):
+        return "requested"
+    if PROFILE_SAMPLE_EVERY and next(_requests) % PROFILE_SAMPLE_EVERY == 0:
+        return "sampled"
+    return None
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class StackSampler:
+    """Counts the collapsed stacks of all other threads every interval seconds"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        names = {}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == self._thread.ident:
+                    continue
+                if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RequestProfile:
+    """A running profile of one request; stop() writes it to PROFILE_DIR"""
+
+    def __init__(self, reason, label):
+        self.reason = reason
+        safe_label = re.sub(r"[^A-Za-z0-9_.-]+", "_", label).strip("_")[:80]
+        extension = "folded" if PROFILE_FORMAT == "collapsed" else "pstats"
+        self.filename = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{safe_label}_{reason}.{extension}"
+        self.started = time.perf_counter()
+        if PROFILE_FORMAT == "collapsed":
+            self.profiler = StackSampler(PROFILE_INTERVAL_MS / 1000)
+            self.profiler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop(self):
+        try:
+            if isinstance(self.profiler, StackSampler):
+                self.profiler.stop()
+            else:
+                self.profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, self.filename)
+            if isinstance(self.profiler, StackSampler):
+                self.profiler.dump(path)
+            else:
+                self.profiler.dump_stats(path)
+            logger.info("Profiled %s request in %.0fms: %s", self.reason,
+                        (time.perf_counter() - self.started) * 1000, path)
+        except Exception as e:
+            logger.warning("Could not write profile %s: %s", self.filename, e)
+        finally:
+            _active.release()
+
+
+def start_profile(token, label):
+    """
+    A RequestProfile if this request is to be profiled (see reason_to_profile)
+    and no other profile is running, else None. label names the file, e.g.
+    the route and request id.
+    """
+    reason = reason_to_profile(token)
+    if reason is None:
+        return None
+    if not _active.acquire(blocking=False):
+        logger.info("Not profiling %s request, another profile is running", reason)
+        return None
+    try:
+        return RequestProfile(reason, label)
+    except Exception as e:
+        # e.g. another profiler (a debugger, coverage) holds the profiling hook
+        _active.release()
+        logger.warning("Could not start profiling: %s", e)
+        return None
@@ -0,0 +1,23 @@
+"""
+Shared test setup. The backend modules read their configuration from the
+environment at import time, so placeholders are set before any test imports
+them; no MongoDB, Qdrant or LLM server is contacted.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for name, value in {
+    "MONGO_URI": "mongodb://localhost:27017/test",
+    "OPENAI_API_KEY": "test",
+    "OPENAI_API_BASE": "http://localhost:9/v1",
+    "GENERATION_MODEL": "test",
+    "EMBEDDING_MODEL": "test",
+    "QDRANT_URL": "http://localhost:6333",
+    "COLLECTION_NAME": "test",
+    # Token counts use the character estimate, so tiktoken never downloads an encoding
+    "CONTEXT_TOKENIZER_ENCODING": "none",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,51 @@
+import threading
+
+from langgraph_comp.answer_cache import SemanticAnswerCache
+
+
+def test_hit_and_miss():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store([1.0, 0.0], "What is LangGraph?", "A library.", [], 2.0)
+
+    assert cache.lookup([0.99, 0.05])["answer"] == "A library."
+    assert cache.lookup([0.0, 1.0]) is None
+    assert cache.stats()["hit_rate"] == 0.5
+    assert cache.stats()["saved_seconds"] == 2.0
+
+
+def test_collection_change_clears_the_cache():
+    version = ["v1"]
+    cache = SemanticAnswerCache(version_fn=lambda: version[0], version_check_interval=0)
+    cache.store([1.0, 0.0], "q", "old answer", [], 1.0)
+    assert cache.lookup([1.0, 0.0])["answer"] == "old answer"
+
+    version[0] = "v2"
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_lookups_do_not_wait_for_the_version_check():
+    polling, release = threading.Event(), threading.Event()
+
+    def slow_version():
+        polling.set()
+        release.wait(5)
+        return "v1"
+
+    cache = SemanticAnswerCache(version_fn=slow_version, version_check_interval=60)
+    cache.store([1.0, 0.0], "q", "answer", [], 1.0)
+    poller = threading.Thread(target=cache.lookup, args=([1.0, 0.0],))
+    poller.start()
+    assert polling.wait(5)
+
+    # The first lookup is still waiting on the collection; this one is not blocked by it
+    result = []
+    other = threading.Thread(target=lambda: result.append(cache.lookup([1.0, 0.0])))
+    other.start()
+    other.join(2)
+    finished = not other.is_alive()
+    release.set()
+    poller.join(5)
+
+    assert finished
+    assert result[0]["answer"] == "answer"
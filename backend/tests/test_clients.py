@@ -0,0 +1,26 @@
+import pytest
+
+import clients
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(clients, "_instances", {})
+
+
+def test_chat_models_are_shared_per_configuration():
+    assert clients.chat_model() is clients.chat_model()
+    assert clients.chat_model(temperature=0) is clients.chat_model(temperature=0)
+    assert clients.chat_model(temperature=0) is not clients.chat_model()
+
+
+def test_chat_models_with_other_api_keys_are_not_shared():
+    default = clients.chat_model()
+    first = clients.chat_model(api_key="key-1")
+    second = clients.chat_model(api_key="key-2")
+
+    assert len({id(default), id(first), id(second)}) == 3
+    assert first.openai_api_key.get_secret_value() == "key-1"
+    assert second.openai_api_key.get_secret_value() == "key-2"
+    assert clients.chat_model(api_key="key-1") is first
+    assert not any("key-1" in key for key in clients.initialized())
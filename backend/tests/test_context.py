@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from langgraph_comp import context
+
+
+@pytest.fixture
+def tokenizer(monkeypatch):
+    """Fresh (not yet loaded) tokenizer state"""
+    monkeypatch.setattr(context, "_encoding", None)
+    monkeypatch.setattr(context, "_encoding_loaded", False)
+    monkeypatch.setattr(context, "_warm_up_started", threading.Event())
+    return context
+
+
+def test_requests_do_not_wait_for_the_warm_up(tokenizer, monkeypatch):
+    release = threading.Event()
+    loaded = threading.Event()
+
+    def slow_load():
+        release.wait(5)
+        monkeypatch.setattr(context, "_encoding", "encoding")
+        monkeypatch.setattr(context, "_encoding_loaded", True)
+        loaded.set()
+
+    monkeypatch.setattr(context, "load_encoding", slow_load)
+    context.warm_up()
+    # Still loading: the character estimate is used instead of blocking
+    assert context.get_encoding() is None
+    assert context.count_tokens("x" * 40) == 10
+
+    release.set()
+    assert loaded.wait(5)
+    assert context.get_encoding() == "encoding"
+
+
+def test_disabled_tokenizer_never_loads(tokenizer, monkeypatch):
+    def load():
+        raise AssertionError("tiktoken must not be loaded")
+
+    monkeypatch.setattr(context, "_encoding_loaded", True)  # as set by CONTEXT_TOKENIZER_ENCODING=none
+    monkeypatch.setattr(context, "load_encoding", load)
+    context.warm_up()
+    assert context.count_tokens("x" * 41) == 11
+    assert context.truncate_to_tokens("x" * 41, 2) == "x" * 8
+
+
+def test_failed_load_falls_back_to_estimate(tokenizer, monkeypatch):
+    monkeypatch.setattr(context, "CONTEXT_TOKENIZER_ENCODING", "no-such-encoding")
+
+    assert context.load_encoding() is None
+    assert context.count_tokens("x" * 8) == 2
+
+
+def block(text, score, chunk_index):
+    return {"text": text, "score": score, "source_file": f"{chunk_index}.pdf", "chunk_index": chunk_index}
+
+
+def test_build_context_skips_blocks_that_do_not_fit(tokenizer, monkeypatch):
+    monkeypatch.setattr(context, "_encoding_loaded", True)  # character estimate
+    documents = [block("a" * 400, 0.9, 0), block("b" * 800, 0.8, 1), block("c" * 100, 0.7, 2)]
+
+    text, stats = context.build_context(documents, budget=150)
+
+    # The 200-token block cannot be shortened into the 46 tokens left, the smaller one still fits
+    assert "a" * 400 in text and "b" not in text and "c" * 100 in text
+    assert stats["packed_blocks"] == 2
+    assert stats["truncated"]
+    assert stats["context_tokens"] <= 150
+
+
+def test_build_context_reports_no_truncation_when_everything_fits(tokenizer, monkeypatch):
+    monkeypatch.setattr(context, "_encoding_loaded", True)
+    documents = [block("a" * 40, 0.9, 0), block("b" * 40, 0.8, 1)]
+
+    _, stats = context.build_context(documents, budget=100)
+
+    assert stats["packed_blocks"] == 2
+    assert not stats["truncated"]
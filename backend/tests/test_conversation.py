@@ -0,0 +1,152 @@
+import threading
+from types import SimpleNamespace
+
+import mongomock
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+import clients
+from langgraph_comp import conversation
+
+
+def bulk_write(collection, requests, ordered=True):
+    """mongomock's bulk_write does not accept current pymongo UpdateOne objects"""
+    upserted = 0
+    for request in requests:
+        result = collection.update_one(request._filter, request._doc, upsert=request._upsert)
+        upserted += result.upserted_id is not None
+    return SimpleNamespace(upserted_count=upserted)
+
+
+@pytest.fixture(autouse=True)
+def archive(monkeypatch):
+    monkeypatch.setattr(mongomock.collection.Collection, "bulk_write", bulk_write)
+    monkeypatch.setitem(clients._instances, "mongo", mongomock.MongoClient())
+    monkeypatch.setattr(conversation, "_indexed", threading.Event())
+    return conversation.archive_collection()
+
+
+class CheckpointerStub:
+    """Latest checkpoint of a thread whose live state holds `turns` turns"""
+
+    def __init__(self, turns, archived_turns=0):
+        messages = []
+        for turn in range(archived_turns, archived_turns + turns):
+            messages += [HumanMessage(content=f"question {turn}"), AIMessage(content=f"answer {turn}")]
+        self.checkpoint = {
+            "ts": "2025-01-01T00:00:00+00:00",
+            "channel_values": {"messages": messages, "archived_turns": archived_turns},
+        }
+
+    def get_tuple(self, config):
+        return SimpleNamespace(checkpoint=self.checkpoint)
+
+
+def turn_numbers(turns):
+    return [turn["turn"] for turn in turns]
+
+
+def test_missing_turns():
+    page = [{"turn": 3}, {"turn": 4}]
+    assert not conversation.missing_turns(page, has_more=True)
+    assert not conversation.missing_turns(page, has_more=True, before=5)
+    assert not conversation.missing_turns([{"turn": 0}, {"turn": 1}], has_more=False)
+    assert not conversation.missing_turns([], has_more=False, before=0)
+    # The first page of the thread must start at turn 0
+    assert conversation.missing_turns(page, has_more=False)
+    assert conversation.missing_turns([{"turn": 0}, {"turn": 2}], has_more=False)
+    assert conversation.missing_turns(page, has_more=True, before=8)
+    assert conversation.missing_turns([], has_more=False)
+
+
+def test_turn_page_pages_backwards():
+    for turn in range(5):
+        conversation.record_turn("t", turn, f"question {turn}", f"answer {turn}")
+
+    turns, has_more = conversation.turn_page("t", limit=2)
+    assert turn_numbers(turns) == [3, 4] and has_more
+    turns, has_more = conversation.turn_page("t", before=turns[0]["turn"], limit=2)
+    assert turn_numbers(turns) == [1, 2] and has_more
+    turns, has_more = conversation.turn_page("t", before=turns[0]["turn"], limit=2)
+    assert turn_numbers(turns) == [0] and not has_more
+
+
+def test_backfill_fills_older_turns_of_a_thread_answered_after_deploy():
+    # A pre-archive thread with three turns got a fourth one after the archive existed
+    conversation.record_turn("t", 3, "question 3", "answer 3")
+    turns, has_more = conversation.turn_page("t")
+    assert conversation.missing_turns(turns, has_more)
+
+    assert conversation.backfill_thread(CheckpointerStub(turns=4), "t") == 3
+
+    turns, has_more = conversation.turn_page("t")
+    assert turn_numbers(turns) == [0, 1, 2, 3]
+    assert turns[0]["question"] == "question 0"
+    assert not conversation.missing_turns(turns, has_more)
+    # Recorded turns are never overwritten
+    assert conversation.backfill_thread(CheckpointerStub(turns=4), "t") == 0
+
+
+def test_window_update_archives_and_removes_older_turns():
+    state = CheckpointerStub(turns=3).checkpoint["channel_values"]
+    for message in state["messages"]:
+        message.id = message.content
+
+    update = conversation.window_update(state, "t", window_turns=1)
+
+    assert update["archived_turns"] == 2
+    assert [message.id for message in update["messages"]] == ["question 0", "answer 0", "question 1", "answer 1"]
+    assert turn_numbers(conversation.turn_page("t")[0]) == [0, 1]
+
+
+class CountingCheckpointer(CheckpointerStub):
+    def __init__(self, turns):
+        super().__init__(turns)
+        self.reads = 0
+        if not turns:
+            self.checkpoint = None
+
+    def get_tuple(self, config):
+        self.reads += 1
+        return None if self.checkpoint is None else SimpleNamespace(checkpoint=self.checkpoint)
+
+
+@pytest.fixture
+def threads():
+    """MongoEngine (the ChatThread collection) on mongomock, as api.app connects it"""
+    import mongoengine as me
+    from bson import ObjectId
+    import api.app  # noqa: F401  (connects MongoEngine on import; replaced below)
+
+    me.disconnect()
+    me.connect("test", host="mongodb://localhost", mongo_client_class=mongomock.MongoClient)
+    yield ObjectId()
+    me.disconnect()
+
+
+def test_empty_thread_reads_its_checkpoint_once(threads, monkeypatch):
+    from api.app import chatHistory
+
+    checkpointer = CountingCheckpointer(turns=0)
+    monkeypatch.setitem(clients._instances, "checkpointer", checkpointer)
+
+    for _ in range(3):
+        assert chatHistory(threads, "new-thread")["question"] == []
+    assert checkpointer.reads == 1
+
+
+def test_pre_archive_thread_is_backfilled_on_first_read(threads, monkeypatch):
+    from api.app import chatHistory
+
+    checkpointer = CountingCheckpointer(turns=3)
+    monkeypatch.setitem(clients._instances, "checkpointer", checkpointer)
+    # Answered once after deploy, so only the newest turn is archived
+    conversation.record_turn("old-thread", 3, "question 3", "answer 3")
+    checkpointer.checkpoint["channel_values"]["messages"] += [HumanMessage(content="question 3"),
+                                                              AIMessage(content="answer 3")]
+
+    history = chatHistory(threads, "old-thread")
+    assert history["question"] == ["question 0", "question 1", "question 2", "question 3"]
+    assert history["next_cursor"] is None
+    chatHistory(threads, "old-thread")
+    assert checkpointer.reads == 1
@@ -0,0 +1,88 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import clients
+from data_insertion import db_operations
+from data_insertion.embedding_cache import EmbeddingCache
+
+
+class CountingEmbeddingsClient:
+    """Duck-types the embeddings part of openai.OpenAI / AsyncOpenAI and counts requests"""
+
+    def __init__(self, asynchronous=False):
+        self.requests = 0
+        create = self._acreate if asynchronous else self._create
+        self.embeddings = SimpleNamespace(create=create)
+
+    def _create(self, input, model=None):
+        self.requests += 1
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(text)), 1.0]) for text in input])
+
+    async def _acreate(self, input, model=None):
+        return self._create(input, model)
+
+
+@pytest.fixture
+def openai_client(monkeypatch):
+    client = CountingEmbeddingsClient()
+    monkeypatch.setitem(clients._instances, "openai", client)
+    return client
+
+
+@pytest.fixture
+def async_openai_client(monkeypatch):
+    client = CountingEmbeddingsClient(asynchronous=True)
+    monkeypatch.setitem(clients._instances, "async_openai", client)
+    return client
+
+
+def use_cache(monkeypatch, cache):
+    monkeypatch.setattr(db_operations, "query_embedding_cache", cache)
+    return cache
+
+
+def test_repeated_query_is_served_from_memory(monkeypatch, openai_client):
+    use_cache(monkeypatch, EmbeddingCache(path=None))
+
+    first = db_operations.create_embedding("What is LangGraph?")
+    second = db_operations.create_embedding("  what is   langgraph? ")
+
+    assert second == first
+    assert openai_client.requests == 1
+
+
+def test_async_shares_the_cache(monkeypatch, openai_client, async_openai_client):
+    use_cache(monkeypatch, EmbeddingCache(path=None))
+
+    first = db_operations.create_embedding("What is LangGraph?")
+    second = asyncio.run(db_operations.acreate_embedding("What is LangGraph?"))
+
+    assert second == first
+    assert openai_client.requests == 1
+    assert async_openai_client.requests == 0
+
+
+def test_persistent_tier_survives_a_restart(monkeypatch, tmp_path, openai_client):
+    path = str(tmp_path / "embeddings.sqlite3")
+    use_cache(monkeypatch, EmbeddingCache(path=path))
+    first = db_operations.create_embedding("What is LangGraph?")
+    assert openai_client.requests == 1
+
+    # A new process starts with an empty memory tier over the same file
+    cache = use_cache(monkeypatch, EmbeddingCache(path=path))
+    second = db_operations.create_embedding("What is LangGraph?")
+
+    assert second == first
+    assert openai_client.requests == 1
+    assert cache.stats()["persistent_hits"] == 1
+
+
+def test_models_are_cached_separately(monkeypatch, openai_client):
+    use_cache(monkeypatch, EmbeddingCache(path=None))
+
+    db_operations.create_embedding("What is LangGraph?", model="a")
+    db_operations.create_embedding("What is LangGraph?", model="b")
+
+    assert openai_client.requests == 2
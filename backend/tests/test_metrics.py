@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """An empty metrics registry, so tests don't see (or leave) the app's metrics"""
+    monkeypatch.setattr(metrics, "_registry", [])
+    return metrics._registry
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("latency_seconds", "Latency", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, stage="a")
+
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{stage="a",le="0.1"} 2',
+        'latency_seconds_bucket{stage="a",le="1"} 3',
+        'latency_seconds_bucket{stage="a",le="+Inf"} 4',
+        'latency_seconds_sum{stage="a"} 2.65',
+        'latency_seconds_count{stage="a"} 4',
+    ]
+    assert histogram.count(stage="a") == 4
+    assert histogram.count(stage="b") == 0
+
+
+def test_render_exposition_format(registry):
+    requests = metrics.counter("requests_total", "Requests", ["route"])
+    latency = metrics.histogram("duration_seconds", "Duration", buckets=(1.0,))
+    requests.inc(route="/query")
+    requests.inc(2, route="/query")
+    latency.observe(0.5)
+
+    assert metrics.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{route="/query"} 3',
+        "# HELP duration_seconds Duration",
+        "# TYPE duration_seconds histogram",
+        'duration_seconds_bucket{le="1"} 1',
+        'duration_seconds_bucket{le="+Inf"} 1',
+        "duration_seconds_sum 0.5",
+        "duration_seconds_count 1",
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("errors_total", "Errors", ["stage"])
+    counter.inc(stage='say "hi"\\\nbye')
+
+    assert counter.render()[-1] == 'errors_total{stage="say \\"hi\\"\\\\\\nbye"} 1'
+
+
+def test_time_node_records_sync_and_async_nodes(monkeypatch):
+    histogram = metrics.Histogram("node_seconds", "Node latency", ["node"])
+    monkeypatch.setattr(metrics, "NODE_LATENCY", histogram)
+
+    def retrieve(state):
+        return {"docs": state["query"]}
+
+    async def aretrieve(state):
+        return {"docs": state["query"]}
+
+    assert metrics.time_node("retrieve", retrieve)({"query": "q"}) == {"docs": "q"}
+    assert asyncio.run(metrics.time_node("retrieve", aretrieve)({"query": "q"})) == {"docs": "q"}
+    assert metrics.time_node("retrieve", None) is None
+    assert histogram.count(node="retrieve") == 2
+
+
+def test_time_node_observes_failures(monkeypatch):
+    histogram = metrics.Histogram("node_seconds", "Node latency", ["node"])
+    monkeypatch.setattr(metrics, "NODE_LATENCY", histogram)
+
+    def generate(state):
+        raise RuntimeError("LLM down")
+
+    with pytest.raises(RuntimeError):
+        metrics.time_node("generate", generate)({})
+    assert histogram.count(node="generate") == 1
+
+
+def test_metrics_endpoint():
+    from api.app import app
+
+    client = app.test_client()
+    client.get("/metrics")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.content_type == metrics.CONTENT_TYPE
+    body = response.get_data(as_text=True)
+    assert "# TYPE rag_http_request_duration_seconds histogram" in body
+    # The first request was observed once it completed
+    assert 'rag_http_request_duration_seconds_count{method="GET",route="/metrics",status="200"}' in body
@@ -9,6 +9,12 @@ app.controller('ChatController', ['$scope', 'ChatService', '$timeout', 'AuthServ
         $scope.currentConversation = null;
         $scope.isStreaming = false;
         $scope.showPanel = true;
+        // /user_threads returns one page of threads; next_cursor loads the next one
+        $scope.threadsCursor = null;
+        $scope.isLoadingThreads = false;
+        // /thread_history returns the latest turns first; next_cursor loads older ones
+        $scope.historyCursor = null;
+        $scope.isLoadingOlder = false;
 
         // Use AuthService for user info
         $scope.currentUser = AuthService.getCurrentUser();
@@ -18,6 +24,7 @@ app.controller('ChatController', ['$scope', 'ChatService', '$timeout', 'AuthServ
                 .then(response => {
                     const data = response.data;
                     $scope.userId = data.userId;
+                    $scope.threadsCursor = data.next_cursor;
                     if (data.threads && data.threads.length > 0) {
                         $scope.conversations = [];
 
@@ -28,13 +35,7 @@ app.controller('ChatController', ['$scope', 'ChatService', '$timeout', 'AuthServ
                         });
 
                         data.threads.forEach(thread => {
-                            $scope.conversations.push({
-                                id: thread.thread_id,
-                                name: thread.headline || 'New Conversation',
-                                timestamp: thread.timestamp,
-                                messages: [],
-                                userId: $scope.userId
-                            });
+                            $scope.conversations.push(threadConversation(thread));
                         });
                         $scope.currentConversation = $scope.conversations[0];
                         $scope.selectConversation($scope.currentConversation);
@@ -47,6 +48,43 @@ app.controller('ChatController', ['$scope', 'ChatService', '$timeout', 'AuthServ
                 });
         };
 
+        $scope.loadMoreConversations = function () {
+            if (!$scope.threadsCursor || $scope.isLoadingThreads) return;
+            $scope.isLoadingThreads = true;
+
+            $http.get('http://localhost:8000/user_threads', {
+                params: { cursor: $scope.threadsCursor },
+                withCredentials: true
+            })
+                .then(response => {
+                    const data = response.data;
+                    // Threads are newest first, so later pages are older than everything listed
+                    const known = new Set($scope.conversations.map(c => c.id));
+                    (data.threads || []).forEach(thread => {
+                        if (!known.has(thread.thread_id)) {
+                            $scope.conversations.push(threadConversation(thread));
+                        }
+                    });
+                    $scope.threadsCursor = data.next_cursor;
+                })
+                .catch(error => {
+                    console.error('Failed to load more conversations:', error);
+                })
+                .finally(() => {
+                    $scope.isLoadingThreads = false;
+                });
+        };
+
+        function threadConversation(thread) {
+            return {
+                id: thread.thread_id,
+                name: thread.headline || 'New Conversation',
+                timestamp: thread.timestamp,
+                messages: [],
+                userId: $scope.userId
+            };
+        }
+
         $scope.createNewChat = function () {
             const newId = crypto.randomUUID();
             const currentTime = new Date();
@@ -60,6 +98,7 @@ app.controller('ChatController', ['$scope', 'ChatService', '$timeout', 'AuthServ
             $scope.conversations.unshift(newConversation);
             $scope.currentConversation = newConversation;
             $scope.messages = [];
+            $scope.historyCursor = null;
 
             // Initial bot message
             $scope.messages.push({
@@ -69,9 +108,33 @@ app.controller('ChatController', ['$scope', 'ChatService', '$timeout', 'AuthServ
             });
         };
 
+        // Chat messages for one /thread_history page (turns are oldest first)
+        function historyMessages(data) {
+            const messages = [];
+            for (let i = 0; i < data.question.length; i++) {
+                // Add user message
+                messages.push({
+                    sender: 'user',
+                    text: data.question[i],
+                    time: formatTime(new Date(data.timestamp || Date.now())) // Timestamp might be per message ideally
+                });
+
+                // Add bot message
+                if (i < data.generation.length) {
+                    messages.push({
+                        sender: 'bot',
+                        text: $sce.trustAsHtml(data.generation[i]),
+                        time: formatTime(new Date(data.timestamp || Date.now()))
+                    });
+                }
+            }
+            return messages;
+        }
+
         $scope.selectConversation = function (conversation) {
             $scope.currentConversation = conversation;
             $scope.isLoading = true;
+            $scope.historyCursor = null;
 
             $http.post('http://localhost:8000/thread_history', {
                 thread_id: conversation.id,
@@ -83,23 +146,8 @@ app.controller('ChatController', ['$scope', 'ChatService', '$timeout', 'AuthServ
                     if (data.error) {
                         console.error("Error loading history:", data.error);
                     } else {
-                        for (let i = 0; i < data.question.length; i++) {
-                            // Add user message
-                            $scope.messages.push({
-                                sender: 'user',
-                                text: data.question[i],
-                                time: formatTime(new Date(data.timestamp || Date.now())) // Timestamp might be per message ideally
-                            });
-
-                            // Add bot message
-                            if (i < data.generation.length) {
-                                $scope.messages.push({
-                                    sender: 'bot',
-                                    text: $sce.trustAsHtml(data.generation[i]),
-                                    time: formatTime(new Date(data.timestamp || Date.now()))
-                                });
-                            }
-                        }
+                        $scope.messages = historyMessages(data);
+                        $scope.historyCursor = data.next_cursor;
                     }
 
                     if ($scope.messages.length === 0) {
@@ -120,6 +168,30 @@ app.controller('ChatController', ['$scope', 'ChatService', '$timeout', 'AuthServ
                 });
         };
 
+        $scope.loadOlderMessages = function () {
+            if ($scope.historyCursor == null || $scope.isLoadingOlder) return;
+            const conversation = $scope.currentConversation;
+            $scope.isLoadingOlder = true;
+
+            $http.post('http://localhost:8000/thread_history', {
+                thread_id: conversation.id,
+                before: $scope.historyCursor
+            }, { withCredentials: true })
+                .then(response => {
+                    const data = response.data;
+                    // Ignore the page if the user switched conversations meanwhile
+                    if (data.error || $scope.currentConversation !== conversation) return;
+                    $scope.messages = historyMessages(data).concat($scope.messages);
+                    $scope.historyCursor = data.next_cursor;
+                })
+                .catch(error => {
+                    console.error('Error loading older messages:', error);
+                })
+                .finally(() => {
+                    $scope.isLoadingOlder = false;
+                });
+        };
+
         $scope.deleteConversation = function (conversation, event) {
             if (event) event.stopPropagation();
 
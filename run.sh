@@ -46,8 +46,8 @@ start_backend() {
     source ../.venv/bin/activate
   fi
 
-  echo "Running Flask API via uv..."
-  uv run python app.py > "$LOG_DIR/backend.log" 2>&1 &
+  echo "Running API (ASGI) via uv..."
+  uv run uvicorn api.asgi:application --app-dir .. --host 0.0.0.0 --port 8000 > "$LOG_DIR/backend.log" 2>&1 &
   BACKEND_PID=$!
   PIDS+=("$BACKEND_PID")
   echo "✅ Backend started (PID: $BACKEND_PID)"
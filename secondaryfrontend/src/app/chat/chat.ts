@@ -3,7 +3,7 @@ import { CommonModule } from '@angular/common';
 import { FormsModule } from '@angular/forms';
 import { Router } from '@angular/router';
 import { AuthService } from '../services/auth';
-import { ChatService, Conversation, Message } from '../services/chat';
+import { ChatService, Conversation, Message, Thread, ThreadHistoryResponse } from '../services/chat';
 import { DomSanitizer, SafeHtml } from '@angular/platform-browser';
 
 @Component({
@@ -21,6 +21,12 @@ export class Chat implements OnInit {
   isStreaming = signal(false);
   showPanel = signal(true);
   currentUser = signal('');
+  // /user_threads returns one page of threads; this cursor loads the next one
+  threadsCursor = signal<string | null>(null);
+  isLoadingThreads = signal(false);
+  // /thread_history returns the latest turns first; this cursor loads older ones
+  historyCursor = signal<number | null>(null);
+  isLoadingOlder = signal(false);
 
   @ViewChild('chatMessages') chatMessagesEl!: ElementRef;
 
@@ -39,17 +45,13 @@ export class Chat implements OnInit {
   async initUser(): Promise<void> {
     try {
       const data = await this.chatService.getUserThreads();
+      this.threadsCursor.set(data.next_cursor ?? null);
       if (data.threads && data.threads.length > 0) {
         const sorted = [...data.threads].sort((a, b) =>
           new Date(b.timestamp).getTime() - new Date(a.timestamp).getTime()
         );
 
-        const convs: Conversation[] = sorted.map(thread => ({
-          id: thread.thread_id,
-          name: thread.headline || 'New Conversation',
-          timestamp: new Date(thread.timestamp),
-          messages: []
-        }));
+        const convs: Conversation[] = sorted.map(thread => this.threadConversation(thread));
 
         this.conversations.set(convs);
         this.currentConversation.set(convs[0]);
@@ -63,6 +65,29 @@ export class Chat implements OnInit {
     }
   }
 
+  async loadMoreConversations(): Promise<void> {
+    const cursor = this.threadsCursor();
+    if (!cursor || this.isLoadingThreads()) return;
+    this.isLoadingThreads.set(true);
+
+    try {
+      const data = await this.chatService.getUserThreads(cursor);
+      // Threads are newest first, so later pages are older than everything listed
+      this.conversations.update(convs => {
+        const known = new Set(convs.map(c => c.id));
+        const older = (data.threads || [])
+          .filter(thread => !known.has(thread.thread_id))
+          .map(thread => this.threadConversation(thread));
+        return [...convs, ...older];
+      });
+      this.threadsCursor.set(data.next_cursor ?? null);
+    } catch (error) {
+      console.error('Failed to load more conversations:', error);
+    } finally {
+      this.isLoadingThreads.set(false);
+    }
+  }
+
   createNewChat(): void {
     const newConversation: Conversation = {
       id: crypto.randomUUID(),
@@ -73,6 +98,7 @@ export class Chat implements OnInit {
 
     this.conversations.update(convs => [newConversation, ...convs]);
     this.currentConversation.set(newConversation);
+    this.historyCursor.set(null);
 
     const greeting = `Hello${this.authService.getCurrentUser() ? ', ' + this.authService.getCurrentUser() : ''}! I'm your Langchain chatbot. How can I help you today?`;
     this.messages.set([{
@@ -85,27 +111,15 @@ export class Chat implements OnInit {
   async selectConversation(conversation: Conversation): Promise<void> {
     this.currentConversation.set(conversation);
     this.isLoading.set(true);
+    this.historyCursor.set(null);
 
     try {
       const data = await this.chatService.getThreadHistory(conversation.id);
       const msgs: Message[] = [];
 
       if (!data.error) {
-        for (let i = 0; i < data.question.length; i++) {
-          msgs.push({
-            sender: 'user',
-            text: data.question[i],
-            time: this.formatTime(new Date(data.timestamp || Date.now()))
-          });
-
-          if (i < data.generation.length) {
-            msgs.push({
-              sender: 'bot',
-              text: data.generation[i],
-              time: this.formatTime(new Date(data.timestamp || Date.now()))
-            });
-          }
-        }
+        msgs.push(...this.historyMessages(data));
+        this.historyCursor.set(data.next_cursor ?? null);
       }
 
       if (msgs.length === 0) {
@@ -126,6 +140,26 @@ export class Chat implements OnInit {
     }
   }
 
+  async loadOlderMessages(): Promise<void> {
+    const before = this.historyCursor();
+    const conversation = this.currentConversation();
+    if (before === null || !conversation || this.isLoadingOlder()) return;
+    this.isLoadingOlder.set(true);
+
+    try {
+      const data = await this.chatService.getThreadHistory(conversation.id, before);
+      // Ignore the page if the user switched conversations meanwhile
+      if (data.error || this.currentConversation()?.id !== conversation.id) return;
+      const older = this.historyMessages(data);
+      this.messages.update(msgs => [...older, ...msgs]);
+      this.historyCursor.set(data.next_cursor ?? null);
+    } catch (error) {
+      console.error('Error loading older messages:', error);
+    } finally {
+      this.isLoadingOlder.set(false);
+    }
+  }
+
   async deleteConversation(conversation: Conversation, event: Event): Promise<void> {
     event.stopPropagation();
 
@@ -283,6 +317,36 @@ export class Chat implements OnInit {
     return msgs.length > 0 && !!msgs[msgs.length - 1].isLoading;
   }
 
+  private threadConversation(thread: Thread): Conversation {
+    return {
+      id: thread.thread_id,
+      name: thread.headline || 'New Conversation',
+      timestamp: new Date(thread.timestamp),
+      messages: []
+    };
+  }
+
+  // Chat messages for one /thread_history page (turns are oldest first)
+  private historyMessages(data: ThreadHistoryResponse): Message[] {
+    const msgs: Message[] = [];
+    for (let i = 0; i < data.question.length; i++) {
+      msgs.push({
+        sender: 'user',
+        text: data.question[i],
+        time: this.formatTime(new Date(data.timestamp || Date.now()))
+      });
+
+      if (i < data.generation.length) {
+        msgs.push({
+          sender: 'bot',
+          text: data.generation[i],
+          time: this.formatTime(new Date(data.timestamp || Date.now()))
+        });
+      }
+    }
+    return msgs;
+  }
+
   private formatTime(date: Date): string {
     const hours = date.getHours().toString().padStart(2, '0');
     const minutes = date.getMinutes().toString().padStart(2, '0');
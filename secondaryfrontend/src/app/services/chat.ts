@@ -12,12 +12,17 @@ export interface Thread {
 export interface UserThreadsResponse {
   userId: string;
   threads: Thread[];
+  // Pass as `cursor` to load the next (older) page; null on the last page
+  next_cursor?: string | null;
 }
 
 export interface ThreadHistoryResponse {
   question: string[];
   generation: string[];
+  timestamps?: (string | null)[];
   timestamp?: string;
+  // Pass as `before` to load the turns preceding this page; null on the first page of the thread
+  next_cursor?: number | null;
   error?: string;
 }
 
@@ -47,15 +52,17 @@ export class ChatService {
 
   constructor(private http: HttpClient) {}
 
-  async getUserThreads(): Promise<UserThreadsResponse> {
+  async getUserThreads(cursor?: string): Promise<UserThreadsResponse> {
+    const params: Record<string, string> = cursor ? { cursor } : {};
     return firstValueFrom(
-      this.http.get<UserThreadsResponse>(`${this.apiBase}/user_threads`, { withCredentials: true })
+      this.http.get<UserThreadsResponse>(`${this.apiBase}/user_threads`, { params, withCredentials: true })
     );
   }
 
-  async getThreadHistory(threadId: string): Promise<ThreadHistoryResponse> {
+  async getThreadHistory(threadId: string, before?: number): Promise<ThreadHistoryResponse> {
+    const body = before == null ? { thread_id: threadId } : { thread_id: threadId, before };
     return firstValueFrom(
-      this.http.post<ThreadHistoryResponse>(`${this.apiBase}/thread_history`, { thread_id: threadId }, { withCredentials: true })
+      this.http.post<ThreadHistoryResponse>(`${this.apiBase}/thread_history`, body, { withCredentials: true })
     );
   }
 